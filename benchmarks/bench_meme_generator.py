@@ -0,0 +1,141 @@
+"""Cost of MemeGenerator.from_notebook_node by number of cells
+
+Compares the previous multi-pass implementation with the current single
+pass one on notebooks of increasing size, for the first save (no memes),
+a save without changes and a save after inserting and deleting cells.
+Both take their ids from the same batched id generator and produce the
+same metadata, which is checked before timing.
+
+    python benchmarks/bench_meme_generator.py [--cells 100,1000,10000]
+"""
+import argparse
+import itertools
+import time
+import uuid
+from copy import deepcopy
+
+import nbformat
+
+from nblineage import uuidgen
+from nblineage.meme import MemeGenerator, enum_prev_next_items, get_or_create
+
+class MultiPassMemeGenerator(MemeGenerator):
+    """The previous implementation, walking the cells four times"""
+
+    def from_notebook_node(self, nb, copy=False):
+        new_id = uuidgen.IdBuffer(uuidgen.get_id_generator(self.id_generator))
+        self._update_prev_next_history(nb)
+        self._generate_notebook_meme(nb, new_id)
+        self._generate_cell_meme(nb, new_id)
+        self._update_prev_next_meme(nb)
+        return nb
+
+    def _update_prev_next_history(self, nb):
+        for prev_cell, cell, next_cell in enum_prev_next_items(nb.cells):
+            if 'lc_cell_meme' not in cell.metadata:
+                continue
+            memeobj = cell.metadata['lc_cell_meme']
+            if 'current' not in memeobj:
+                continue
+            if 'previous' not in memeobj:
+                continue
+            if 'next' not in memeobj:
+                continue
+
+            prev_meme = memeobj['previous']
+            next_meme = memeobj['next']
+            prev_memeobj = None
+            if prev_cell is not None:
+                prev_memeobj = prev_cell.metadata.get('lc_cell_meme', None)
+            next_memeobj = None
+            if next_cell is not None:
+                next_memeobj = next_cell.metadata.get('lc_cell_meme', None)
+
+            prev_changed = prev_memeobj is not None and prev_memeobj['current'] != prev_meme
+            prev_changed = prev_changed or (prev_cell is not None and prev_memeobj is None)
+            next_changed = next_memeobj is not None and next_memeobj['current'] != next_meme
+            next_changed = next_changed or (next_cell is not None and next_memeobj is None)
+
+            if prev_changed or next_changed:
+                history = get_or_create(memeobj, 'history', lambda: list())
+                history.append({
+                    'current': memeobj['current'],
+                    'previous': memeobj['previous'],
+                    'next': memeobj['next']
+                })
+
+    def _generate_cell_meme(self, nb, new_id):
+        for cell in nb.cells:
+            memeobj = get_or_create(cell.metadata, 'lc_cell_meme', lambda: dict())
+            if 'current' not in memeobj:
+                memeobj['current'] = new_id()
+
+    def _update_prev_next_meme(self, nb):
+        for prev_cell, cell, next_cell in enum_prev_next_items(nb.cells):
+            memeobj = get_or_create(cell.metadata, 'lc_cell_meme', lambda: dict())
+            prev_meme = None
+            if prev_cell is not None:
+                prev_meme = prev_cell.metadata['lc_cell_meme']['current']
+            memeobj['previous'] = prev_meme
+            next_meme = None
+            if next_cell is not None:
+                next_meme = next_cell.metadata['lc_cell_meme']['current']
+            memeobj['next'] = next_meme
+
+uuid1_strings = uuidgen.uuid1_strings
+
+GENERATORS = (('multi-pass', MultiPassMemeGenerator), ('single-pass', MemeGenerator))
+
+def new_notebook(cells):
+    nb = nbformat.v4.new_notebook()
+    nb.cells = [nbformat.v4.new_code_cell('print({})'.format(i)) for i in range(cells)]
+    return nb
+
+def scenarios(cells):
+    first = new_notebook(cells)
+    saved = MemeGenerator().from_notebook_node(new_notebook(cells))
+    edited = deepcopy(saved)
+    for i in range(0, cells, 10):
+        edited.cells.insert(i, nbformat.v4.new_markdown_cell('inserted'))
+    del edited.cells[5::20]
+    return (('first save', first), ('no changes', saved), ('edited', edited))
+
+def deterministic_uuids():
+    counter = itertools.count()
+    return lambda count: [str(uuid.UUID(int=next(counter))) for x in range(count)]
+
+def check_identical(nb):
+    results = []
+    for name, generator in GENERATORS:
+        uuidgen.uuid1_strings = deterministic_uuids()
+        results.append(generator().from_notebook_node(deepcopy(nb)))
+    uuidgen.uuid1_strings = uuid1_strings
+    assert results[0] == results[1], 'The outputs of the generators differ'
+
+def measure(generator, nb, repeat):
+    copies = [deepcopy(nb) for x in range(repeat)]
+    gen = generator()
+    start = time.perf_counter()
+    for copied in copies:
+        gen.from_notebook_node(copied)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cells', default='100,1000,10000',
+                        help='comma separated numbers of cells')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='iterations for each measurement')
+    args = parser.parse_args()
+
+    for cells in [int(x) for x in args.cells.split(',')]:
+        print('{} cells'.format(cells))
+        for scenario, nb in scenarios(cells):
+            check_identical(nb)
+            times = [measure(generator, nb, args.repeat) for _, generator in GENERATORS]
+            print('  {:12s} {}  (x{:.2f})'.format(scenario, '  '.join(
+                '{}: {:9.3f} ms'.format(name, t * 1000)
+                for (name, _), t in zip(GENERATORS, times)), times[0] / times[1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Memory and lookup time of MemeMap compared with a dict of meme strings
+
+    python benchmarks/bench_meme_map.py [--counts 10000,100000,1000000] [--branched]
+
+With --branched, old memes carry two random branch numbers, as in
+`<uuid>-2-a3f2-bc1e`.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from nblineage import uuidgen
+from nblineage.mememap import MemeMap
+
+def build(factory, pairs):
+    tracemalloc.start()
+    meme_map = factory()
+    # memes are decoded into new strings as when notebooks are read
+    for old_meme, new_meme in pairs:
+        meme_map[old_meme.decode()] = new_meme.decode()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return meme_map, size
+
+def lookup(meme_map, memes):
+    start = time.perf_counter()
+    for meme in memes:
+        meme_map.get(meme)
+    return (time.perf_counter() - start) / len(memes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', default='10000,100000,1000000',
+                        help='comma separated numbers of mapped memes')
+    parser.add_argument('--branched', action='store_true',
+                        help='add branch numbers to the old memes')
+    args = parser.parse_args()
+
+    for count in [int(x) for x in args.counts.split(',')]:
+        memes = uuidgen.uuid1_strings(count)
+        if args.branched:
+            memes = ['{}-2-{:04x}-{:04x}'.format(meme, random.getrandbits(16),
+                                                  random.getrandbits(16))
+                     for meme in memes]
+        pairs = [(old_meme.encode(), new_meme.encode())
+                 for old_meme, new_meme in zip(memes, uuidgen.uuid1_strings(count))]
+        print('{} memes'.format(count))
+        for name, factory in (('dict', dict), ('MemeMap', MemeMap)):
+            meme_map, size = build(factory, pairs)
+            print('  {:8s} {:8.1f} MB  {:6.1f} bytes/meme  lookup {:6.3f} us'.format(
+                name, size / 1e6, size / count, lookup(meme_map, memes) * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Peak memory of NewRootMemeGenerator on a notebook with large outputs
+
+Each variant runs in a fresh interpreter and reports its peak RSS and the
+peak memory allocated while generating memes, after the notebook was read:
+
+* read: nbformat.read only, the lower bound
+* deepcopy: the previous implementation, which kept a deep copy of the
+  notebook to build root_cells_history
+* current: NewRootMemeGenerator.from_notebook_node
+
+    python benchmarks/bench_new_root_meme_memory.py [--size-mb 500] [--cells 100]
+        [--output-size 1024]
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CHILD_SNIPPET = '''
+import io, resource, sys, time, tracemalloc
+from copy import deepcopy
+import nbformat
+from nblineage.meme import NewRootMemeGenerator
+
+variant, path = sys.argv[1:]
+start = time.perf_counter()
+with io.open(path, encoding='utf-8') as f:
+    nb = nbformat.read(f, as_version=4)
+tracemalloc.start()
+if variant == 'deepcopy':
+    orig_nb = deepcopy(nb)
+    NewRootMemeGenerator().from_notebook_node(nb)
+    del orig_nb
+elif variant == 'current':
+    NewRootMemeGenerator().from_notebook_node(nb)
+elapsed = time.perf_counter() - start
+_, traced = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    maxrss //= 1024
+print(maxrss, traced, elapsed)
+'''
+
+VARIANTS = ('read', 'deepcopy', 'current')
+
+def write_notebook(path, size_mb, cells, output_size):
+    text = 'x' * (output_size - 1) + '\n'
+    outputs_per_cell = max(1, size_mb * 1024 * 1024 // cells // output_size)
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write('{"cells": [')
+        for i in range(cells):
+            cell = {
+                'id': 'cell-{}'.format(i),
+                'cell_type': 'code',
+                'execution_count': i + 1,
+                'metadata': {},
+                'source': 'print({})'.format(i),
+                'outputs': [{'output_type': 'display_data', 'metadata': {},
+                             'data': {'text/plain': text}}] * outputs_per_cell,
+            }
+            if i > 0:
+                f.write(', ')
+            f.write(json.dumps(cell))
+        f.write('], "metadata": {}, "nbformat": 4, "nbformat_minor": 5}')
+
+def run(variant, path):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    out = subprocess.check_output([sys.executable, '-c', CHILD_SNIPPET, variant, path],
+                                  env=env)
+    maxrss, traced, elapsed = out.split()
+    return int(maxrss) / 1024.0, int(traced) / 1024.0 / 1024.0, float(elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=500,
+                        help='approximate size of the outputs of the notebook')
+    parser.add_argument('--cells', type=int, default=100,
+                        help='number of cells of the notebook')
+    parser.add_argument('--output-size', type=int, default=1024,
+                        help='size in bytes of each output')
+    parser.add_argument('--notebook', help='use an existing notebook file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = args.notebook
+        if path is None:
+            path = os.path.join(tempdir, 'large.ipynb')
+            write_notebook(path, args.size_mb, args.cells, args.output_size)
+        print('{} ({:.1f} MB)'.format(path, os.path.getsize(path) / 1024.0 / 1024.0))
+        for variant in VARIANTS:
+            maxrss, traced, elapsed = run(variant, path)
+            print('  {:10s} peak RSS {:10.1f} MB  generation peak {:10.1f} MB  {:8.2f} s'.format(
+                variant, maxrss, traced, elapsed))
+
+if __name__ == '__main__':
+    main()
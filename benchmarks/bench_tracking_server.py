@@ -0,0 +1,80 @@
+"""Startup cost of resolving TrackingServer.data_dir
+
+Compares the previous resolution, which constructed and initialized a
+JupyterApp, with nblineage.tracking_server.get_data_dir(), both embedded
+(in-process, per TrackingServer) and for a fresh CLI process.
+
+    python benchmarks/bench_tracking_server.py [--repeat N]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from jupyter_core.application import JupyterApp
+
+from nblineage import tracking_server
+from nblineage.tracking_server import TrackingServer, get_data_dir
+
+JUPYTER_APP_SNIPPET = '''
+from jupyter_core.application import JupyterApp
+app = JupyterApp()
+app.initialize(argv=[])
+app.data_dir
+'''
+
+# nblineage.tracking_server is loaded from its file, without the imports
+# of the nblineage package, which are not part of resolving the data dir
+GET_DATA_DIR_SNIPPET = '''
+import importlib.util
+spec = importlib.util.spec_from_file_location('tracking_server', {path!r})
+tracking_server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tracking_server)
+tracking_server.get_data_dir()
+'''
+
+def data_dir_by_jupyter_app():
+    app = JupyterApp()
+    app.initialize(argv=[])
+    return app.data_dir
+
+def data_dir_by_tracking_server():
+    return TrackingServer().data_dir
+
+def measure(func, repeat):
+    start = time.perf_counter()
+    for x in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def measure_process(snippet, repeat):
+    start = time.perf_counter()
+    for x in range(repeat):
+        subprocess.check_call([sys.executable, '-c', snippet])
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='iterations for the embedded benchmark')
+    parser.add_argument('--process-repeat', type=int, default=10,
+                        help='iterations for the CLI benchmark')
+    args = parser.parse_args()
+
+    assert data_dir_by_jupyter_app() == get_data_dir()
+
+    print('embedded (per TrackingServer, {} runs)'.format(args.repeat))
+    old = measure(data_dir_by_jupyter_app, args.repeat)
+    new = measure(data_dir_by_tracking_server, args.repeat)
+    print('  JupyterApp().initialize(): {:10.3f} ms'.format(old * 1000))
+    print('  TrackingServer().data_dir: {:10.3f} ms  (x{:.1f})'.format(new * 1000, old / new))
+
+    print('CLI (fresh interpreter, {} runs)'.format(args.process_repeat))
+    old = measure_process(JUPYTER_APP_SNIPPET, args.process_repeat)
+    snippet = GET_DATA_DIR_SNIPPET.format(path=tracking_server.__file__)
+    new = measure_process(snippet, args.process_repeat)
+    print('  JupyterApp().initialize(): {:10.3f} ms'.format(old * 1000))
+    print('  get_data_dir():            {:10.3f} ms  (x{:.1f})'.format(new * 1000, old / new))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Batch UUIDv1 generation compared with uuid.uuid1()
+
+    python benchmarks/bench_uuidgen.py [--counts 1,100,10000,100000]
+"""
+import argparse
+import time
+import uuid
+
+from nblineage import uuidgen
+
+def stdlib_strings(count):
+    return [str(uuid.uuid1()) for x in range(count)]
+
+def stdlib_bytes(count):
+    return b''.join([uuid.uuid1().bytes for x in range(count)])
+
+CASES = (
+    ('strings', stdlib_strings, uuidgen.uuid1_strings),
+    ('bytes', stdlib_bytes, uuidgen.uuid1_bytes),
+)
+
+def measure(func, count, repeat):
+    start = time.perf_counter()
+    for x in range(repeat):
+        func(count)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', default='1,100,10000,100000',
+                        help='comma separated numbers of UUIDs per call')
+    parser.add_argument('--total', type=int, default=200000,
+                        help='approximate number of UUIDs generated for each measurement')
+    args = parser.parse_args()
+
+    for count in [int(x) for x in args.counts.split(',')]:
+        repeat = max(1, args.total // count)
+        print('{} UUIDs per call'.format(count))
+        for name, stdlib, batch in CASES:
+            old = measure(stdlib, count, repeat) / count
+            new = measure(batch, count, repeat) / count
+            print('  {:8s} uuid.uuid1(): {:8.3f} us/UUID  nblineage.uuidgen: {:8.3f} us/UUID'
+                  '  (x{:.1f})'.format(name, old * 1e6, new * 1e6, old / new))
+
+if __name__ == '__main__':
+    main()
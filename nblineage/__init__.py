@@ -3,6 +3,8 @@ from pathlib import Path
 # from notebook.base.handlers import IPythonHandler
 from jupyter_server.utils import url_path_join
 from .tracking_server import TrackingServer
+from .save_hooks import LineageSaveHooks
+from .uuid_pool import UUIDPool
 from . import handler
 
 # JupyterLab extension
@@ -32,21 +34,45 @@ def _jupyter_server_extension_paths():
 def _load_jupyter_server_extension(nb_app):
     nb_app.log.info('Loaded server extension nblineage')
 
-    tracking_server = TrackingServer()
+    tracking_server = TrackingServer(parent=nb_app)
     sign_uuid = tracking_server.server_signature
     nb_app.log.info('Server Signature UUID = {}'.format(sign_uuid))
 
+    save_hooks = LineageSaveHooks(parent=nb_app)
+    save_hooks.register(nb_app.contents_manager)
+    nb_app.log.info('MEME generation = {}'.format(save_hooks.meme_generation))
+
+    uuid_pool = UUIDPool(parent=nb_app)
+    uuid_pool.start()
+
     web_app = nb_app.web_app
+    web_app.settings['nblineage_tracking_server'] = tracking_server
+    web_app.settings['nblineage_save_hooks'] = save_hooks
     host_pattern = '.*$'
     count_regex = r'(?P<count>[0-9]+)'
     base_url = web_app.settings['base_url']
     uuid_route_pattern = url_path_join(base_url, '/nblineage/uuid/v1/%s' % count_regex)
     signature_route_pattern = url_path_join(base_url, '/nblineage/lc/server_signature')
+    config_route_pattern = url_path_join(base_url, '/nblineage/config')
+    metadata_route_pattern = url_path_join(base_url, '/nblineage/metadata')
+    lineage_cells_route_pattern = url_path_join(base_url, '/nblineage/lineage/cells')
+    lineage_notebooks_route_pattern = url_path_join(base_url, '/nblineage/lineage/notebooks')
 
     web_app.add_handlers(host_pattern, [
-        (uuid_route_pattern, handler.UUIDv1Handler, {}),
-        (signature_route_pattern, handler.ServerSignatureHandler, dict(nb_app=nb_app))
+        (uuid_route_pattern, handler.UUIDv1Handler,
+         dict(uuid_pool=uuid_pool, endpoint=handler.UUIDEndpoint(parent=nb_app))),
+        (signature_route_pattern, handler.ServerSignatureHandler, dict(nb_app=nb_app)),
+        (config_route_pattern, handler.ConfigHandler, dict(save_hooks=save_hooks)),
+        (metadata_route_pattern, handler.NotebookMetadataHandler),
     ])
+    if save_hooks.update_index:
+        # the index is only kept up to date by the save hooks
+        web_app.add_handlers(host_pattern, [
+            (lineage_cells_route_pattern, handler.LineageCellsHandler,
+             dict(lineage_index=save_hooks.lineage_index)),
+            (lineage_notebooks_route_pattern, handler.LineageNotebooksHandler,
+             dict(lineage_index=save_hooks.lineage_index))
+        ])
 
 # For backward compatibility with notebook server - useful for Binder/JupyterHub
 load_jupyter_server_extension = _load_jupyter_server_extension
\ No newline at end of file
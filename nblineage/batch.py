@@ -0,0 +1,172 @@
+"""Requests of `jupyter nblineage serve-batch`
+
+A request is a JSON object on one line with an `op` and an optional `id`
+which is copied to the response. The notebook of a request is read from
+`path`, or given inline as `notebook`. Notebooks updated by an op are
+written atomically to `dest` if it is given, or returned in the response.
+
+    {"id": 1, "op": "generate-memes", "path": "a.ipynb", "dest": "a.ipynb"}
+    {"id": 2, "op": "new-root", "path": "a.ipynb", "dest": "b.ipynb"}
+    {"id": 3, "op": "extract-metadata", "path": "b.ipynb"}
+
+A response is a JSON object on one line with the `id` and either a
+`result` or an `error`. Responses are written as requests complete, so
+they may be out of order.
+"""
+import io
+import json
+import socketserver
+import threading
+from functools import partial
+
+import nbformat
+from traitlets.config import LoggingConfigurable
+
+from . import meme
+from . import nbstream
+from .fileutil import atomic_replace
+
+OPS = {
+    'generate-memes': 'generate_memes',
+    'new-root': 'new_root',
+    'extract-metadata': 'extract_metadata',
+}
+
+class BatchWorker(LoggingConfigurable):
+    """Handle requests with generators kept across requests
+
+    A worker is not thread safe, each thread or process of a pool has its own.
+    """
+
+    def __init__(self, **kwargs):
+        super(BatchWorker, self).__init__(**kwargs)
+        self.meme_gen = meme.MemeGenerator(parent=self)
+        self.newroot_gen = meme.NewRootMemeGenerator(parent=self)
+        # load the notebook schema before the first request
+        nbformat.validate(nbformat.v4.new_notebook())
+
+    def handle(self, request):
+        op = request.get('op', None)
+        if op not in OPS:
+            raise ValueError('Unknown op: {}'.format(op))
+        return getattr(self, OPS[op])(request)
+
+    def read_notebook(self, request):
+        if 'notebook' in request:
+            return nbformat.convert(nbformat.from_dict(request['notebook']), 4)
+        if 'path' in request:
+            with io.open(request['path'], encoding='utf-8') as f:
+                return nbformat.read(f, as_version=4)
+        raise ValueError('Either path or notebook is required')
+
+    def write_notebook(self, request, nb, result):
+        if 'dest' not in request:
+            result['notebook'] = nb
+            return result
+        with atomic_replace(request['dest'], 'w') as f:
+            nbformat.write(nb, f)
+        return result
+
+    def generate_memes(self, request):
+        nb = self.meme_gen.from_notebook_node(self.read_notebook(request))
+        result = {
+            'notebook_meme': nb.metadata['lc_notebook_meme']['current'],
+            'cell_memes': [cell.metadata['lc_cell_meme']['current'] for cell in nb.cells],
+        }
+        return self.write_notebook(request, nb, result)
+
+    def new_root(self, request):
+        nb = self.newroot_gen.from_notebook_node(self.read_notebook(request))
+        result = {
+            'notebook_meme': nb.metadata['lc_notebook_meme']['current'],
+            'mapping': self.newroot_gen.new_cells_history,
+        }
+        return self.write_notebook(request, nb, result)
+
+    def extract_metadata(self, request):
+        if 'notebook' in request:
+            nb = self.read_notebook(request)
+        elif 'path' in request:
+            nb = nbstream.read_metadata_from_filename(request['path'])
+        else:
+            raise ValueError('Either path or notebook is required')
+        return {
+            'metadata': nb.metadata,
+            'cells': [cell.get('metadata', {}) for cell in nb.cells],
+        }
+
+_local = threading.local()
+
+def init_worker(config):
+    """Create the worker of the current thread or process of a pool"""
+    _local.worker = BatchWorker(config=config)
+
+def handle_request(request):
+    """Handle a request by the worker of the current thread or process"""
+    response = {'id': request.get('id', None)}
+    try:
+        response['result'] = _local.worker.handle(request)
+    except Exception as e:
+        response['error'] = '{}: {}'.format(type(e).__name__, e)
+    return response
+
+def serve_stream(executor, rfile, wfile, max_pending=64):
+    """Handle the requests of a binary stream on an executor until EOF
+
+    At most `max_pending` requests are read ahead of their responses.
+    """
+    lock = threading.Lock()
+    pending = threading.BoundedSemaphore(max_pending)
+
+    def respond(response):
+        data = (json.dumps(response) + '\n').encode('utf-8')
+        with lock:
+            wfile.write(data)
+            wfile.flush()
+
+    def done(request_id, future):
+        try:
+            response = future.result()
+        except Exception as e:
+            response = {'id': request_id, 'error': '{}: {}'.format(type(e).__name__, e)}
+        try:
+            respond(response)
+        finally:
+            pending.release()
+
+    for line in rfile:
+        if len(line.strip()) == 0:
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('A request must be an object')
+        except ValueError as e:
+            respond({'id': None, 'error': 'Invalid request: {}'.format(e)})
+            continue
+        pending.acquire()
+        try:
+            future = executor.submit(handle_request, request)
+        except Exception as e:
+            # such as a broken process pool
+            try:
+                respond({'id': request.get('id', None),
+                         'error': '{}: {}'.format(type(e).__name__, e)})
+            finally:
+                pending.release()
+            continue
+        future.add_done_callback(partial(done, request.get('id', None)))
+
+    # wait for the pending requests
+    for x in range(max_pending):
+        pending.acquire()
+
+def make_unix_socket_server(path, executor, max_pending=64):
+    """Create a server handling the requests of each connection to a unix socket"""
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_stream(executor, self.rfile, self.wfile, max_pending=max_pending)
+
+    server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    server.daemon_threads = True
+    return server
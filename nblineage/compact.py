@@ -0,0 +1,138 @@
+import io
+import json
+import os
+
+from traitlets.config import LoggingConfigurable
+from traitlets import Enum, Int
+
+from . import nbstream
+from .meme import expand_root_cells_history, encode_root_cells_history
+from .fileutil import atomic_replace, CountingWriter
+
+def _dedupe(history, mode):
+    if mode == 'consecutive':
+        return [entry for i, entry in enumerate(history)
+                if i == 0 or entry != history[i - 1]]
+    if mode == 'all':
+        # entries are JSON values, which may be unhashable dicts or lists
+        seen = set()
+        result = []
+        for entry in history:
+            key = json.dumps(entry, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                result.append(entry)
+        return result
+    return history
+
+class HistoryCompactor(LoggingConfigurable):
+    """Trim and deduplicate the meme histories of notebooks"""
+
+    cell_history = Int(None, min=0, allow_none=True,
+                       help='Max size of the history of each cell, by default keep all'
+                      ).tag(config=True)
+
+    notebook_history = Int(None, min=0, allow_none=True,
+                           help='Max size of the history of the notebook meme, by default keep all'
+                          ).tag(config=True)
+
+    root_cells_history = Int(None, min=0, allow_none=True,
+                             help='Max size of the root cells history, by default keep all'
+                            ).tag(config=True)
+
+    server_signature_history = Int(None, min=0, allow_none=True,
+                                   help='Max size of the server signature history, by default keep all'
+                                  ).tag(config=True)
+
+    dedupe = Enum(['none', 'consecutive', 'all'], 'consecutive',
+                  help='Remove duplicated history entries: "consecutive" removes entries '
+                       'identical to the previous one, "all" keeps the first of identical entries'
+                 ).tag(config=True)
+
+    def options(self):
+        """Return the values of the configurable traits, to create a copy in a worker"""
+        return dict((name, getattr(self, name))
+                    for name in self.class_trait_names(config=True))
+
+    def compact_notebook(self, nb):
+        """Compact the histories of a notebook in place
+
+        Returns the number of removed history entries.
+        """
+        removed = 0
+        memeobj = nb.metadata.get('lc_notebook_meme', None)
+        if isinstance(memeobj, dict):
+            removed += self._compact(memeobj, 'history', self.notebook_history)
+            removed += self._compact_root_cells_history(memeobj)
+            signature = memeobj.get('lc_server_signature', None)
+            if isinstance(signature, dict):
+                removed += self._compact(signature, 'history', self.server_signature_history)
+        for cell in nb.cells:
+            memeobj = cell.get('metadata', {}).get('lc_cell_meme', None)
+            if isinstance(memeobj, dict):
+                removed += self._compact(memeobj, 'history', self.cell_history)
+        return removed
+
+    def _compact(self, memeobj, key, max_size):
+        history = memeobj.get(key, None)
+        if not isinstance(history, list):
+            return 0
+        compacted = self._compact_list(history, max_size)
+        if len(compacted) == len(history):
+            return 0
+        memeobj[key] = compacted
+        return len(history) - len(compacted)
+
+    def _compact_list(self, history, max_size):
+        compacted = _dedupe(history, self.dedupe)
+        if max_size is not None and len(compacted) > max_size:
+            compacted = compacted[len(compacted) - max_size:]
+        return compacted
+
+    def _compact_root_cells_history(self, memeobj):
+        history = memeobj.get('root_cells_history', None)
+        if not isinstance(history, list) or all(isinstance(entry, list) for entry in history):
+            return self._compact(memeobj, 'root_cells_history', self.root_cells_history)
+        # delta entries refer to the previous entry, so they are compared
+        # and re-encoded as tables
+        tables = expand_root_cells_history(memeobj)
+        compacted = self._compact_list(tables, self.root_cells_history)
+        if len(compacted) == len(tables):
+            return 0
+        memeobj['root_cells_history'] = encode_root_cells_history(
+            compacted, memeobj.get('root_cells', None))
+        return len(tables) - len(compacted)
+
+def _read_and_compact(f, compactor):
+    nb, spans = nbstream.read_metadata_spans(f)
+    if spans['metadata'] is None or any(span is None for span in spans['cells']):
+        raise ValueError('Notebook or cell metadata is missing')
+    removed = compactor.compact_notebook(nb)
+    f.seek(0)
+    return nb, spans, removed
+
+def compact_file(os_path, compactor, dry_run=False):
+    """Compact the histories of a notebook file
+
+    Only the replaced metadata is re-serialized and the file is replaced
+    atomically. If `dry_run` is True, the file is left unchanged.
+    Returns the number of removed history entries, and the sizes of the
+    file before and after compaction.
+    """
+    with io.open(os_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        nb, spans, removed = _read_and_compact(f, compactor)
+        if removed == 0:
+            return removed, size, size
+        if dry_run:
+            out = CountingWriter()
+            nbstream.write_spliced(f, out, nb, spans)
+            return removed, size, out.size
+    # the source is read again and closed before it is replaced
+    with atomic_replace(os_path) as out:
+        with io.open(os_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            nb, spans, removed = _read_and_compact(f, compactor)
+            nbstream.write_spliced(f, out, nb, spans)
+        new_size = out.tell()
+    return removed, size, new_size
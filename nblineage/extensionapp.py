@@ -1,6 +1,13 @@
 import os.path
 import sys
+import glob
 import io
+import csv
+import json
+import time
+from contextlib import contextmanager
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from ._version import __version__
 
@@ -21,10 +28,17 @@ from jupyter_server.extension.serverextension import (
 
 from traitlets.config.application import catch_config_error
 from traitlets.config.application import Application
-from traitlets import Unicode, Dict, List
+from traitlets import Unicode, Dict, List, Int, Bool, Enum, validate
 
 import nbformat
 from . import meme
+from . import index
+from . import nbstream
+from . import compact
+from . import batch
+from . import mememap
+from . import uuidgen
+from .fileutil import atomic_replace
 
 class ExtensionQuickSetupApp(BaseExtensionApp):
     """Installs and enables all parts of this extension"""
@@ -64,6 +78,129 @@ class ExtensionQuickRemovalApp(BaseExtensionApp):
         uninstall.initialize(self.argv)
         uninstall.start()
 
+@contextmanager
+def _open_file(path_or_file, mode):
+    if isinstance(path_or_file, str):
+        with io.open(path_or_file, mode) as f:
+            yield f
+    else:
+        yield path_or_file
+
+def write_new_root_meme(newroot_gen, src, dest, splice=False, log=None):
+    """Write a new root meme notebook of `src` to `dest`
+
+    `src` and `dest` are paths or binary files. If `splice` is True, the
+    source notebook is copied and only its metadata is replaced when
+    possible. Returns the table of the original and new memes of the cells.
+    """
+    if splice:
+        with _open_file(src, 'rb') as f:
+            try:
+                nb, spans = nbstream.read_metadata_spans(f)
+            except nbstream.UnsupportedNotebookError:
+                spans = None
+            f.seek(0)
+            if (spans is not None and spans['metadata'] is not None and
+                    all(span is not None for span in spans['cells'])):
+                nb = newroot_gen.from_notebook_node(nb)
+                with _open_file(dest, 'wb') as out:
+                    nbstream.write_spliced(f, out, nb, spans)
+                return newroot_gen.new_cells_history
+        if log is not None:
+            log.debug('Cannot splice {}, rewriting the whole notebook'.format(src))
+
+    if isinstance(src, str):
+        nb = newroot_gen.from_filename(src)
+    else:
+        nb = newroot_gen.from_notebook_node(
+            nbformat.reads(src.read().decode('utf-8'), as_version=4))
+    if isinstance(dest, str):
+        with io.open(dest, 'w', encoding='utf-8') as f:
+            nbformat.write(nb, f)
+    else:
+        data = nbformat.writes(nb)
+        if not data.endswith('\n'):
+            data += '\n'
+        dest.write(data.encode('utf-8'))
+        dest.flush()
+    return newroot_gen.new_cells_history
+
+class MappingWriter(object):
+    """Write the original and new memes of cells as TSV, CSV or NDJSON lines
+
+    If `with_path` is True, each line starts with the path of the notebook.
+    Lines are flushed for each notebook so that readers get them as
+    notebooks are processed.
+    """
+
+    def __init__(self, f, format='tsv', with_path=False):
+        self.f = f
+        self.format = format
+        self.with_path = with_path
+        if format == 'csv':
+            self._csv = csv.writer(f, lineterminator='\n')
+            self._csv.writerow((['path'] if with_path else []) + ['orig', 'new'])
+
+    def write(self, table, path=None):
+        prefix = [path] if self.with_path else []
+        for orig_meme, new_meme in table:
+            if self.format == 'ndjson':
+                row = dict(path=path) if self.with_path else dict()
+                row.update(orig=orig_meme, new=new_meme)
+                self.f.write(json.dumps(row) + '\n')
+            elif self.format == 'csv':
+                self._csv.writerow(prefix + [orig_meme, new_meme])
+            else:
+                self.f.write('\t'.join(prefix + [orig_meme, new_meme]) + '\n')
+        self.f.flush()
+
+def read_memes(src):
+    """Read the notebook meme and the cell memes of a notebook file"""
+    with io.open(src, 'rb') as f:
+        try:
+            nb, spans = nbstream.read_metadata_spans(f)
+        except nbstream.UnsupportedNotebookError:
+            f.seek(0)
+            nb = nbformat.read(io.TextIOWrapper(f, encoding='utf-8'), as_version=4)
+    memeobjs = [nb.metadata.get('lc_notebook_meme', None)]
+    memeobjs.extend(cell.get('metadata', {}).get('lc_cell_meme', None) for cell in nb.cells)
+    return [memeobj['current'] for memeobj in memeobjs
+            if isinstance(memeobj, dict) and 'current' in memeobj]
+
+def _read_memes(args):
+    src = args[0]
+    try:
+        return read_memes(src), None
+    except Exception as e:
+        return None, '{}: {}'.format(src, e)
+
+def _new_root_file(args):
+    src, dest, config, options, meme_map = args
+    try:
+        newroot_gen = meme.NewRootMemeGenerator(config=config, meme_map=meme_map)
+        if options['in_place']:
+            backup = src + options['backup_suffix'] if options['backup_suffix'] else None
+            with atomic_replace(src, backup=backup) as out:
+                table = write_new_root_meme(newroot_gen, src, out, splice=options['splice'])
+            return (src, table), None
+        dirname = os.path.dirname(dest)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        if os.path.exists(dest):
+            return None, '{} already exists'.format(dest)
+        return (src, write_new_root_meme(newroot_gen, src, dest, splice=options['splice'])), None
+    except Exception as e:
+        return None, '{}: {}'.format(src, e)
+
+def _glob_base(pattern):
+    """Return the leading directory of a glob pattern without wildcards"""
+    parts = []
+    for part in pattern.split(os.sep):
+        if glob.escape(part) != part:
+            break
+        parts.append(part)
+    return os.sep.join(parts)
+
 class NewRootMemeApp(Application):
     """Generate a new root meme notebook"""
     name = "jupyter nblinage new-root-meme"
@@ -72,46 +209,573 @@ class NewRootMemeApp(Application):
 
     examples = """
         jupyter nblineage new-root-meme [options] <source.ipynb> <output.ipynb>
+        jupyter nblineage new-root-meme [options] --mapping-fd=3 - - < source.ipynb > output.ipynb 3> mapping.txt
+        jupyter nblineage new-root-meme [options] --output-dir=<dir> <notebook, directory or glob>...
+        jupyter nblineage new-root-meme [options] --in-place <notebook, directory or glob>...
     """
 
     classes = List([meme.NewRootMemeGenerator])
     aliases = Dict({
         'trim-history' : 'NewRootMemeGenerator.trim_history',
+        'id-generator' : 'NewRootMemeGenerator.id_generator',
+        'root-cells-history-format' : 'NewRootMemeGenerator.root_cells_history_format',
+        'output-dir' : 'NewRootMemeApp.output_dir',
+        'meme-map' : 'NewRootMemeApp.meme_map_file',
+        'workers' : 'NewRootMemeApp.workers',
+        'mapping-fd' : 'NewRootMemeApp.mapping_fd',
+        'mapping-format' : 'NewRootMemeApp.mapping_format',
+        'backup-suffix' : 'NewRootMemeApp.backup_suffix',
         'log-level' : 'Application.log_level'
     })
     flags = Dict({
         'clear-server-signature' : ({
             'NewRootMemeGenerator' : {'clear_server_signature': True }
         }, 'Clear server signature metadata'),
+        'splice' : ({
+            'NewRootMemeApp' : {'splice': True}
+        }, 'Rewrite only the metadata of the source notebook'),
+        'shared-memes' : ({
+            'NewRootMemeApp' : {'shared_memes': True}
+        }, 'Map the same meme to the same new meme in all notebooks'),
+        'in-place' : ({
+            'NewRootMemeApp' : {'in_place': True}
+        }, 'Replace the given notebooks atomically instead of writing to a destination'),
         'debug' : ({
             'Application' : {'log_level' : 10}
         }, "Set loglevel to DEBUG")
     })
 
+    splice = Bool(False,
+                  help='If True, copy the source notebook and replace only its metadata, '
+                       'without parsing and re-serializing cell sources and outputs'
+                 ).tag(config=True)
+
+    output_dir = Unicode('',
+                         help='If set, re-root the given notebooks, directories and glob patterns '
+                              'into this directory, mirroring directory trees'
+                        ).tag(config=True)
+
+    workers = Int(0, min=0,
+                  help='Number of worker processes of the batch mode, by default the number of CPUs'
+                 ).tag(config=True)
+
+    shared_memes = Bool(False,
+                        help='If True, map the same meme to the same new meme in all notebooks '
+                             'of the batch mode, keeping the copies of cells between notebooks'
+                       ).tag(config=True)
+
+    meme_map_file = Unicode('',
+                            help='A file of tab-separated original and new memes. If set, memes '
+                                 'are mapped as in the file if it exists, and the map is written '
+                                 'to it. This implies shared_memes'
+                           ).tag(config=True)
+
+    in_place = Bool(False,
+                    help='If True, replace the given notebooks, directories and glob patterns '
+                         'by writing to a temporary file in the same directory, syncing it '
+                         'and renaming it over the notebook'
+                   ).tag(config=True)
+
+    backup_suffix = Unicode('',
+                            help='If set with in_place, keep each original notebook as a file '
+                                 'named with this suffix, hard linked if possible'
+                           ).tag(config=True)
+
+    mapping_fd = Int(None, min=0, allow_none=True,
+                     help='A file descriptor to stream the original and new memes of cells to, '
+                          'by default they are printed to stdout'
+                    ).tag(config=True)
+
+    mapping_format = Enum(['tsv', 'csv', 'ndjson'], 'tsv',
+                          help='The format of the original and new memes of cells'
+                         ).tag(config=True)
+
     @catch_config_error
     def initialize(self, argv=None):
         super(NewRootMemeApp, self).initialize(argv)
         self.newroot_gen = meme.NewRootMemeGenerator(config=self.config)
 
+    def load_meme_map(self):
+        if self.meme_map_file and os.path.exists(self.meme_map_file):
+            return mememap.MemeMap.load(self.meme_map_file)
+        return mememap.MemeMap()
+
+    def save_meme_map(self, meme_map):
+        if not self.meme_map_file:
+            return
+        with atomic_replace(self.meme_map_file, 'w') as f:
+            meme_map.write(f)
+
+    def open_mapping(self, with_path=False):
+        """Return a MappingWriter to the mapping fd or stdout"""
+        if self.mapping_fd is None:
+            return MappingWriter(sys.stdout, self.mapping_format, with_path=with_path)
+        f = io.open(self.mapping_fd, 'w', encoding='utf-8', newline='', closefd=False)
+        return MappingWriter(f, self.mapping_format, with_path=with_path)
+
+    def find_targets(self):
+        """Yield the source and destination paths of the batch mode"""
+        for arg in self.extra_args:
+            if os.path.isdir(arg):
+                for os_path, path in find_notebooks(arg):
+                    yield os_path, self.destination(os_path, path.split('/'))
+            elif glob.escape(arg) != arg:
+                base = _glob_base(arg)
+                for os_path in sorted(glob.glob(arg, recursive=True)):
+                    if os.path.isfile(os_path):
+                        yield os_path, self.destination(
+                            os_path, [os.path.relpath(os_path, base or '.')])
+            else:
+                yield arg, self.destination(arg, [os.path.basename(arg)])
+
+    def destination(self, os_path, relpath):
+        if self.in_place:
+            return os_path
+        return os.path.join(self.output_dir, *relpath)
+
+    def map_memes(self, targets, executor):
+        """Map the memes of all notebooks to new memes
+
+        Returns the map and the targets with the part of the map for each
+        notebook. Notebooks whose memes cannot be read are reported as errors.
+        """
+        meme_map = self.load_meme_map()
+        mapped = []
+        errors = []
+        for target, (memes, error) in zip(targets, executor.map(_read_memes, targets,
+                                                                chunksize=4)):
+            if error is not None:
+                errors.append(error)
+            else:
+                mapped.append((target, memes))
+
+        # the map is keyed by the UUID part of memes, see NewRootMemeGenerator
+        mapped = [(target, [meme.split_branch(m)[0] for m in memes])
+                  for target, memes in mapped]
+        missing = dict.fromkeys(base for target, bases in mapped for base in bases
+                                if meme_map.get(base) is None)
+        generate = uuidgen.get_id_generator(self.newroot_gen.id_generator)
+        for base, new_meme in zip(missing, generate(len(missing))):
+            meme_map[base] = new_meme
+
+        targets = [target[:4] + (dict((base, meme_map[base]) for base in bases),)
+                   for target, bases in mapped]
+        return meme_map, targets, errors
+
+    def start_batch(self):
+        targets = []
+        errors = []
+        dests = set()
+        options = dict(splice=self.splice, in_place=self.in_place,
+                       backup_suffix=self.backup_suffix)
+        for src, dest in self.find_targets():
+            dest = os.path.normcase(os.path.normpath(dest))
+            if dest in dests:
+                errors.append('{}: {} is a destination of another notebook'.format(src, dest))
+                continue
+            dests.add(dest)
+            targets.append((src, dest, self.config, options, None))
+
+        results = []
+        meme_map = None
+        # a mapping fd is streamed, stdout is written once at the end
+        mapping = self.open_mapping(with_path=True)
+        streaming = self.mapping_fd is not None
+        workers = self.workers or None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if self.shared_memes or self.meme_map_file:
+                meme_map, targets, read_errors = self.map_memes(targets, executor)
+                errors.extend(read_errors)
+            for result, error in executor.map(_new_root_file, targets, chunksize=4):
+                if error is not None:
+                    errors.append(error)
+                    continue
+                results.append(result)
+                if streaming:
+                    mapping.write(result[1], path=result[0])
+
+        if not streaming:
+            for src, table in results:
+                mapping.write(table, path=src)
+        if meme_map is not None:
+            # cells without memes were given new memes by the workers
+            for src, table in results:
+                for orig_meme, new_meme in table:
+                    base = meme.split_branch(orig_meme)[0]
+                    if meme_map.get(base) is None:
+                        meme_map[base] = meme.split_branch(new_meme)[0]
+            self.save_meme_map(meme_map)
+        for error in errors:
+            self.log.warning('Failed to generate a new root meme notebook of %s', error)
+        sys.stderr.write('{} of {} notebooks re-rooted, {} errors\n'.format(
+            len(results), len(results) + len(errors), len(errors)))
+        if len(errors) > 0:
+            sys.exit(1)
+
     def start(self):
+        if self.output_dir and self.in_place:
+            sys.stderr.write('--output-dir and --in-place cannot be used together\n')
+            sys.exit(-1)
+        if self.output_dir or self.in_place:
+            if len(self.extra_args) == 0 or '-' in self.extra_args:
+                self.print_help()
+                sys.exit(-1)
+            self.start_batch()
+            return
+
         if len(self.extra_args) != 2:
             self.print_help()
             sys.exit(-1)
         src = self.extra_args[0]
         dest = self.extra_args[1]
-        src = os.path.normcase(os.path.normpath(src))
-        dest = os.path.normcase(os.path.normpath(dest))
+        if src == '-':
+            # stdin is read at once since it is not seekable
+            src = io.BytesIO(sys.stdin.buffer.read())
+        else:
+            src = os.path.normcase(os.path.normpath(src))
+        if dest == '-':
+            dest = sys.stdout.buffer
+        else:
+            dest = os.path.normcase(os.path.normpath(dest))
 
-        # check: Does a destination file exist?
-        if os.path.exists(dest):
-            sys.stderr.write('{} already exists\n'.format(dest))
+            # check: Does a destination file exist?
+            if os.path.exists(dest):
+                sys.stderr.write('{} already exists\n'.format(dest))
+                sys.exit(-1)
+
+        if self.meme_map_file:
+            self.newroot_gen.meme_map = self.load_meme_map()
+        table = write_new_root_meme(self.newroot_gen, src, dest, splice=self.splice,
+                                    log=self.log)
+        if self.extra_args[1] != '-' or self.mapping_fd is not None:
+            self.open_mapping().write(table)
+        if self.meme_map_file:
+            self.save_meme_map(self.newroot_gen.meme_map)
+
+def find_notebooks(root):
+    """Find notebooks under a directory, skipping hidden files and directories
+
+    Yields the OS path of each notebook and its API path relative to `root`.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            if filename.startswith('.') or not filename.endswith('.ipynb'):
+                continue
+            os_path = os.path.join(dirpath, filename)
+            path = os.path.relpath(os_path, root).replace(os.sep, '/')
+            yield os_path, path
+
+def _extract_notebook(args):
+    os_path, path, mtime, size = args
+    try:
+        return index.extract_notebook(os_path, path, mtime=mtime, size=size), None
+    except Exception as e:
+        return None, '{}: {}'.format(os_path, e)
+
+class ScanApp(Application):
+    """Extract memes of notebooks in a directory tree into the lineage index"""
+    name = "jupyter nblineage scan"
+    description = "Extract memes of notebooks in a directory tree into the lineage index"
+    version = __version__
+
+    examples = """
+        jupyter nblineage scan [options] <notebook_dir>
+        jupyter nblineage scan [options] --root-dir=<notebook_dir> <notebook_dir>/<subdir>
+    """
+
+    root_dir = Unicode('',
+                       help='The notebook directory of the server, which the indexed paths are '
+                            'relative to. By default, the scanned directory'
+                      ).tag(config=True)
+
+    workers = Int(0, min=0,
+                  help='Number of worker processes, by default the number of CPUs'
+                 ).tag(config=True)
+
+    batch_size = Int(100, min=1,
+                     help='Number of notebooks written to the index in one transaction'
+                    ).tag(config=True)
+
+    force = Bool(False,
+                 help='If True, rescan notebooks even if their mtime and size are unchanged'
+                ).tag(config=True)
+
+    prune = Bool(False,
+                 help='If True, remove notebooks that no longer exist from the index'
+                ).tag(config=True)
+
+    classes = List([index.LineageIndex])
+    aliases = Dict({
+        'index-file' : 'LineageIndex.index_file',
+        'root-dir' : 'ScanApp.root_dir',
+        'workers' : 'ScanApp.workers',
+        'log-level' : 'Application.log_level'
+    })
+    flags = Dict({
+        'force' : ({
+            'ScanApp' : {'force': True}
+        }, 'Rescan unchanged notebooks'),
+        'prune' : ({
+            'ScanApp' : {'prune': True}
+        }, 'Remove notebooks that no longer exist from the index'),
+        'debug' : ({
+            'Application' : {'log_level' : 10}
+        }, "Set loglevel to DEBUG")
+    })
+
+    @catch_config_error
+    def initialize(self, argv=None):
+        super(ScanApp, self).initialize(argv)
+        self.lineage_index = index.LineageIndex(config=self.config)
+
+    def start(self):
+        if len(self.extra_args) != 1:
+            self.print_help()
             sys.exit(-1)
+        root = os.path.abspath(self.extra_args[0])
+        if not os.path.isdir(root):
+            sys.stderr.write('{} is not a directory\n'.format(root))
+            sys.exit(-1)
+        prefix = ''
+        if self.root_dir:
+            prefix = os.path.relpath(root, os.path.abspath(self.root_dir)).replace(os.sep, '/')
+            if prefix == '..' or prefix.startswith('../'):
+                sys.stderr.write('{} is not under {}\n'.format(root, self.root_dir))
+                sys.exit(-1)
+            prefix = '' if prefix == '.' else prefix + '/'
 
-        nb = self.newroot_gen.from_filename(src)
-        print('\n'.join(map(lambda xs: '\t'.join(xs), self.newroot_gen.new_cells_history)))
+        start_time = time.time()
+        indexed = self.lineage_index.notebook_stats()
+        found = set()
+        targets = []
+        for os_path, path in find_notebooks(root):
+            path = prefix + path
+            found.add(path)
+            stat = os.stat(os_path)
+            if not self.force and indexed.get(path) == (stat.st_mtime, stat.st_size):
+                continue
+            targets.append((os_path, path, stat.st_mtime, stat.st_size))
+        skipped = len(found) - len(targets)
+        self.log.info('Found %d notebooks, %d unchanged', len(found), skipped)
 
-        with io.open(dest, 'w', encoding='utf-8') as f:
-            nbformat.write(nb, f)
+        scanned = 0
+        nbytes = 0
+        errors = 0
+        entries = []
+        workers = self.workers or None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_extract_notebook, targets, chunksize=16)
+            for entry, error in results:
+                if error is not None:
+                    self.log.warning('Failed to read %s', error)
+                    errors += 1
+                    continue
+                entries.append(entry)
+                scanned += 1
+                nbytes += entry[4]
+                if len(entries) >= self.batch_size:
+                    self.lineage_index.update_many(entries)
+                    entries = []
+        if len(entries) > 0:
+            self.lineage_index.update_many(entries)
+
+        removed = 0
+        if self.prune:
+            # only the notebooks under the scanned directory may be missing
+            missing = [path for path in indexed
+                       if path.startswith(prefix) and path not in found]
+            self.lineage_index.remove_notebooks(missing)
+            removed = len(missing)
+        self.lineage_index.close()
+
+        elapsed = max(time.time() - start_time, 1e-9)
+        print('Scanned {} notebooks ({:.1f} MB) in {:.2f}s: {:.1f} notebooks/s, {:.1f} MB/s'.format(
+            scanned, nbytes / 1e6, elapsed, scanned / elapsed, nbytes / 1e6 / elapsed))
+        print('Skipped {} unchanged notebooks, {} errors, {} removed'.format(
+            skipped, errors, removed))
+
+def _compact_file(args):
+    os_path, options, dry_run = args
+    try:
+        compactor = compact.HistoryCompactor(**options)
+        return (os_path,) + compact.compact_file(os_path, compactor, dry_run=dry_run), None
+    except Exception as e:
+        return None, '{}: {}'.format(os_path, e)
+
+class CompactApp(Application):
+    """Trim and deduplicate the meme histories of notebooks"""
+    name = "jupyter nblineage compact"
+    description = "Trim and deduplicate the meme histories of notebooks in place"
+    version = __version__
+
+    examples = """
+        jupyter nblineage compact [options] <notebook or directory>...
+    """
+
+    workers = Int(0, min=0,
+                  help='Number of worker processes, by default the number of CPUs'
+                 ).tag(config=True)
+
+    dry_run = Bool(False,
+                   help='If True, only report the bytes that would be saved'
+                  ).tag(config=True)
+
+    classes = List([compact.HistoryCompactor])
+    aliases = Dict({
+        'cell-history' : 'HistoryCompactor.cell_history',
+        'notebook-history' : 'HistoryCompactor.notebook_history',
+        'root-cells-history' : 'HistoryCompactor.root_cells_history',
+        'server-signature-history' : 'HistoryCompactor.server_signature_history',
+        'dedupe' : 'HistoryCompactor.dedupe',
+        'workers' : 'CompactApp.workers',
+        'log-level' : 'Application.log_level'
+    })
+    flags = Dict({
+        'dry-run' : ({
+            'CompactApp' : {'dry_run': True}
+        }, 'Report the bytes that would be saved without rewriting notebooks'),
+        'debug' : ({
+            'Application' : {'log_level' : 10}
+        }, "Set loglevel to DEBUG")
+    })
+
+    @catch_config_error
+    def initialize(self, argv=None):
+        super(CompactApp, self).initialize(argv)
+        self.compactor = compact.HistoryCompactor(config=self.config)
+
+    def find_targets(self):
+        for arg in self.extra_args:
+            if os.path.isdir(arg):
+                for os_path, path in find_notebooks(arg):
+                    yield os_path
+            else:
+                yield arg
+
+    def start(self):
+        if len(self.extra_args) == 0:
+            self.print_help()
+            sys.exit(-1)
+        for arg in self.extra_args:
+            if not os.path.exists(arg):
+                sys.stderr.write('{} does not exist\n'.format(arg))
+                sys.exit(-1)
+
+        options = self.compactor.options()
+        targets = [(os_path, options, self.dry_run) for os_path in self.find_targets()]
+        verb = 'would save' if self.dry_run else 'saved'
+        changed = 0
+        saved = 0
+        errors = 0
+        workers = self.workers or None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result, error in executor.map(_compact_file, targets, chunksize=4):
+                if error is not None:
+                    self.log.warning('Failed to compact %s', error)
+                    errors += 1
+                    continue
+                os_path, removed, size, new_size = result
+                if removed == 0:
+                    continue
+                changed += 1
+                saved += size - new_size
+                print('{}: {} history entries, {} bytes -> {} bytes ({} {} bytes)'.format(
+                    os_path, removed, size, new_size, verb, size - new_size))
+        print('{} of {} notebooks compacted, {} {} bytes, {} errors'.format(
+            changed, len(targets), verb, saved, errors))
+        if errors > 0:
+            sys.exit(1)
+
+class ServeBatchApp(Application):
+    """Handle JSON lines requests on notebooks with warm generators"""
+    name = "jupyter nblineage serve-batch"
+    description = "Handle JSON lines requests on notebooks from stdin or a unix socket"
+    version = __version__
+
+    examples = """
+        jupyter nblineage serve-batch [options] < requests.jsonl > responses.jsonl
+        jupyter nblineage serve-batch [options] --socket=<path>
+    """
+
+    socket = Unicode('',
+                     help='If set, accept connections on this unix socket path instead of '
+                          'reading requests from stdin'
+                    ).tag(config=True)
+
+    pool = Enum(['thread', 'process'], 'thread',
+                help='Handle requests on a pool of threads or processes'
+               ).tag(config=True)
+
+    workers = Int(0, min=0,
+                  help='Number of workers of the pool, by default it depends on the CPUs'
+                 ).tag(config=True)
+
+    max_pending = Int(64, min=1,
+                      help='Number of requests read ahead of their responses on each stream'
+                     ).tag(config=True)
+
+    id_generator = Unicode('',
+                           help='If set, the generator of new memes of all ops, which overrides '
+                                'MemeGenerator.id_generator and NewRootMemeGenerator.id_generator: '
+                                + uuidgen.ID_GENERATOR_HELP
+                          ).tag(config=True)
+
+    @validate('id_generator')
+    def _validate_id_generator(self, proposal):
+        if not proposal['value']:
+            return proposal['value']
+        return uuidgen.validate_id_generator(proposal['value'])
+
+    classes = List([meme.MemeGenerator, meme.NewRootMemeGenerator])
+    aliases = Dict({
+        'socket' : 'ServeBatchApp.socket',
+        'pool' : 'ServeBatchApp.pool',
+        'workers' : 'ServeBatchApp.workers',
+        'max-pending' : 'ServeBatchApp.max_pending',
+        'trim-history' : 'NewRootMemeGenerator.trim_history',
+        'id-generator' : 'ServeBatchApp.id_generator',
+        'log-level' : 'Application.log_level'
+    })
+    flags = Dict({
+        'debug' : ({
+            'Application' : {'log_level' : 10}
+        }, "Set loglevel to DEBUG")
+    })
+
+    def worker_config(self):
+        """Return the config of the workers"""
+        config = deepcopy(self.config)
+        if self.id_generator:
+            config.MemeGenerator.id_generator = self.id_generator
+            config.NewRootMemeGenerator.id_generator = self.id_generator
+        return config
+
+    def create_executor(self):
+        pool_class = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+        return pool_class(max_workers=self.workers or None,
+                          initializer=batch.init_worker, initargs=(self.worker_config(),))
+
+    def start(self):
+        if self.socket and os.path.exists(self.socket):
+            sys.stderr.write('{} already exists\n'.format(self.socket))
+            sys.exit(-1)
+
+        with self.create_executor() as executor:
+            if not self.socket:
+                batch.serve_stream(executor, sys.stdin.buffer, sys.stdout.buffer,
+                                   max_pending=self.max_pending)
+                return
+            server = batch.make_unix_socket_server(self.socket, executor,
+                                                   max_pending=self.max_pending)
+            self.log.info('Serving requests on %s', self.socket)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+                os.remove(self.socket)
 
 class ExtensionApp(Application):
     '''CLI for extension management.'''
@@ -135,6 +799,18 @@ class ExtensionApp(Application):
             NewRootMemeApp,
             "Generate a new root meme notebook"
         ),
+        "scan": (
+            ScanApp,
+            "Extract memes of notebooks into the lineage index"
+        ),
+        "compact": (
+            CompactApp,
+            "Trim and deduplicate the meme histories of notebooks"
+        ),
+        "serve-batch": (
+            ServeBatchApp,
+            "Handle JSON lines requests on notebooks with warm generators"
+        ),
     })
 
     def _classes_default(self):
@@ -0,0 +1,66 @@
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+def _fsync_dir(dirname):
+    try:
+        fd = os.open(dirname, os.O_RDONLY)
+    except OSError:
+        # directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _backup(path, backup):
+    """Keep the current content of `path` as `backup`, hard linked if possible"""
+    if os.path.lexists(backup):
+        os.remove(backup)
+    try:
+        os.link(path, backup)
+    except OSError:
+        shutil.copy2(path, backup)
+
+@contextmanager
+def atomic_replace(path, mode='wb', backup=None):
+    """Write a file through a temporary file which replaces `path` atomically
+
+    The temporary file is created in the directory of `path`, synced to
+    disk and renamed over `path` when the block exits without an error, so
+    that readers see either the old or the new content. The permissions of
+    an existing `path` are kept. If `backup` is given, the existing `path`
+    is kept as the file `backup` before it is replaced.
+    """
+    dirname, basename = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.' + basename + '.', suffix='.tmp')
+    try:
+        encoding = None if 'b' in mode else 'utf-8'
+        with io.open(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+            if backup is not None:
+                _backup(path, backup)
+        os.replace(tmp_path, path)
+        _fsync_dir(dirname)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class CountingWriter(object):
+    """A binary sink which only counts the bytes written to it"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
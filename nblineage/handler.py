@@ -1,28 +1,244 @@
+import base64
+import hashlib
+import json
+import zlib
+from functools import partial
 from jupyterlab_server.handlers import JupyterHandler
+from jupyter_server.utils import ensure_async
 from tornado import web
-from uuid import uuid1
-from .tracking_server import TrackingServer
-import itertools
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from traitlets.config import LoggingConfigurable
+from traitlets import Int
+
+from . import nbstream
+from . import uuidgen
+
+UUID_FORMATS = ('json', 'binary', 'base64')
+
+def _json_uuid_items(uuids):
+    return ', '.join([json.dumps(u) for u in uuids])
+
+def pack_uuids(uuids):
+    """Pack UUID strings into a sequence of 16-byte big-endian UUIDs"""
+    return bytes.fromhex(''.join(uuids).replace('-', ''))
+
+class UUIDEndpoint(LoggingConfigurable):
+    """Limits of the requests to the UUID endpoint"""
+
+    max_count = Int(100000, min=0,
+                    help='Max number of UUIDs served by a single request'
+                   ).tag(config=True)
+
+    stream_threshold = Int(10000, min=1,
+                           help='Requests for more UUIDs than this are streamed in chunks of this size'
+                          ).tag(config=True)
 
 class UUIDv1Handler(JupyterHandler):
-    def initialize(self):
-        pass
+    def initialize(self, uuid_pool, endpoint):
+        self.uuid_pool = uuid_pool
+        self.endpoint = endpoint
+
+    def _get_uuid_format(self):
+        uuid_format = self.get_query_argument('format', None)
+        if uuid_format is None:
+            accept = self.request.headers.get('Accept', '')
+            uuid_format = 'binary' if 'application/octet-stream' in accept else 'json'
+        if uuid_format not in UUID_FORMATS:
+            raise web.HTTPError(400, 'Unknown format: {}'.format(uuid_format))
+        return uuid_format
+
+    def _use_gzip(self):
+        if self.get_query_argument('gzip', '0') in ('0', 'false', ''):
+            return False
+        return 'gzip' in self.request.headers.get('Accept-Encoding', '')
+
+    async def _encode_chunk(self, uuid_format, count, first):
+        if uuid_format == 'json':
+            items = _json_uuid_items(await self._take(count))
+            return items if first else ', ' + items
+        generate_bytes = uuidgen.get_bytes_generator(self.uuid_pool.id_generator)
+        if generate_bytes is not None:
+            packed = generate_bytes(count)
+        else:
+            packed = pack_uuids(await self._take(count))
+        if uuid_format == 'base64':
+            return base64.b64encode(packed)
+        return packed
+
+    async def _take(self, count):
+        if self.uuid_pool.can_take(count):
+            return self.uuid_pool.take(count)
+        # generate the UUIDs missing from the pool off the event loop
+        return await IOLoop.current().run_in_executor(None, self.uuid_pool.take, count)
 
     @web.authenticated
-    def get(self, count):
+    async def get(self, count):
         count = int(count)
-        uuids = [str(uuid1()) for x in itertools.repeat(None, count)]
-        self.finish(dict(uuid=uuids))
+        if count > self.endpoint.max_count:
+            raise web.HTTPError(400, 'Too many UUIDs requested: {} > {}'.format(
+                count, self.endpoint.max_count))
+        uuid_format = self._get_uuid_format()
+        chunk_size = self.endpoint.stream_threshold
+        if uuid_format == 'json' and count <= chunk_size:
+            uuids = await self._take(count)
+            self.finish(dict(uuid=uuids))
+            return
+        if uuid_format == 'base64':
+            # keep chunks free of base64 padding
+            chunk_size = max(3, chunk_size - chunk_size % 3)
+
+        # Stream large responses so that memory stays bounded
+        # and other requests can be served in between chunks
+        compressor = None
+        if uuid_format == 'json':
+            self.set_header('Content-Type', 'application/json; charset=UTF-8')
+            self.write('{"uuid": [')
+        else:
+            if uuid_format == 'base64':
+                self.set_header('Content-Type', 'text/plain; charset=US-ASCII')
+            else:
+                self.set_header('Content-Type', 'application/octet-stream')
+            if self._use_gzip():
+                self.set_header('Content-Encoding', 'gzip')
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        remaining = count
+        try:
+            while remaining > 0:
+                n = min(remaining, chunk_size)
+                chunk = await self._encode_chunk(uuid_format, n, remaining == count)
+                remaining -= n
+                if compressor is not None:
+                    chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                self.write(chunk)
+                await self.flush()
+        except StreamClosedError:
+            self.log.debug('Client closed the connection while streaming UUIDs')
+            return
+        if uuid_format == 'json':
+            self.write(']}')
+        if compressor is not None:
+            self.write(compressor.flush())
+        self.finish()
 
 class ServerSignatureHandler(JupyterHandler):
     def initialize(self, nb_app):
-        self.tracking_server = TrackingServer()
+        self.tracking_server = self.settings['nblineage_tracking_server']
         self.nb_app = nb_app
 
+    def compute_etag(self):
+        tag = hashlib.sha1()
+        tag.update(self.tracking_server.server_signature.encode('utf-8'))
+        tag.update(b'\0')
+        tag.update(self.nb_app.root_dir.encode('utf-8'))
+        return '"{}"'.format(tag.hexdigest())
+
     @web.authenticated
     def get(self):
+        self.set_header('Cache-Control', 'private, no-cache')
         response = dict(
             signature_id=self.tracking_server.server_signature,
             notebook_dir=self.nb_app.root_dir
         )
         self.finish(response)
+
+class ConfigHandler(JupyterHandler):
+    def initialize(self, save_hooks):
+        self.save_hooks = save_hooks
+
+    @web.authenticated
+    def get(self):
+        response = dict(
+            meme_generation=self.save_hooks.meme_generation,
+            max_history=self.save_hooks.meme_generator.max_history,
+            coalesce_history=self.save_hooks.meme_generator.coalesce_history
+        )
+        self.finish(response)
+
+class NotebookMetadataHandler(JupyterHandler):
+    """Return the notebook and cell metadata of a saved notebook
+
+    Notebook files are read by the streaming reader, without their cell
+    sources and outputs, on a thread of the default executor.
+    """
+
+    @web.authenticated
+    async def get(self):
+        path = self.get_query_argument('path', None)
+        if path is None:
+            raise web.HTTPError(400, 'path is required')
+        if not path.endswith('.ipynb'):
+            raise web.HTTPError(400, 'Not a notebook: {}'.format(path))
+        contents_manager = self.contents_manager
+        # the same checks as the contents API, before reading the file directly
+        if not contents_manager.allow_hidden and \
+                await ensure_async(contents_manager.is_hidden(path)):
+            raise web.HTTPError(404, 'No such notebook: {}'.format(path))
+        if not await ensure_async(contents_manager.file_exists(path)):
+            raise web.HTTPError(404, 'No such notebook: {}'.format(path))
+        if hasattr(contents_manager, '_get_os_path'):
+            os_path = contents_manager._get_os_path(path)
+            nb = await IOLoop.current().run_in_executor(
+                None, nbstream.read_metadata_from_filename, os_path)
+        else:
+            model = await ensure_async(contents_manager.get(path, type='notebook',
+                                                            content=True))
+            nb = model['content']
+        cells = [dict(id=cell.get('id', None), metadata=cell.get('metadata', {}))
+                 for cell in nb['cells']]
+        self.finish(dict(metadata=nb['metadata'], cells=cells))
+
+class LineageCellsHandler(JupyterHandler):
+    def initialize(self, lineage_index, max_limit=1000):
+        self.lineage_index = lineage_index
+        self.max_limit = max_limit
+
+    def _get_limit(self):
+        try:
+            limit = int(self.get_query_argument('limit', '100'))
+        except ValueError:
+            raise web.HTTPError(400, 'Invalid limit')
+        if limit <= 0 or limit > self.max_limit:
+            raise web.HTTPError(400, 'limit must be between 1 and {}'.format(self.max_limit))
+        return limit
+
+    @web.authenticated
+    async def get(self):
+        query = dict(
+            cell_meme=self.get_query_argument('meme', None),
+            notebook_meme=self.get_query_argument('notebook_meme', None),
+            prefix=self.get_query_argument('prefix', None),
+            since=self.get_query_argument('since', None),
+            until=self.get_query_argument('until', None),
+        )
+        if all(value is None for value in query.values()):
+            raise web.HTTPError(400, 'One of meme, notebook_meme, prefix, since or until is required')
+        query_cells = partial(self.lineage_index.query_cells,
+                              limit=self._get_limit(),
+                              cursor=self.get_query_argument('cursor', None),
+                              **query)
+        try:
+            cells, next_cursor = await IOLoop.current().run_in_executor(None, query_cells)
+        except ValueError as e:
+            raise web.HTTPError(400, str(e))
+        self.finish(dict(cells=cells, next_cursor=next_cursor))
+
+class LineageNotebooksHandler(JupyterHandler):
+    def initialize(self, lineage_index):
+        self.lineage_index = lineage_index
+
+    def _find_notebooks(self, notebook_meme, path):
+        if notebook_meme is not None:
+            return self.lineage_index.find_notebooks(notebook_meme)
+        notebook = self.lineage_index.get_notebook(path)
+        return [notebook] if notebook is not None else []
+
+    @web.authenticated
+    async def get(self):
+        notebook_meme = self.get_query_argument('meme', None)
+        path = self.get_query_argument('path', None)
+        if notebook_meme is None and path is None:
+            raise web.HTTPError(400, 'One of meme or path is required')
+        notebooks = await IOLoop.current().run_in_executor(
+            None, self._find_notebooks, notebook_meme, path)
+        self.finish(dict(notebooks=notebooks))
@@ -0,0 +1,231 @@
+import base64
+import json
+import os.path
+import sqlite3
+import threading
+
+from traitlets.config import LoggingConfigurable
+from traitlets import Unicode, default
+
+from .nbstream import read_metadata_from_filename
+from .tracking_server import get_data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notebooks (
+    path TEXT PRIMARY KEY,
+    notebook_meme TEXT,
+    mtime REAL,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS notebooks_notebook_meme ON notebooks (notebook_meme);
+CREATE TABLE IF NOT EXISTS cells (
+    path TEXT NOT NULL,
+    notebook_meme TEXT,
+    cell_meme TEXT,
+    cell_index INTEGER NOT NULL,
+    previous TEXT,
+    next TEXT,
+    execution_end_time TEXT,
+    mtime REAL,
+    PRIMARY KEY (path, cell_index)
+);
+CREATE INDEX IF NOT EXISTS cells_cell_meme ON cells (cell_meme);
+CREATE INDEX IF NOT EXISTS cells_notebook_meme ON cells (notebook_meme);
+CREATE INDEX IF NOT EXISTS cells_execution_end_time ON cells (execution_end_time);
+"""
+
+CELL_COLUMNS = ('path', 'notebook_meme', 'cell_meme', 'cell_index',
+                'previous', 'next', 'execution_end_time', 'mtime')
+NOTEBOOK_COLUMNS = ('path', 'notebook_meme', 'mtime', 'size')
+
+# memes consist of ASCII characters only
+PREFIX_UPPER_BOUND = '\x7f'
+
+def encode_cursor(value, rowid):
+    data = json.dumps([value, rowid]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        value, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor: {}'.format(cursor))
+    if not isinstance(rowid, int):
+        raise ValueError('Invalid cursor: {}'.format(cursor))
+    return value, rowid
+
+def get_notebook_meme(nb):
+    memeobj = nb.get('metadata', {}).get('lc_notebook_meme', None)
+    if not isinstance(memeobj, dict):
+        return None
+    return memeobj.get('current', None)
+
+def cell_rows(path, nb, mtime=None):
+    """Extract the rows of the cells table from a notebook"""
+    notebook_meme = get_notebook_meme(nb)
+    rows = []
+    for index, cell in enumerate(nb.get('cells', [])):
+        memeobj = cell.get('metadata', {}).get('lc_cell_meme', None)
+        if not isinstance(memeobj, dict):
+            memeobj = {}
+        rows.append((path, notebook_meme, memeobj.get('current', None), index,
+                     memeobj.get('previous', None), memeobj.get('next', None),
+                     memeobj.get('execution_end_time', None), mtime))
+    return rows
+
+def extract_notebook(os_path, path, mtime=None, size=None):
+    """Read a notebook file and return an entry for `LineageIndex.update_many`"""
+    nb = read_metadata_from_filename(os_path)
+    return (path, get_notebook_meme(nb), cell_rows(path, nb, mtime), mtime, size)
+
+class LineageIndex(LoggingConfigurable):
+    """An index of notebook and cell memes backed by SQLite"""
+
+    index_file = Unicode(
+        help="""The SQLite file where the lineage index is stored."""
+    ).tag(config=True)
+    @default('index_file')
+    def _index_file_default(self):
+        return os.path.join(get_data_dir(), 'nblineage_index.db')
+
+    def __init__(self, **kwargs):
+        super(LineageIndex, self).__init__(**kwargs)
+        self._connection = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self):
+        with self._lock:
+            if self._connection is None:
+                self.log.debug('Open lineage index: {}'.format(self.index_file))
+                self._connection = sqlite3.connect(self.index_file,
+                                                   check_same_thread=False)
+                self._connection.executescript(SCHEMA)
+            return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def update_notebook(self, path, nb, mtime=None, size=None):
+        """Replace the rows of a notebook in a single transaction"""
+        self.update_rows(path, get_notebook_meme(nb), cell_rows(path, nb, mtime),
+                         mtime=mtime, size=size)
+
+    def update_rows(self, path, notebook_meme, rows, mtime=None, size=None):
+        self.update_many([(path, notebook_meme, rows, mtime, size)])
+
+    def update_many(self, entries):
+        """Replace the rows of several notebooks in a single transaction.
+
+        Each entry is a tuple of (path, notebook_meme, rows, mtime, size).
+        """
+        conn = self.connection
+        with self._lock, conn:
+            for path, notebook_meme, rows, mtime, size in entries:
+                conn.execute('DELETE FROM cells WHERE path = ?', (path,))
+                conn.executemany('INSERT INTO cells ({}) VALUES ({})'.format(
+                    ', '.join(CELL_COLUMNS), ', '.join('?' * len(CELL_COLUMNS))), rows)
+                conn.execute('INSERT OR REPLACE INTO notebooks (path, notebook_meme, mtime, size) '
+                             'VALUES (?, ?, ?, ?)', (path, notebook_meme, mtime, size))
+
+    def remove_notebook(self, path):
+        self.remove_notebooks([path])
+
+    def remove_notebooks(self, paths):
+        conn = self.connection
+        with self._lock, conn:
+            for path in paths:
+                conn.execute('DELETE FROM cells WHERE path = ?', (path,))
+                conn.execute('DELETE FROM notebooks WHERE path = ?', (path,))
+
+    def notebook_stats(self):
+        """Return a dict of path to (mtime, size) of all indexed notebooks"""
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT path, mtime, size FROM notebooks').fetchall()
+        return dict((path, (mtime, size)) for path, mtime, size in rows)
+
+    def get_notebook(self, path):
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT {} FROM notebooks WHERE path = ?'.format(', '.join(NOTEBOOK_COLUMNS)),
+                (path,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(NOTEBOOK_COLUMNS, row))
+
+    def find_notebooks(self, notebook_meme):
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT {} FROM notebooks WHERE notebook_meme = ? ORDER BY path'.format(
+                    ', '.join(NOTEBOOK_COLUMNS)), (notebook_meme,)).fetchall()
+        return [dict(zip(NOTEBOOK_COLUMNS, row)) for row in rows]
+
+    def find_cells(self, cell_meme):
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT {} FROM cells WHERE cell_meme = ? ORDER BY path, cell_index'.format(
+                    ', '.join(CELL_COLUMNS)), (cell_meme,)).fetchall()
+        return [dict(zip(CELL_COLUMNS, row)) for row in rows]
+
+    def query_cells(self, cell_meme=None, notebook_meme=None, prefix=None,
+                    since=None, until=None, limit=100, cursor=None):
+        """Find cells by meme, notebook meme, meme prefix or execution time range.
+
+        Results are ordered by the indexed column used for the lookup and
+        returned in pages of `limit` rows. Returns the rows and a cursor for
+        the next page, or None if there are no more rows.
+        """
+        conditions = []
+        params = []
+        if cell_meme is not None:
+            conditions.append('cell_meme = ?')
+            params.append(cell_meme)
+        if notebook_meme is not None:
+            conditions.append('notebook_meme = ?')
+            params.append(notebook_meme)
+        if prefix is not None:
+            conditions.append('cell_meme >= ? AND cell_meme < ?')
+            params.extend([prefix, prefix + PREFIX_UPPER_BOUND])
+        if since is not None:
+            conditions.append('execution_end_time >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('execution_end_time < ?')
+            params.append(until)
+        if len(conditions) == 0:
+            raise ValueError('No query condition')
+
+        if cell_meme is None and notebook_meme is None and prefix is not None:
+            order_column = 'cell_meme'
+        elif cell_meme is None and notebook_meme is None:
+            order_column = 'execution_end_time'
+        else:
+            order_column = None
+
+        if cursor is not None:
+            value, rowid = decode_cursor(cursor)
+            if order_column is None:
+                conditions.append('rowid > ?')
+                params.append(rowid)
+            else:
+                conditions.append('({}, rowid) > (?, ?)'.format(order_column))
+                params.extend([value, rowid])
+        order = 'rowid' if order_column is None else '{}, rowid'.format(order_column)
+
+        sql = 'SELECT rowid, {} FROM cells WHERE {} ORDER BY {} LIMIT ?'.format(
+            ', '.join(CELL_COLUMNS), ' AND '.join(conditions), order)
+        params.append(limit + 1)
+        with self._lock:
+            rows = self.connection.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = dict(zip(CELL_COLUMNS, rows[-1][1:]))
+            value = last[order_column] if order_column is not None else None
+            next_cursor = encode_cursor(value, rows[-1][0])
+        return [dict(zip(CELL_COLUMNS, row[1:])) for row in rows], next_cursor
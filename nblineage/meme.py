@@ -2,10 +2,11 @@ import io
 from copy import deepcopy
 import nbformat
 from nbformat import notebooknode
-from uuid import uuid1
 
 from traitlets.config.configurable import LoggingConfigurable
-from traitlets import Int, Bool
+from traitlets import Int, Bool, Unicode, Enum, validate
+
+from . import uuidgen
 
 def enum_prev_next_items(items):
     if len(items) == 0:
@@ -16,13 +17,101 @@ def enum_prev_next_items(items):
     next_items.append(None)
     return zip(prev_items, items, next_items)
 
+def split_branch(meme):
+    """Split a meme into its UUID part and its branch suffix
+
+    A branched meme `<uuid>-<count>-<branch>...` is split into `<uuid>`
+    and `-<count>-<branch>...`; other memes have an empty suffix.
+    """
+    parts = meme.split('-', 5)
+    if len(parts) < 6:
+        return meme, ''
+    return '-'.join(parts[:5]), '-' + parts[5]
+
 def get_or_create(d, name, init):
     if name not in d:
         d[name] = init()
     return d[name]
 
+def copy_metadata(nb):
+    """Copy a notebook duplicating only the notebook and cell metadata
+
+    The other fields of the notebook and cells, such as `source` and
+    `outputs`, are shared with the original notebook by reference.
+    """
+    newnb = notebooknode.NotebookNode(nb)
+    newnb.metadata = notebooknode.from_dict(deepcopy(nb.get('metadata', {})))
+    cells = []
+    for cell in nb.get('cells', []):
+        newcell = notebooknode.NotebookNode(cell)
+        newcell.metadata = notebooknode.from_dict(deepcopy(cell.get('metadata', {})))
+        cells.append(newcell)
+    newnb.cells = cells
+    return newnb
+
+def copy_notebook(nb, copy):
+    if copy == 'metadata':
+        return copy_metadata(nb)
+    if copy:
+        return notebooknode.from_dict(nb.copy())
+    return nb
+
+class DirtyCells(object):
+    """Indices of the cells whose previous or next cell may have changed
+
+    Changes are recorded in the order they are applied to the cell list,
+    and recorded indices are shifted by later changes.
+    """
+
+    def __init__(self):
+        self._indices = set()
+
+    def __len__(self):
+        return len(self._indices)
+
+    def insert(self, index, count=1):
+        """Record that `count` cells were inserted at `index`"""
+        self._indices = set(i + count if i >= index else i for i in self._indices)
+        self._indices.update(range(index - 1, index + count + 1))
+
+    def delete(self, index, count=1):
+        """Record that `count` cells were deleted from `index`"""
+        self._indices = set(i - count if i >= index + count else i
+                            for i in self._indices
+                            if i < index or i >= index + count)
+        self._indices.update((index - 1, index))
+
+    def move(self, from_index, to_index, count=1):
+        """Record that `count` cells were moved from `from_index` to `to_index`"""
+        self.delete(from_index, count)
+        self.insert(to_index, count)
+
+    def indices(self, length):
+        """Return the sorted indices of dirty cells in a list of `length` cells"""
+        return sorted(i for i in self._indices if 0 <= i < length)
+
+    def clear(self):
+        self._indices.clear()
+
 class MemeGenerator(LoggingConfigurable):
 
+    id_generator = Unicode('uuid1',
+                           help='The generator of new memes: ' + uuidgen.ID_GENERATOR_HELP
+                          ).tag(config=True)
+
+    @validate('id_generator')
+    def _validate_id_generator(self, proposal):
+        return uuidgen.validate_id_generator(proposal['value'])
+
+    max_history = Int(None, min=0, allow_none=True,
+                      help='Max size of the history of each cell, oldest entries are dropped; '
+                           'by default unlimited'
+                     ).tag(config=True)
+
+    coalesce_history = Bool(True, allow_none=False,
+                            help='If True, do not append a history entry identical to the last one'
+                           ).tag(config=True)
+
     def __init__(self, **kwargs):
         super(MemeGenerator, self).__init__(**kwargs)
 
@@ -35,76 +124,182 @@ class MemeGenerator(LoggingConfigurable):
         return self.from_notebook_node(nbformat.read(notebook_file_stream, as_version=4))
 
     def from_notebook_node(self, nb, copy=False):
-        if copy:
-            nb = notebooknode.from_dict(nb.copy())
+        """Generate memes of a notebook
 
-        self._update_prev_next_history(nb)
-        self._generate_notebook_meme(nb)
-        self._generate_cell_meme(nb)
-        self._update_prev_next_meme(nb)
+        The notebook is updated in place unless `copy` is True, which copies
+        the whole notebook, or 'metadata', which copies only the notebook
+        and cell metadata.
+        """
+        nb = copy_notebook(nb, copy)
 
-        return nb
+        new_id = uuidgen.IdBuffer(uuidgen.get_id_generator(self.id_generator))
+        self._generate_notebook_meme(nb, new_id)
+        self._update_cell_memes(nb, new_id)
 
-    def _update_prev_next_history(self, nb):
-        for prev_cell, cell, next_cell in enum_prev_next_items(nb.cells):
-            if 'lc_cell_meme' not in cell.metadata:
-                continue
-            memeobj = cell.metadata['lc_cell_meme']
+        return nb
 
-            if 'current' not in memeobj:
-                continue
-            if 'previous' not in memeobj:
-                continue
-            if 'next' not in memeobj:
-                continue
+    def update_dirty_cells(self, nb, dirty_cells):
+        """Update the memes of the cells around the changes in `dirty_cells`
+
+        `dirty_cells` is a `DirtyCells` which recorded the cells inserted,
+        deleted or moved since the memes were last updated. Only the
+        affected cells and their neighbours are visited; the result is the
+        same as `from_notebook_node` on the whole notebook.
+        """
+        new_id = uuidgen.IdBuffer(uuidgen.get_id_generator(self.id_generator))
+        self._generate_notebook_meme(nb, new_id)
+        cells = nb.cells
+        indices = dirty_cells.indices(len(cells))
+        states = {}
+        for i in indices:
+            for j in (i - 1, i, i + 1):
+                if 0 <= j < len(cells) and j not in states:
+                    states[j] = self._get_cell_state(cells[j])
+        memeobjs = dict((j, self._ensure_cell_meme(cells[j], new_id)) for j in sorted(states))
+        for i in indices:
+            memeobj = memeobjs[i]
+            self._update_cell_history(memeobj, states[i], states.get(i - 1), states.get(i + 1))
+            memeobj['previous'] = memeobjs[i - 1]['current'] if i > 0 else None
+            memeobj['next'] = memeobjs[i + 1]['current'] if i + 1 < len(cells) else None
+        return nb
 
-            prev_meme = memeobj['previous'];
-            next_meme = memeobj['next'];
-            prev_memeobj = None
-            if prev_cell is not None:
-                prev_memeobj = prev_cell.metadata.get('lc_cell_meme', None)
+    def _update_cell_memes(self, nb, new_id):
+        """Update the memes of all cells in a single pass
+
+        For each cell, the history is updated if its previous or next cell
+        has changed, a meme is generated if it has none, and the previous
+        and next memes are updated. The original state of the next cell is
+        captured before its meme is generated, so that the history is
+        computed from the memes as they were before the update.
+        """
+        cells = nb.cells
+        if len(cells) == 0:
+            return
+        prev_state = None
+        prev_meme = None
+        state = self._get_cell_state(cells[0])
+        memeobj = self._ensure_cell_meme(cells[0], new_id)
+        last = len(cells) - 1
+        for i in range(len(cells)):
+            next_state = None
             next_memeobj = None
-            if next_cell is not None:
-                next_memeobj = next_cell.metadata.get('lc_cell_meme', None)
-
-            prev_changed = prev_memeobj is not None and prev_memeobj['current'] != prev_meme
-            prev_changed = prev_changed or (prev_cell is not None and prev_memeobj is None)
-            next_changed = next_memeobj is not None and next_memeobj['current'] != next_meme
-            next_changed = next_changed or (next_cell is not None and next_memeobj is None)
-
-            if prev_changed or next_changed:
-                history = get_or_create(memeobj, 'history', lambda: list())
-                history.append({
-                    'current': memeobj['current'],
-                    'previous': memeobj['previous'],
-                    'next': memeobj['next']
-                })
-
-    def _generate_notebook_meme(self, nb):
-        memeobj = get_or_create(nb.metadata, 'lc_notebook_meme', lambda: dict())
-        if 'current' not in memeobj:
-            memeobj['current'] = str(uuid1())
+            if i < last:
+                next_state = self._get_cell_state(cells[i + 1])
+                next_memeobj = self._ensure_cell_meme(cells[i + 1], new_id)
 
-    def _generate_cell_meme(self, nb):
-        for cell in nb.cells:
-            memeobj = get_or_create(cell.metadata, 'lc_cell_meme', lambda: dict())
-            if 'current' not in memeobj:
-                memeobj['current'] = str(uuid1())
+            self._update_cell_history(memeobj, state, prev_state, next_state)
 
-    def _update_prev_next_meme(self, nb):
-        for prev_cell, cell, next_cell in enum_prev_next_items(nb.cells):
-            memeobj = get_or_create(cell.metadata, 'lc_cell_meme', lambda: dict())
-            prev_meme = None
-            if prev_cell is not None:
-                prev_meme = prev_cell.metadata['lc_cell_meme']['current']
+            meme = memeobj['current']
             memeobj['previous'] = prev_meme
-            next_meme = None
-            if next_cell is not None:
-                next_meme = next_cell.metadata['lc_cell_meme']['current']
-            memeobj['next'] = next_meme
+            memeobj['next'] = next_memeobj['current'] if next_memeobj is not None else None
+
+            prev_state, prev_meme = state, meme
+            state, memeobj = next_state, next_memeobj
+
+    def _update_cell_history(self, memeobj, state, prev_state, next_state):
+        """Append the previous memes of a cell to its history if its
+        neighbours have changed
+
+        The states are (memeobj, has_current, current) of the cell and its
+        neighbours before the update, or None if there is no neighbour.
+        """
+        orig_memeobj, has_current, current = state
+        if not has_current or 'previous' not in orig_memeobj or 'next' not in orig_memeobj:
+            return
+        prev_changed = (prev_state is not None and
+                        (prev_state[0] is None or
+                         prev_state[2] != orig_memeobj['previous']))
+        next_changed = (next_state is not None and
+                        (next_state[0] is None or
+                         next_state[2] != orig_memeobj['next']))
+        if prev_changed or next_changed:
+            self._append_history(memeobj, {
+                'current': current,
+                'previous': orig_memeobj['previous'],
+                'next': orig_memeobj['next']
+            })
+
+    def _append_history(self, memeobj, entry):
+        history = get_or_create(memeobj, 'history', lambda: list())
+        if not (self.coalesce_history and len(history) > 0 and history[-1] == entry):
+            history.append(entry)
+        max_history = self.max_history
+        if max_history is not None and len(history) > max_history:
+            del history[:len(history) - max_history]
+
+    def _get_cell_state(self, cell):
+        memeobj = cell.metadata.get('lc_cell_meme', None)
+        if memeobj is None:
+            return None, False, None
+        return memeobj, 'current' in memeobj, memeobj.get('current', None)
+
+    def _ensure_cell_meme(self, cell, new_id):
+        memeobj = get_or_create(cell.metadata, 'lc_cell_meme', lambda: dict())
+        if 'current' not in memeobj:
+            memeobj['current'] = new_id()
+        return memeobj
+
+    def _generate_notebook_meme(self, nb, new_id):
+        memeobj = get_or_create(nb.metadata, 'lc_notebook_meme', lambda: dict())
+        if 'current' not in memeobj:
+            memeobj['current'] = new_id()
+
+def _new_column(entry, root_cells):
+    if isinstance(entry, list):
+        return [new for orig, new in entry]
+    return entry.get('new', root_cells)
+
+def _delta_entry(table, prev_new):
+    """Encode the original memes of a table as indices of `prev_new` where possible"""
+    prev_index = dict()
+    for i, meme in enumerate(prev_new or []):
+        prev_index.setdefault(meme, i)
+    return {'orig': [prev_index.get(orig, orig) for orig, new in table]}
+
+def expand_root_cells_history(memeobj):
+    """Return the root cells history of a notebook meme as [orig, new] tables
+
+    Entries of `root_cells_history` are either tables of [orig, new] memes
+    of the cells, or delta entries. A delta entry is a dict whose `orig`
+    items are memes or indices of the new memes of the previous entry, and
+    whose `new` is the list of new memes, omitted in the last entry when it
+    equals `root_cells`.
+    """
+    root_cells = memeobj.get('root_cells', [])
+    tables = []
+    prev_new = []
+    for entry in memeobj.get('root_cells_history', []):
+        if isinstance(entry, list):
+            table = [list(pair) for pair in entry]
+        else:
+            orig = [prev_new[x] if isinstance(x, int) else x for x in entry['orig']]
+            table = [[o, n] for o, n in zip(orig, entry.get('new', root_cells))]
+        tables.append(table)
+        prev_new = [new for orig, new in table]
+    return tables
+
+def encode_root_cells_history(tables, root_cells=None):
+    """Encode [orig, new] tables as delta entries of `root_cells_history`"""
+    history = []
+    prev_new = None
+    for table in tables:
+        entry = _delta_entry(table, prev_new)
+        prev_new = entry['new'] = [new for orig, new in table]
+        history.append(entry)
+    if len(history) > 0 and history[-1]['new'] == root_cells:
+        del history[-1]['new']
+    return history
 
 class NewRootMemeGenerator(LoggingConfigurable):
 
+    id_generator = Unicode('uuid1',
+                           help='The generator of new memes: ' + uuidgen.ID_GENERATOR_HELP
+                          ).tag(config=True)
+
+    @validate('id_generator')
+    def _validate_id_generator(self, proposal):
+        return uuidgen.validate_id_generator(proposal['value'])
+
     trim_history = Int(None, min=0, allow_none=True,
                        help='Max size of history for trimming, by default do nothing'
                       ).tag(config=True)
@@ -113,9 +308,25 @@ class NewRootMemeGenerator(LoggingConfigurable):
                        help='If True, clear server signature metadata'
                       ).tag(config=True)
 
-    def __init__(self, **kwargs):
+    root_cells_history_format = Enum(['table', 'delta'], 'table',
+                                     help='The format of new root_cells_history entries: "table" '
+                                          'of [orig, new] memes, or "delta" which refers to the '
+                                          'memes of the previous entry and root_cells'
+                                    ).tag(config=True)
+
+    def __init__(self, meme_map=None, **kwargs):
+        """Create a generator
+
+        If `meme_map` is given, such as a `nblineage.mememap.MemeMap`, the
+        new memes are looked up by the UUID part of the original memes in
+        it and the new memes generated for other memes are added to it, so
+        that the same meme maps to the same new meme in all notebooks. The
+        branch suffix of a meme is kept, so that if `X` maps to `Y`, the
+        branched copy `X-1-abcd` maps to `Y-1-abcd`.
+        """
         super(NewRootMemeGenerator, self).__init__(**kwargs)
         self.new_cells_history = None
+        self.meme_map = meme_map
 
     def from_filename(self, notebook_filename):
         self.log.debug('Read notebook file: {}'.format(notebook_filename))
@@ -126,18 +337,25 @@ class NewRootMemeGenerator(LoggingConfigurable):
         return self.from_notebook_node(nbformat.read(notebook_file_stream, as_version=4))
 
     def from_notebook_node(self, nb, copy=False):
-        if copy:
-            nb = notebooknode.from_dict(nb.copy())
+        """Generate memes of a notebook
+
+        The notebook is updated in place unless `copy` is True, which copies
+        the whole notebook, or 'metadata', which copies only the notebook
+        and cell metadata.
+        """
+        nb = copy_notebook(nb, copy)
 
-        MemeGenerator().from_notebook_node(nb)
-        orig_nb = deepcopy(nb)
+        MemeGenerator(parent=self, id_generator=self.id_generator).from_notebook_node(nb)
+        orig_memes = [self._get_current_meme(cell) for cell in nb.cells]
 
+        new_ids = self._new_memes([nb.metadata['lc_notebook_meme']['current']] + orig_memes)
         self._update_prev_next_history(nb)
-        self._update_notebook_meme(nb)
-        self._update_cell_meme(nb)
+        self._update_notebook_meme(nb, new_ids[0])
+        self._update_cell_meme(nb, new_ids[1:])
         self._update_prev_next_cell_meme(nb)
+        prev_root_cells = nb.metadata['lc_notebook_meme'].get('root_cells', None)
         self._update_root_cells(nb)
-        self._update_root_cells_history(orig_nb, nb)
+        self._update_root_cells_history(orig_memes, nb, prev_root_cells)
 
         if self.clear_server_signature:
             self.log.debug('Clear server signature metadata')
@@ -146,6 +364,17 @@ class NewRootMemeGenerator(LoggingConfigurable):
 
         return nb
 
+    def _new_memes(self, orig_memes):
+        generate = uuidgen.get_id_generator(self.id_generator)
+        if self.meme_map is None:
+            return generate(len(orig_memes))
+        split_memes = [split_branch(orig_meme) for orig_meme in orig_memes]
+        missing = list(dict.fromkeys(base for base, suffix in split_memes
+                                     if self.meme_map.get(base) is None))
+        for base, new_meme in zip(missing, generate(len(missing))):
+            self.meme_map[base] = new_meme
+        return [self.meme_map[base] + suffix for base, suffix in split_memes]
+
     def _update_prev_next_history(self, nb):
         for prev_cell, cell, next_cell in enum_prev_next_items(nb.cells):
             prev_memeobj = None
@@ -179,7 +408,7 @@ class NewRootMemeGenerator(LoggingConfigurable):
                     history = history[-size:]
                 memeobj['history'] = history
 
-    def _update_notebook_meme(self, nb):
+    def _update_notebook_meme(self, nb, new_meme):
         memeobj = nb.metadata['lc_notebook_meme']
         history = get_or_create(memeobj, 'history', lambda: list())
         history.append(memeobj['current'])
@@ -190,11 +419,11 @@ class NewRootMemeGenerator(LoggingConfigurable):
             else:
                 history = history[-size:]
             memeobj['history'] = history
-        memeobj['current'] = str(uuid1())
+        memeobj['current'] = new_meme
 
-    def _update_cell_meme(self, nb):
-        for cell in nb.cells:
-            cell.metadata['lc_cell_meme']['current'] = str(uuid1())
+    def _update_cell_meme(self, nb, new_memes):
+        for cell, new_meme in zip(nb.cells, new_memes):
+            cell.metadata['lc_cell_meme']['current'] = new_meme
 
     def _update_prev_next_cell_meme(self, nb):
         for prev_cell, cell, next_cell in enum_prev_next_items(nb.cells):
@@ -220,20 +449,30 @@ class NewRootMemeGenerator(LoggingConfigurable):
         root_cells = [x.metadata['lc_cell_meme']['current'] for x in nb.cells]
         nb.metadata['lc_notebook_meme']['root_cells']= root_cells
 
-    def _update_root_cells_history(self, orig_nb, nb):
+    def _get_current_meme(self, cell):
+        if ('lc_cell_meme' in cell.metadata and
+            'current' in cell.metadata["lc_cell_meme"]):
+            return cell.metadata['lc_cell_meme']['current']
+        return None
+
+    def _update_root_cells_history(self, orig_memes, nb, prev_root_cells=None):
         table = []
-        for i in range(len(nb.cells)):
-            orig_cell = orig_nb.cells[i]
-            orig_meme = None
-            if ('lc_cell_meme' in orig_cell.metadata and
-                'current' in orig_cell.metadata["lc_cell_meme"]):
-                orig_meme = orig_cell.metadata['lc_cell_meme']['current']
-            meme = nb.cells[i].metadata['lc_cell_meme']['current']
+        for orig_meme, cell in zip(orig_memes, nb.cells):
+            meme = cell.metadata['lc_cell_meme']['current']
             table.append([orig_meme, meme])
 
         memeobj = nb.metadata['lc_notebook_meme']
         history = get_or_create(memeobj, 'root_cells_history', lambda: list())
-        history.append(table)
+        prev_new = None
+        if len(history) > 0:
+            prev_new = _new_column(history[-1], prev_root_cells)
+            if isinstance(history[-1], dict) and 'new' not in history[-1] and prev_new is not None:
+                # the last delta entry referred to the replaced root_cells
+                history[-1]['new'] = prev_new
+        if self.root_cells_history_format == 'delta':
+            history.append(_delta_entry(table, prev_new))
+        else:
+            history.append(table)
 
         self.new_cells_history = table
         return table
@@ -0,0 +1,191 @@
+"""A compact map of old memes to new memes
+
+Memes in the UUID format are stored as 16-byte keys and values in an
+open addressing hash table backed by bytearrays, which takes 55 to 90
+bytes per meme instead of about 200 bytes for a dict of strings, at the
+cost of slower lookups. Old memes with branch numbers, such as
+`<uuid>-2-a3f2-bc1e`, are stored as the 16-byte UUID and the offset of
+their suffix `-2-a3f2-bc1e` in a side bytearray of length-prefixed
+suffixes, which adds 4 bytes per slot and the suffix plus one byte per
+branched meme. Other memes are kept in a dict.
+"""
+import io
+from array import array
+
+_SIZE = 16
+
+def _pack(meme):
+    """Pack a lowercase UUID string into 16 bytes, or return None"""
+    if len(meme) != 36 or meme[8] != '-' or meme[13] != '-' or meme[18] != '-' or meme[23] != '-':
+        return None
+    h = meme.replace('-', '')
+    if len(h) != 32 or h.lower() != h:
+        return None
+    try:
+        return bytes.fromhex(h)
+    except ValueError:
+        return None
+
+def _split(meme):
+    """Split a meme into its packed UUID and its encoded branch suffix, or return None"""
+    if len(meme) > 36 and meme[36] == '-':
+        key = _pack(meme[:36])
+        suffix = meme[36:].encode('utf-8')
+        return None if key is None or len(suffix) > 255 else (key, suffix)
+    key = _pack(meme)
+    return None if key is None else (key, b'')
+
+def _unpack(data):
+    h = data.hex()
+    return '-'.join((h[:8], h[8:12], h[12:16], h[16:20], h[20:]))
+
+class MemeMap(object):
+    """A map of old memes to new memes"""
+
+    def __init__(self, capacity=1024):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self._init_table(size)
+        # length-prefixed suffixes of the keys, the suffix at 0 is empty
+        self._suffixes = bytearray(1)
+        self._others = dict()
+
+    def _init_table(self, capacity):
+        self._capacity = capacity
+        self._count = 0
+        self._used = bytearray(capacity)
+        self._keys = bytearray(capacity * _SIZE)
+        self._key_suffixes = array('I', [0]) * capacity
+        self._values = bytearray(capacity * _SIZE)
+
+    def _suffix(self, offset):
+        suffixes = self._suffixes
+        return suffixes[offset + 1:offset + 1 + suffixes[offset]]
+
+    def _find(self, key, suffix):
+        """Return the slot of a key, or the empty slot to insert it to"""
+        mask = self._capacity - 1
+        keys = self._keys
+        key_suffixes = self._key_suffixes
+        used = self._used
+        i = (hash(key) ^ hash(suffix)) & mask
+        while used[i]:
+            offset = i * _SIZE
+            if keys[offset:offset + _SIZE] == key and \
+                    (key_suffixes[i] == 0 if not suffix else self._suffix(key_suffixes[i]) == suffix):
+                return i
+            i = (i + 1) & mask
+        return i
+
+    def _grow(self):
+        used = self._used
+        keys = self._keys
+        key_suffixes = self._key_suffixes
+        values = self._values
+        self._init_table(self._capacity * 2)
+        for i in range(len(used)):
+            if used[i]:
+                offset = i * _SIZE
+                suffix_offset = key_suffixes[i]
+                j = self._find(bytes(keys[offset:offset + _SIZE]),
+                               bytes(self._suffix(suffix_offset)))
+                self._set_slot(j, keys[offset:offset + _SIZE], suffix_offset,
+                               values[offset:offset + _SIZE])
+
+    def _set_slot(self, i, key, suffix_offset, value):
+        offset = i * _SIZE
+        if not self._used[i]:
+            self._used[i] = 1
+            self._keys[offset:offset + _SIZE] = key
+            self._key_suffixes[i] = suffix_offset
+            self._count += 1
+        self._values[offset:offset + _SIZE] = value
+
+    def _insert(self, key, suffix, value):
+        i = self._find(key, suffix)
+        suffix_offset = 0
+        if suffix and not self._used[i]:
+            suffix_offset = len(self._suffixes)
+            self._suffixes.append(len(suffix))
+            self._suffixes += suffix
+        self._set_slot(i, key, suffix_offset, value)
+
+    def _slot(self, split_meme):
+        """Return the slot of a split old meme, or None if it is not in the table"""
+        i = self._find(*split_meme)
+        return i if self._used[i] else None
+
+    def get(self, old_meme, default=None):
+        split_meme = _split(old_meme)
+        if split_meme is None:
+            return self._others.get(old_meme, default)
+        i = self._slot(split_meme)
+        if i is None:
+            # mapped to a meme not in the UUID format
+            return self._others.get(old_meme, default)
+        return _unpack(self._values[i * _SIZE:(i + 1) * _SIZE])
+
+    def __getitem__(self, old_meme):
+        new_meme = self.get(old_meme)
+        if new_meme is None:
+            raise KeyError(old_meme)
+        return new_meme
+
+    def __contains__(self, old_meme):
+        return self.get(old_meme) is not None
+
+    def __setitem__(self, old_meme, new_meme):
+        split_meme = _split(old_meme)
+        value = _pack(new_meme)
+        if split_meme is None or value is None:
+            # a meme may only be in one of the tables
+            if split_meme is not None and self._slot(split_meme) is not None:
+                raise ValueError('{} is mapped to a meme in the UUID format'.format(old_meme))
+            self._others[old_meme] = new_meme
+            return
+        if old_meme in self._others:
+            raise ValueError('{} is mapped to a meme not in the UUID format'.format(old_meme))
+        if (self._count + 1) * 3 > self._capacity * 2:
+            self._grow()
+        self._insert(split_meme[0], split_meme[1], value)
+
+    def __len__(self):
+        return self._count + len(self._others)
+
+    def items(self):
+        """Iterate over the old and new memes, in no particular order"""
+        used = self._used
+        keys = self._keys
+        key_suffixes = self._key_suffixes
+        values = self._values
+        for i in range(self._capacity):
+            if used[i]:
+                offset = i * _SIZE
+                old_meme = _unpack(keys[offset:offset + _SIZE])
+                if key_suffixes[i]:
+                    old_meme += self._suffix(key_suffixes[i]).decode('utf-8')
+                yield old_meme, _unpack(values[offset:offset + _SIZE])
+        for item in self._others.items():
+            yield item
+
+    def write(self, f):
+        """Write the map as lines of tab-separated old and new memes sorted by old memes"""
+        for old_meme, new_meme in sorted(self.items()):
+            f.write(u'{}\t{}\n'.format(old_meme, new_meme))
+
+    def read(self, f):
+        """Add the lines of tab-separated old and new memes of a file to the map"""
+        for line in f:
+            line = line.rstrip('\n')
+            if len(line) == 0:
+                continue
+            old_meme, new_meme = line.split('\t')
+            self[old_meme] = new_meme
+
+    @classmethod
+    def load(cls, path):
+        meme_map = cls()
+        with io.open(path, encoding='utf-8') as f:
+            meme_map.read(f)
+        return meme_map
@@ -0,0 +1,349 @@
+"""Streaming access to the metadata of notebook files
+
+`read_metadata` extracts the notebook and cell metadata of a notebook file
+without decoding the `source`, `outputs` and `attachments` of cells, so that
+memory usage does not depend on the size of outputs.
+"""
+import io
+import json
+import re
+
+import nbformat
+
+# cell fields that can be large and are skipped without decoding
+SKIPPED_CELL_FIELDS = ('source', 'outputs', 'attachments')
+
+_STRING_SPECIAL = re.compile(rb'["\\]')
+_CONTAINER_SPECIAL = re.compile(rb'["{}\[\]]')
+_SCALAR_END = re.compile(rb'[\s,\]}]')
+_WHITESPACE = b' \t\r\n'
+_BOM = b'\xef\xbb\xbf'
+
+class UnsupportedNotebookError(ValueError):
+    pass
+
+class _Scanner(object):
+    """An incremental JSON scanner over a binary stream
+
+    Values can be skipped without being decoded. Only the bytes from the
+    start of the value being captured, or from the current position, are
+    kept in memory.
+    """
+
+    def __init__(self, stream, chunk_size=65536):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = b''
+        self.pos = 0
+        # absolute offset of buf[0] in the stream
+        self.base = 0
+        self.capture_start = None
+        self.eof = False
+
+    @property
+    def offset(self):
+        return self.base + self.pos
+
+    def _fill(self):
+        if self.eof:
+            return False
+        data = self.stream.read(self.chunk_size)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        keep = self.pos if self.capture_start is None else self.capture_start
+        if keep > 0:
+            self.buf = self.buf[keep:]
+            self.base += keep
+            self.pos -= keep
+            if self.capture_start is not None:
+                self.capture_start -= keep
+        if not data:
+            self.eof = True
+            return False
+        self.buf += data
+        return True
+
+    def _error(self, message):
+        return ValueError('{} at offset {}'.format(message, self.offset))
+
+    def skip_bom(self):
+        while len(self.buf) - self.pos < len(_BOM) and self._fill():
+            pass
+        if self.buf.startswith(_BOM, self.pos):
+            self.pos += len(_BOM)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf):
+                c = self.buf[self.pos:self.pos + 1]
+                if c not in _WHITESPACE:
+                    return c
+                self.pos += 1
+            if not self._fill():
+                return None
+
+    def expect(self, c):
+        if self.peek() != c:
+            raise self._error('Expected {!r}'.format(c.decode('ascii')))
+        self.pos += 1
+
+    def skip_string(self):
+        self.expect(b'"')
+        while True:
+            m = _STRING_SPECIAL.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise self._error('Unterminated string')
+                continue
+            if m.group() == b'"':
+                self.pos = m.end()
+                return
+            # skip the escaped character
+            self.pos = m.end()
+            if self.pos >= len(self.buf) and not self._fill():
+                raise self._error('Unterminated string')
+            self.pos += 1
+
+    def skip_scalar(self):
+        while True:
+            m = _SCALAR_END.search(self.buf, self.pos)
+            if m is not None:
+                self.pos = m.start()
+                return
+            self.pos = len(self.buf)
+            if not self._fill():
+                return
+
+    def skip_container(self):
+        depth = 0
+        while True:
+            m = _CONTAINER_SPECIAL.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise self._error('Unterminated container')
+                continue
+            c = m.group()
+            if c == b'"':
+                self.pos = m.start()
+                self.skip_string()
+                continue
+            self.pos = m.end()
+            if c in b'{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def skip_value(self):
+        c = self.peek()
+        if c is None:
+            raise self._error('Unexpected end of data')
+        if c == b'"':
+            self.skip_string()
+        elif c in b'{[':
+            self.skip_container()
+        else:
+            self.skip_scalar()
+
+    def read_value(self):
+        """Decode the next value, returning it with its (start, end) offsets"""
+        self.peek()
+        self.capture_start = self.pos
+        try:
+            self.skip_value()
+            data = self.buf[self.capture_start:self.pos]
+            start = self.base + self.capture_start
+        finally:
+            self.capture_start = None
+        return json.loads(data.decode('utf-8')), (start, start + len(data))
+
+    def iter_object(self):
+        """Iterate over the keys of an object
+
+        The caller must consume the value of each key before advancing.
+        """
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self.pos += 1
+            return
+        while True:
+            key, _ = self.read_value()
+            self.expect(b':')
+            yield key
+            c = self.peek()
+            self.pos += 1
+            if c == b'}':
+                return
+            if c != b',':
+                raise self._error('Expected "," or "}"')
+
+    def iter_array(self):
+        """Iterate over the elements of an array
+
+        The caller must consume each element before advancing.
+        """
+        self.expect(b'[')
+        if self.peek() == b']':
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            c = self.peek()
+            self.pos += 1
+            if c == b']':
+                return
+            if c != b',':
+                raise self._error('Expected "," or "]"')
+
+def _read_cell(scanner, cell_spans):
+    cell = {}
+    span = None
+    for key in scanner.iter_object():
+        if key in SKIPPED_CELL_FIELDS:
+            scanner.skip_value()
+        else:
+            cell[key], value_span = scanner.read_value()
+            if key == 'metadata':
+                span = value_span
+    cell_spans.append(span)
+    return cell
+
+def read_metadata_spans(stream, chunk_size=65536):
+    """Read the metadata of a v4 notebook with the byte ranges of metadata
+
+    Returns the notebook as `read_metadata` does and a dict with the
+    (start, end) byte offsets of the notebook metadata (`metadata`) and of
+    the metadata of each cell (`cells`), or None if they are missing.
+    """
+    scanner = _Scanner(stream, chunk_size=chunk_size)
+    scanner.skip_bom()
+    nb = {}
+    spans = dict(metadata=None, cells=[])
+    for key in scanner.iter_object():
+        if key == 'cells':
+            nb['cells'] = [_read_cell(scanner, spans['cells']) for _ in scanner.iter_array()]
+        elif key == 'worksheets':
+            raise UnsupportedNotebookError('nbformat v3 notebooks are not supported')
+        else:
+            nb[key], value_span = scanner.read_value()
+            if key == 'metadata':
+                spans['metadata'] = value_span
+    if scanner.peek() is not None:
+        raise scanner._error('Extra data')
+    if nb.get('nbformat', 4) != 4:
+        raise UnsupportedNotebookError(
+            'nbformat v{} notebooks are not supported'.format(nb.get('nbformat')))
+    nb.setdefault('metadata', {})
+    nb.setdefault('cells', [])
+    return nbformat.from_dict(nb), spans
+
+def read_metadata(stream, chunk_size=65536):
+    """Read the notebook and cell metadata of a v4 notebook from a stream
+
+    Returns a NotebookNode with `metadata`, `nbformat`, `nbformat_minor` and
+    `cells`. Each cell has every field except `source`, `outputs` and
+    `attachments`.
+    """
+    nb, _ = read_metadata_spans(stream, chunk_size=chunk_size)
+    return nb
+
+def read_metadata_from_filename(notebook_filename):
+    """Read the metadata of a notebook file
+
+    Falls back to reading the whole notebook with nbformat for notebooks
+    older than v4.
+    """
+    with io.open(notebook_filename, 'rb') as f:
+        try:
+            return read_metadata(f)
+        except UnsupportedNotebookError:
+            pass
+    with io.open(notebook_filename, encoding='utf-8') as f:
+        return nbformat.read(f, as_version=4)
+
+class _IndentTracker(object):
+    """Track the indentation of the last line written"""
+
+    def __init__(self):
+        self.indent = b''
+        self.in_indent = True
+
+    def feed(self, data):
+        i = data.rfind(b'\n')
+        if i >= 0:
+            self.indent = b''
+            self.in_indent = True
+            data = data[i + 1:]
+        if self.in_indent:
+            stripped = data.lstrip(b' \t')
+            self.indent += data[:len(data) - len(stripped)]
+            if stripped:
+                self.in_indent = False
+
+def _copy(src, dest, size, tracker, chunk_size):
+    while size > 0:
+        data = src.read(min(size, chunk_size))
+        if not data:
+            raise ValueError('Unexpected end of the source notebook')
+        dest.write(data)
+        tracker.feed(data)
+        size -= len(data)
+
+def _format_value(value, indent):
+    if indent is None:
+        text = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    else:
+        text = json.dumps(value, sort_keys=True, ensure_ascii=False,
+                          indent=1, separators=(',', ': '))
+        text = text.replace('\n', '\n' + indent.decode('utf-8'))
+    return text.encode('utf-8')
+
+def write_spliced(src, dest, nb, spans, chunk_size=65536):
+    """Write a notebook by replacing only the metadata of the source notebook
+
+    `src` is a seekable binary stream of the notebook which `nb` and `spans`
+    were read from by `read_metadata_spans`, positioned at its start. The
+    bytes of the source are copied to the binary stream `dest`, except the
+    metadata that differ from the metadata of `nb`, which are serialized like
+    nbformat does.
+    Returns the number of replaced metadata.
+    """
+    if len(nb.cells) != len(spans['cells']):
+        raise ValueError('The number of cells was changed')
+    items = [(spans['metadata'], nb.metadata)]
+    items.extend(zip(spans['cells'], [cell.metadata for cell in nb.cells]))
+    if any(span is None for span, _ in items):
+        raise ValueError('The source notebook has no metadata to replace')
+    items.sort(key=lambda item: item[0][0])
+
+    start_offset = src.tell()
+    head = src.read(64)
+    src.seek(start_offset)
+    # nbformat writes indented JSON; keep compact notebooks compact
+    indented = re.match(rb'(\xef\xbb\xbf)?\{[ \t\r]*\n', head) is not None
+
+    tracker = _IndentTracker()
+    pos = 0
+    replaced = 0
+    for (start, end), value in items:
+        _copy(src, dest, start - pos, tracker, chunk_size)
+        original = src.read(end - start)
+        if json.loads(original.decode('utf-8')) == value:
+            data = original
+        else:
+            data = _format_value(value, tracker.indent if indented else None)
+            replaced += 1
+        dest.write(data)
+        tracker.feed(data)
+        pos = end
+    while True:
+        data = src.read(chunk_size)
+        if not data:
+            break
+        dest.write(data)
+    return replaced
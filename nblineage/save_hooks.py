@@ -0,0 +1,86 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import nbformat
+
+from traitlets.config import LoggingConfigurable
+from traitlets import Bool, Instance
+
+from .index import LineageIndex, extract_notebook
+from .meme import MemeGenerator
+
+class LineageSaveHooks(LoggingConfigurable):
+
+    generate_meme = Bool(False, allow_none=False,
+                         help='If True, generate memes on the server when a notebook is saved'
+                        ).tag(config=True)
+
+    update_index = Bool(False, allow_none=False,
+                        help='If True, update the lineage index when a notebook is saved'
+                       ).tag(config=True)
+
+    lineage_index = Instance(LineageIndex, allow_none=True)
+
+    def __init__(self, **kwargs):
+        super(LineageSaveHooks, self).__init__(**kwargs)
+        self.meme_generator = MemeGenerator(parent=self)
+        self._executor = None
+
+    @property
+    def meme_generation(self):
+        return 'server' if self.generate_meme else 'client'
+
+    def register(self, contents_manager):
+        if self.generate_meme:
+            if hasattr(contents_manager, 'register_pre_save_hook'):
+                contents_manager.register_pre_save_hook(self.pre_save)
+            else:
+                self.log.warning('The contents manager does not support pre-save hooks, '
+                                 'memes are generated by the client')
+                self.generate_meme = False
+        if self.update_index:
+            if hasattr(contents_manager, 'register_post_save_hook'):
+                if self.lineage_index is None:
+                    self.lineage_index = LineageIndex(parent=self)
+                contents_manager.register_post_save_hook(self.post_save)
+            else:
+                self.log.warning('The contents manager does not support post-save hooks, '
+                                 'the lineage index is not updated')
+                self.update_index = False
+
+    def pre_save(self, model, path, contents_manager, **kwargs):
+        if model.get('type') != 'notebook' or model.get('content') is None:
+            return
+        self.log.debug('Generate memes on save: {}'.format(path))
+        nb = nbformat.from_dict(model['content'])
+        model['content'] = self.meme_generator.from_notebook_node(nb)
+
+    def post_save(self, model, os_path, contents_manager, **kwargs):
+        if model.get('type') != 'notebook':
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.update_index_on_save(os_path, model['path'])
+            return
+        # post-save hooks are called on the event loop of the server,
+        # the index is updated by a single thread to keep the order of saves
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._executor.submit(self.update_index_on_save, os_path, model['path'])
+
+    def flush(self, timeout=None):
+        """Wait until the index updates of the previous saves are done"""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result(timeout)
+
+    def update_index_on_save(self, os_path, path):
+        self.log.debug('Update lineage index on save: {}'.format(os_path))
+        try:
+            stat = os.stat(os_path)
+            entry = extract_notebook(os_path, path,
+                                     mtime=stat.st_mtime, size=stat.st_size)
+            self.lineage_index.update_many([entry])
+        except Exception:
+            self.log.exception('Failed to update lineage index: {}'.format(os_path))
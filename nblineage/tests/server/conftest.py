@@ -0,0 +1,11 @@
+import pytest
+
+from pytest_jupyter.jupyter_server import *  # noqa: F401,F403
+
+@pytest.fixture
+def jp_server_config():
+    return {
+        'ServerApp': {'jpserver_extensions': {'nblineage': True}},
+        'LineageSaveHooks': {'update_index': True},
+        'MemeGenerator': {'max_history': 5},
+    }
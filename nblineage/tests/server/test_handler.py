@@ -0,0 +1,194 @@
+import base64
+import gzip
+import json
+from uuid import UUID, uuid1
+
+import nbformat
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from nblineage.handler import pack_uuids, _json_uuid_items
+
+async def test_uuid(jp_fetch):
+    response = await jp_fetch('nblineage', 'uuid', 'v1', '3')
+    assert response.code == 200
+    uuids = json.loads(response.body)['uuid']
+    assert len(uuids) == 3
+    assert len(set(uuids)) == 3
+
+async def test_uuid_streamed(jp_fetch, jp_serverapp):
+    response = await jp_fetch('nblineage', 'uuid', 'v1', '25000')
+    assert response.code == 200
+    uuids = json.loads(response.body)['uuid']
+    assert len(uuids) == 25000
+    assert len(set(uuids)) == 25000
+
+async def test_uuid_too_many(jp_fetch):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('nblineage', 'uuid', 'v1', '100001')
+    assert e.value.code == 400
+
+@pytest.mark.parametrize('jp_server_config', [{
+    'ServerApp': {'jpserver_extensions': {'nblineage': True}},
+    'UUIDEndpoint': {'max_count': 10, 'stream_threshold': 4},
+}])
+async def test_uuid_endpoint_limits(jp_fetch):
+    response = await jp_fetch('nblineage', 'uuid', 'v1', '10')
+    assert len(set(json.loads(response.body)['uuid'])) == 10
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('nblineage', 'uuid', 'v1', '11')
+    assert e.value.code == 400
+
+async def test_uuid_binary(jp_fetch):
+    response = await jp_fetch('nblineage', 'uuid', 'v1', '5',
+                              headers={'Accept': 'application/octet-stream'})
+    assert response.code == 200
+    assert response.headers['Content-Type'] == 'application/octet-stream'
+    assert len(response.body) == 5 * 16
+    uuids = [UUID(bytes=response.body[i:i + 16]) for i in range(0, 5 * 16, 16)]
+    assert all(u.version == 1 for u in uuids)
+    assert len(set(uuids)) == 5
+
+@pytest.mark.parametrize('jp_server_config', [{
+    'ServerApp': {'jpserver_extensions': {'nblineage': True}},
+    'UUIDPool': {'id_generator': 'uuid7'},
+}, {
+    'ServerApp': {'jpserver_extensions': {'nblineage': True}},
+    'UUIDPool': {'id_generator': 'nblineage.uuidgen.uuid7_strings'},
+}])
+async def test_uuid_binary_id_generator(jp_fetch):
+    response = await jp_fetch('nblineage', 'uuid', 'v1', '5', params={'format': 'binary'})
+    uuids = [UUID(bytes=response.body[i:i + 16]) for i in range(0, 5 * 16, 16)]
+    assert all(u.version == 7 for u in uuids)
+    assert len(set(uuids)) == 5
+
+async def test_uuid_base64_streamed(jp_fetch):
+    response = await jp_fetch('nblineage', 'uuid', 'v1', '25000',
+                              params={'format': 'base64'})
+    assert response.code == 200
+    packed = base64.b64decode(response.body)
+    assert len(packed) == 25000 * 16
+    assert len(set(packed[i:i + 16] for i in range(0, len(packed), 16))) == 25000
+
+async def test_uuid_binary_gzip(jp_fetch):
+    response = await jp_fetch('nblineage', 'uuid', 'v1', '25000',
+                              params={'format': 'binary', 'gzip': '1'},
+                              headers={'Accept-Encoding': 'gzip'},
+                              decompress_response=False)
+    assert response.code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    packed = gzip.decompress(response.body)
+    assert len(packed) == 25000 * 16
+    assert len(response.body) < len(packed)
+
+async def test_uuid_unknown_format(jp_fetch):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('nblineage', 'uuid', 'v1', '1', params={'format': 'xml'})
+    assert e.value.code == 400
+
+async def test_config(jp_fetch):
+    response = await jp_fetch('nblineage', 'config')
+    assert response.code == 200
+    assert json.loads(response.body) == {
+        'meme_generation': 'client',
+        'max_history': 5,
+        'coalesce_history': True,
+    }
+
+async def test_notebook_metadata(jp_fetch, jp_root_dir):
+    nb = nbformat.v4.new_notebook()
+    nb.metadata['lc_notebook_meme'] = {'current': str(uuid1())}
+    cell = nbformat.v4.new_code_cell('x' * 1000)
+    cell.outputs.append(nbformat.v4.new_output('stream', text='y' * 1000))
+    cell.metadata['lc_cell_meme'] = {'current': str(uuid1())}
+    nb.cells.append(cell)
+    await jp_fetch('api', 'contents', 'metadata.ipynb', method='PUT',
+                   body=json.dumps(dict(type='notebook', content=nb)))
+
+    response = await jp_fetch('nblineage', 'metadata', params={'path': 'metadata.ipynb'})
+    body = json.loads(response.body)
+    assert body['metadata']['lc_notebook_meme'] == nb.metadata['lc_notebook_meme']
+    assert body['cells'] == [{'id': cell.id, 'metadata': cell.metadata}]
+    assert len(response.body) < 1000
+
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('nblineage', 'metadata', params={'path': 'missing.ipynb'})
+    assert e.value.code == 404
+
+    (jp_root_dir / '.hidden.ipynb').write_text(nbformat.writes(nb))
+    (jp_root_dir / 'data.json').write_text(nbformat.writes(nb))
+    for path, code in [('.hidden.ipynb', 404), ('data.json', 400)]:
+        with pytest.raises(HTTPClientError) as e:
+            await jp_fetch('nblineage', 'metadata', params={'path': path})
+        assert e.value.code == code
+
+def test_json_uuid_items():
+    ids = [str(uuid1()), 'custom "id"\\']
+    assert json.loads('[' + _json_uuid_items(ids) + ']') == ids
+
+def test_pack_uuids():
+    uuids = [str(uuid1()) for x in range(3)]
+    packed = pack_uuids(uuids)
+    assert packed == b''.join(UUID(u).bytes for u in uuids)
+
+async def test_server_signature(jp_fetch, jp_serverapp):
+    tracking_server = jp_serverapp.web_app.settings['nblineage_tracking_server']
+    response = await jp_fetch('nblineage', 'lc', 'server_signature')
+    assert response.code == 200
+    body = json.loads(response.body)
+    assert body['signature_id'] == tracking_server.server_signature
+    assert body['notebook_dir'] == jp_serverapp.root_dir
+    assert 'no-cache' in response.headers['Cache-Control']
+    etag = response.headers['Etag']
+
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('nblineage', 'lc', 'server_signature',
+                       headers={'If-None-Match': etag})
+    assert e.value.code == 304
+
+async def test_lineage_query(jp_fetch, jp_serverapp):
+    nb = nbformat.v4.new_notebook()
+    nb.metadata['lc_notebook_meme'] = {'current': str(uuid1())}
+    memes = [str(uuid1()) for x in range(3)]
+    for meme in memes:
+        cell = nbformat.v4.new_markdown_cell()
+        cell.metadata['lc_cell_meme'] = {'current': meme}
+        nb.cells.append(cell)
+    await jp_fetch('api', 'contents', 'indexed.ipynb', method='PUT',
+                   body=json.dumps(dict(type='notebook', content=nb)))
+    # the index is updated on the executor of the save hooks
+    jp_serverapp.web_app.settings['nblineage_save_hooks'].flush(timeout=10)
+
+    response = await jp_fetch('nblineage', 'lineage', 'cells', params={'meme': memes[1]})
+    cells = json.loads(response.body)['cells']
+    assert [(c['path'], c['cell_index']) for c in cells] == [('indexed.ipynb', 1)]
+
+    response = await jp_fetch('nblineage', 'lineage', 'cells',
+                              params={'notebook_meme': nb.metadata['lc_notebook_meme']['current'],
+                                      'limit': '2'})
+    body = json.loads(response.body)
+    assert len(body['cells']) == 2
+    response = await jp_fetch('nblineage', 'lineage', 'cells',
+                              params={'notebook_meme': nb.metadata['lc_notebook_meme']['current'],
+                                      'limit': '2', 'cursor': body['next_cursor']})
+    body = json.loads(response.body)
+    assert [c['cell_meme'] for c in body['cells']] == memes[2:]
+    assert body['next_cursor'] is None
+
+    response = await jp_fetch('nblineage', 'lineage', 'notebooks',
+                              params={'meme': nb.metadata['lc_notebook_meme']['current']})
+    notebooks = json.loads(response.body)['notebooks']
+    assert [n['path'] for n in notebooks] == ['indexed.ipynb']
+
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('nblineage', 'lineage', 'cells')
+    assert e.value.code == 400
+
+@pytest.mark.parametrize('jp_server_config', [{
+    'ServerApp': {'jpserver_extensions': {'nblineage': True}},
+    'LineageSaveHooks': {'update_index': False},
+}])
+async def test_lineage_without_index(jp_fetch):
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('nblineage', 'lineage', 'cells', params={'meme': str(uuid1())})
+    assert e.value.code == 404
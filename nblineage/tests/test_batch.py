@@ -0,0 +1,129 @@
+import unittest
+import os
+import io
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import nbformat
+from testpath.tempdir import TemporaryDirectory
+from traitlets.config import Config
+
+import nblineage
+from nblineage import batch
+
+class TestBatch(unittest.TestCase):
+
+    def _get_filepath(self, name):
+        path = os.path.dirname(nblineage.__file__)
+        return os.path.join(os.path.abspath(path), name)
+
+    def _read_notebook(self, name):
+        with io.open(self._get_filepath(name)) as f:
+            return nbformat.read(f, as_version=4)
+
+    def _serve(self, executor, requests):
+        rfile = io.BytesIO(''.join(json.dumps(r) + '\n' if not isinstance(r, str) else r
+                                   for r in requests).encode('utf-8'))
+        wfile = io.BytesIO()
+        batch.serve_stream(executor, rfile, wfile, max_pending=2)
+        responses = [json.loads(line) for line in wfile.getvalue().decode('utf-8').splitlines()]
+        return sorted(responses, key=lambda r: str(r['id']))
+
+    def _executor(self, pool_class, config=None):
+        return pool_class(max_workers=2, initializer=batch.init_worker,
+                          initargs=(config or Config(),))
+
+    def test_ops(self):
+        nb = self._read_notebook('tests/notebooks/notebook-nomeme.ipynb')
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+        orig = self._read_notebook('tests/notebooks/notebook.ipynb')
+        config = Config()
+        config.NewRootMemeGenerator.trim_history = 0
+
+        with TemporaryDirectory() as td, self._executor(ThreadPoolExecutor, config) as executor:
+            dest = os.path.join(td, 'new.ipynb')
+            responses = self._serve(executor, [
+                {'id': 1, 'op': 'generate-memes', 'notebook': nb},
+                {'id': 2, 'op': 'new-root', 'path': source_path, 'dest': dest},
+                {'id': 3, 'op': 'extract-metadata', 'path': source_path},
+                {'id': 4, 'op': 'unknown'},
+                {'id': 5, 'op': 'new-root'},
+                {'id': 6, 'op': 'extract-metadata', 'path': os.path.join(td, 'missing.ipynb')},
+                '{\n',
+            ])
+            self.assertEqual([1, 2, 3, 4, 5, 6, None], [r['id'] for r in responses])
+
+            result = responses[0]['result']
+            newnb = nbformat.from_dict(result['notebook'])
+            self.assertEqual(result['notebook_meme'],
+                             newnb.metadata['lc_notebook_meme']['current'])
+            self.assertEqual(result['cell_memes'],
+                             [c.metadata['lc_cell_meme']['current'] for c in newnb.cells])
+            self.assertEqual(len(nb.cells), len(set(result['cell_memes'])))
+
+            result = responses[1]['result']
+            self.assertNotIn('notebook', result)
+            with io.open(dest, encoding='utf-8') as f:
+                newnb = nbformat.read(f, as_version=4)
+            self.assertEqual(result['notebook_meme'],
+                             newnb.metadata['lc_notebook_meme']['current'])
+            self.assertEqual([[c.metadata['lc_cell_meme']['current'],
+                               n.metadata['lc_cell_meme']['current']]
+                              for c, n in zip(orig.cells, newnb.cells)], result['mapping'])
+            self.assertEqual([], newnb.metadata['lc_notebook_meme']['history'])
+
+            result = responses[2]['result']
+            self.assertEqual(orig.metadata['lc_notebook_meme'], result['metadata']['lc_notebook_meme'])
+            self.assertEqual([c.metadata for c in orig.cells], result['cells'])
+
+            self.assertEqual('ValueError: Unknown op: unknown', responses[3]['error'])
+            self.assertIn('path or notebook', responses[4]['error'])
+            self.assertIn('FileNotFoundError', responses[5]['error'])
+            self.assertIn('Invalid request', responses[6]['error'])
+
+    def test_process_pool(self):
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+        with self._executor(ProcessPoolExecutor) as executor:
+            responses = self._serve(executor, [
+                {'id': str(i), 'op': 'new-root', 'path': source_path} for i in range(5)])
+        self.assertEqual(5, len(responses))
+        memes = set()
+        for response in responses:
+            memes.update(n for o, n in response['result']['mapping'])
+        self.assertEqual(15, len(memes))
+
+    def test_submit_error(self):
+        executor = self._executor(ThreadPoolExecutor)
+        executor.shutdown()
+        responses = self._serve(executor, [
+            {'id': str(i), 'op': 'extract-metadata', 'path': 'a.ipynb'} for i in range(5)])
+        self.assertEqual(['0', '1', '2', '3', '4'], [r['id'] for r in responses])
+        for response in responses:
+            self.assertIn('RuntimeError', response['error'])
+
+    def test_unix_socket(self):
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+        with TemporaryDirectory() as td, self._executor(ThreadPoolExecutor) as executor:
+            path = os.path.join(td, 'batch.sock')
+            server = batch.make_unix_socket_server(path, executor)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(path)
+                    request = {'id': 1, 'op': 'extract-metadata', 'path': source_path}
+                    sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+                    sock.shutdown(socket.SHUT_WR)
+                    with sock.makefile('rb') as f:
+                        response = json.loads(f.readline())
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+        self.assertEqual(1, response['id'])
+        self.assertIn('lc_notebook_meme', response['result']['metadata'])
+
+if __name__ == '__main__':
+    unittest.main()
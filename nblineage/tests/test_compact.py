@@ -0,0 +1,131 @@
+import unittest
+import os
+import io
+import nbformat
+
+from testpath.tempdir import TemporaryDirectory
+
+from nblineage.compact import HistoryCompactor, compact_file
+
+class TestHistoryCompactor(unittest.TestCase):
+
+    def _make_notebook(self):
+        nb = nbformat.v4.new_notebook()
+        nb.metadata['lc_notebook_meme'] = {
+            'current': 'n3',
+            'history': ['n0', 'n1', 'n1', 'n2'],
+            'root_cells_history': [[['a', 'b']], [['a', 'b']], [['b', 'c']]],
+            'lc_server_signature': {
+                'current': {'signature_id': 's2'},
+                'history': [{'signature_id': 's0'}, {'signature_id': 's1'},
+                            {'signature_id': 's0'}],
+            },
+        }
+        entry = {'current': 'c', 'previous': 'p', 'next': 'n'}
+        other = {'current': 'c', 'previous': 'q', 'next': 'n'}
+        cell = nbformat.v4.new_code_cell(source='print(1)\n' * 100)
+        cell.metadata['lc_cell_meme'] = {
+            'current': 'c', 'previous': None, 'next': None,
+            'history': [entry, entry, other, entry, entry],
+        }
+        nb.cells.append(cell)
+        nb.cells.append(nbformat.v4.new_markdown_cell('no meme'))
+        return nb
+
+    def test_dedupe_consecutive(self):
+        nb = self._make_notebook()
+        self.assertEqual(4, HistoryCompactor().compact_notebook(nb))
+        memeobj = nb.metadata['lc_notebook_meme']
+        self.assertEqual(['n0', 'n1', 'n2'], memeobj['history'])
+        self.assertEqual([[['a', 'b']], [['b', 'c']]], memeobj['root_cells_history'])
+        self.assertEqual(3, len(memeobj['lc_server_signature']['history']))
+        self.assertEqual(['p', 'q', 'p'], [h['previous'] for h in
+                                           nb.cells[0].metadata['lc_cell_meme']['history']])
+
+    def test_dedupe_all(self):
+        nb = self._make_notebook()
+        self.assertEqual(6, HistoryCompactor(dedupe='all').compact_notebook(nb))
+        memeobj = nb.metadata['lc_notebook_meme']
+        self.assertEqual(['s0', 's1'], [h['signature_id'] for h in
+                                        memeobj['lc_server_signature']['history']])
+        self.assertEqual(['p', 'q'], [h['previous'] for h in
+                                      nb.cells[0].metadata['lc_cell_meme']['history']])
+
+    def test_dedupe_all_unordered_keys(self):
+        nb = self._make_notebook()
+        history = nb.cells[0].metadata['lc_cell_meme']['history']
+        history.append({'next': 'n', 'previous': 'q', 'current': 'c'})
+        history.extend([['a', 'b'], ['a', 'b'], 'c'])
+        HistoryCompactor(dedupe='all').compact_notebook(nb)
+        self.assertEqual([{'current': 'c', 'previous': 'p', 'next': 'n'},
+                          {'current': 'c', 'previous': 'q', 'next': 'n'},
+                          ['a', 'b'], 'c'], nb.cells[0].metadata['lc_cell_meme']['history'])
+
+    def test_trim(self):
+        nb = self._make_notebook()
+        compactor = HistoryCompactor(dedupe='none', cell_history=1, notebook_history=2,
+                                     root_cells_history=0, server_signature_history=1)
+        self.assertEqual(4 + 2 + 3 + 2, compactor.compact_notebook(nb))
+        memeobj = nb.metadata['lc_notebook_meme']
+        self.assertEqual(['n1', 'n2'], memeobj['history'])
+        self.assertEqual([], memeobj['root_cells_history'])
+        self.assertEqual([{'signature_id': 's0'}], memeobj['lc_server_signature']['history'])
+        self.assertEqual(1, len(nb.cells[0].metadata['lc_cell_meme']['history']))
+        self.assertEqual(0, compactor.compact_notebook(nb))
+
+    def test_delta_root_cells_history(self):
+        nb = self._make_notebook()
+        memeobj = nb.metadata['lc_notebook_meme']
+        memeobj['root_cells'] = ['d']
+        memeobj['root_cells_history'] = [
+            {'orig': ['x'], 'new': ['a']},
+            {'orig': [0], 'new': ['b']},
+            {'orig': [0], 'new': ['b']},
+            {'orig': [0]},
+        ]
+        compactor = HistoryCompactor(dedupe='none', root_cells_history=2)
+        self.assertEqual(2, compactor.compact_notebook(nb))
+        self.assertEqual([{'orig': ['b'], 'new': ['b']}, {'orig': [0]}],
+                         memeobj['root_cells_history'])
+
+        memeobj['root_cells_history'] = [
+            {'orig': ['a'], 'new': ['b']},
+            {'orig': ['a'], 'new': ['b']},
+            [['b', 'c']],
+            {'orig': [0], 'new': ['d']},
+        ]
+        HistoryCompactor().compact_notebook(nb)
+        self.assertEqual([{'orig': ['a'], 'new': ['b']}, {'orig': [0], 'new': ['c']},
+                          {'orig': [0]}], memeobj['root_cells_history'])
+
+    def test_compact_file(self):
+        nb = self._make_notebook()
+        with TemporaryDirectory() as td:
+            path = os.path.join(td, 'a.ipynb')
+            with io.open(path, 'w', encoding='utf-8') as f:
+                nbformat.write(nb, f)
+            with io.open(path, 'rb') as f:
+                data = f.read()
+            os.chmod(path, 0o640)
+
+            compactor = HistoryCompactor(cell_history=1)
+            removed, size, new_size = compact_file(path, compactor, dry_run=True)
+            self.assertEqual(6, removed)
+            self.assertEqual(len(data), size)
+            self.assertLess(new_size, size)
+            with io.open(path, 'rb') as f:
+                self.assertEqual(data, f.read())
+
+            self.assertEqual((removed, size, new_size), compact_file(path, compactor))
+            self.assertEqual(new_size, os.path.getsize(path))
+            self.assertEqual(0o640, os.stat(path).st_mode & 0o777)
+            self.assertEqual(['a.ipynb'], os.listdir(td))
+            with io.open(path, encoding='utf-8') as f:
+                newnb = nbformat.read(f, as_version=4)
+            self.assertEqual(nb.cells[0].source, newnb.cells[0].source)
+            self.assertEqual(1, len(newnb.cells[0].metadata['lc_cell_meme']['history']))
+
+            self.assertEqual((0, new_size, new_size), compact_file(path, compactor))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import os
+import io
+
+from testpath.tempdir import TemporaryDirectory
+
+from nblineage.fileutil import atomic_replace, CountingWriter
+
+class TestFileUtil(unittest.TestCase):
+
+    def test_atomic_replace(self):
+        with TemporaryDirectory() as td:
+            path = os.path.join(td, 'a.ipynb')
+            with atomic_replace(path, 'w') as f:
+                f.write(u'new')
+            with io.open(path) as f:
+                self.assertEqual('new', f.read())
+
+            os.chmod(path, 0o600)
+            with atomic_replace(path, backup=path + '.bak') as f:
+                f.write(b'newer')
+            with io.open(path, 'rb') as f:
+                self.assertEqual(b'newer', f.read())
+            with io.open(path + '.bak') as f:
+                self.assertEqual('new', f.read())
+            self.assertEqual(0o600, os.stat(path).st_mode & 0o777)
+
+            # an existing backup is replaced
+            with atomic_replace(path, backup=path + '.bak') as f:
+                f.write(b'newest')
+            with io.open(path + '.bak', 'rb') as f:
+                self.assertEqual(b'newer', f.read())
+            self.assertEqual(['a.ipynb', 'a.ipynb.bak'], sorted(os.listdir(td)))
+
+    def test_atomic_replace_error(self):
+        with TemporaryDirectory() as td:
+            path = os.path.join(td, 'a.ipynb')
+            with io.open(path, 'w') as f:
+                f.write(u'old')
+            with self.assertRaises(ValueError):
+                with atomic_replace(path, backup=path + '.bak') as f:
+                    f.write(b'new')
+                    raise ValueError()
+            with io.open(path) as f:
+                self.assertEqual('old', f.read())
+            self.assertEqual(['a.ipynb'], os.listdir(td))
+
+    def test_counting_writer(self):
+        out = CountingWriter()
+        out.write(b'abc')
+        out.write(b'de')
+        self.assertEqual(5, out.size)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import asyncio
+import os.path
+import io
+import json
+import nbformat
+
+from jupyter_server.services.contents.filemanager import FileContentsManager
+from testpath.tempdir import TemporaryDirectory
+
+import nblineage
+from nblineage.index import LineageIndex
+from nblineage.save_hooks import LineageSaveHooks
+
+class TestLineageIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = TemporaryDirectory()
+        self.td = self.tempdir.__enter__()
+        self.index = LineageIndex(index_file=os.path.join(self.td, 'index.db'))
+
+    def tearDown(self):
+        self.index.close()
+        self.tempdir.__exit__(None, None, None)
+
+    def _get_filepath(self, name):
+        path = os.path.dirname(nblineage.__file__)
+        path = os.path.abspath(path)
+        path = os.path.normpath(path)
+        return os.path.join(path, name)
+
+    def _read_notebook(self, name):
+        with io.open(self._get_filepath(name), encoding='utf-8') as f:
+            return nbformat.read(f, as_version=4)
+
+    def test_update_notebook(self):
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        self.index.update_notebook('a.ipynb', nb, mtime=1.0, size=10)
+        self.index.update_notebook('b.ipynb', nb, mtime=2.0, size=20)
+
+        notebook = self.index.get_notebook('a.ipynb')
+        self.assertEqual(nb.metadata['lc_notebook_meme']['current'], notebook['notebook_meme'])
+        self.assertEqual(1.0, notebook['mtime'])
+        self.assertEqual(10, notebook['size'])
+
+        cell_meme = nb.cells[1].metadata['lc_cell_meme']
+        cells = self.index.find_cells(cell_meme['current'])
+        self.assertEqual(['a.ipynb', 'b.ipynb'], [c['path'] for c in cells])
+        self.assertEqual(1, cells[0]['cell_index'])
+        self.assertEqual(cell_meme['previous'], cells[0]['previous'])
+        self.assertEqual(cell_meme['next'], cells[0]['next'])
+
+        # only rows of the updated notebook are rewritten
+        del nb.cells[0]
+        self.index.update_notebook('a.ipynb', nb, mtime=3.0, size=10)
+        cells = self.index.find_cells(cell_meme['current'])
+        self.assertEqual([('a.ipynb', 0), ('b.ipynb', 1)],
+                         [(c['path'], c['cell_index']) for c in cells])
+
+        self.index.remove_notebook('b.ipynb')
+        self.assertIsNone(self.index.get_notebook('b.ipynb'))
+        self.assertEqual(1, len(self.index.find_cells(cell_meme['current'])))
+
+    def _make_notebook(self, memes, times):
+        nb = nbformat.v4.new_notebook()
+        nb.metadata['lc_notebook_meme'] = {'current': 'notebook-' + memes[0]}
+        for meme, time in zip(memes, times):
+            cell = nbformat.v4.new_code_cell()
+            cell.metadata['lc_cell_meme'] = {'current': meme, 'execution_end_time': time}
+            nb.cells.append(cell)
+        return nb
+
+    def _query_all(self, **kwargs):
+        results = []
+        cursor = None
+        while True:
+            cells, cursor = self.index.query_cells(limit=2, cursor=cursor, **kwargs)
+            results.extend(cells)
+            if cursor is None:
+                return results
+
+    def test_query_cells(self):
+        uuid = '8f5c5fe2-71cc-11e7-9abe-02420aff0008'
+        memes = [uuid, uuid + '-1-a3f2', uuid + '-2-a3f2-bc1e',
+                 'f2125b84-4669-11e7-958b-02420aff0006', uuid]
+        times = ['2019-07-25T09:53:1{}.000000Z'.format(i) for i in range(5)]
+        self.index.update_notebook('a.ipynb', self._make_notebook(memes, times))
+        self.index.update_notebook('b.ipynb', self._make_notebook(memes[::-1], times))
+
+        cells = self._query_all(cell_meme=uuid)
+        self.assertEqual(4, len(cells))
+        self.assertTrue(all(c['cell_meme'] == uuid for c in cells))
+
+        cells = self._query_all(prefix=uuid)
+        self.assertEqual(8, len(cells))
+        self.assertEqual(sorted(c['cell_meme'] for c in cells),
+                         [c['cell_meme'] for c in cells])
+
+        cells = self._query_all(notebook_meme='notebook-' + uuid)
+        self.assertEqual(10, len(cells))
+
+        cells = self._query_all(since=times[1], until=times[3])
+        self.assertEqual(4, len(cells))
+        self.assertEqual(sorted(c['execution_end_time'] for c in cells),
+                         [c['execution_end_time'] for c in cells])
+
+        with self.assertRaises(ValueError):
+            self.index.query_cells()
+        with self.assertRaises(ValueError):
+            self.index.query_cells(cell_meme=uuid, cursor='invalid')
+
+    def test_post_save(self):
+        cm = FileContentsManager(root_dir=self.td)
+        hooks = LineageSaveHooks(update_index=True, lineage_index=self.index)
+        hooks.register(cm)
+
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        os.mkdir(os.path.join(self.td, 'sub'))
+        cm.save(dict(type='notebook', content=json.loads(nbformat.writes(nb))),
+                'sub/saved.ipynb')
+
+        notebook = self.index.get_notebook('sub/saved.ipynb')
+        self.assertEqual(nb.metadata['lc_notebook_meme']['current'], notebook['notebook_meme'])
+        cells = self.index.find_cells(nb.cells[0].metadata['lc_cell_meme']['current'])
+        self.assertEqual(['sub/saved.ipynb'], [c['path'] for c in cells])
+
+    def test_post_save_on_event_loop(self):
+        cm = FileContentsManager(root_dir=self.td)
+        hooks = LineageSaveHooks(update_index=True, lineage_index=self.index)
+        hooks.register(cm)
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+
+        async def save():
+            cm.save(dict(type='notebook', content=json.loads(nbformat.writes(nb))),
+                    'saved.ipynb')
+        asyncio.run(save())
+        hooks.flush()
+
+        notebook = self.index.get_notebook('saved.ipynb')
+        self.assertEqual(nb.metadata['lc_notebook_meme']['current'], notebook['notebook_meme'])
+
+    def test_post_save_logs_errors(self):
+        hooks = LineageSaveHooks(update_index=True, lineage_index=self.index)
+        with self.assertLogs(hooks.log, level='ERROR'):
+            hooks.post_save(model=dict(type='notebook', path='missing.ipynb'),
+                            os_path=os.path.join(self.td, 'missing.ipynb'),
+                            contents_manager=None)
+        self.assertIsNone(self.index.get_notebook('missing.ipynb'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import io
+import uuid
+
+from nblineage.mememap import MemeMap
+
+class TestMemeMap(unittest.TestCase):
+
+    def test_map(self):
+        meme_map = MemeMap(capacity=4)
+        pairs = [(str(uuid.uuid1()), str(uuid.uuid4())) for i in range(1000)]
+        for old_meme, new_meme in pairs:
+            meme_map[old_meme] = new_meme
+        self.assertEqual(1000, len(meme_map))
+        self.assertGreater(meme_map._capacity, 1000)
+        for old_meme, new_meme in pairs:
+            self.assertEqual(new_meme, meme_map[old_meme])
+            self.assertIn(old_meme, meme_map)
+        self.assertEqual(sorted(pairs), sorted(meme_map.items()))
+
+        meme_map[pairs[0][0]] = pairs[1][1]
+        self.assertEqual(pairs[1][1], meme_map.get(pairs[0][0]))
+        self.assertEqual(1000, len(meme_map))
+
+        unknown = str(uuid.uuid4())
+        self.assertIsNone(meme_map.get(unknown))
+        self.assertEqual('x', meme_map.get(unknown, 'x'))
+        with self.assertRaises(KeyError):
+            meme_map[unknown]
+
+    def test_other_memes(self):
+        meme_map = MemeMap()
+        upper = str(uuid.uuid4()).upper()
+        meme_map['a'] = 'b'
+        meme_map[upper] = 'c'
+        meme_map['d'] = upper
+        self.assertEqual('b', meme_map['a'])
+        self.assertEqual('c', meme_map[upper])
+        self.assertIsNone(meme_map.get(upper.lower()))
+        self.assertEqual(upper, meme_map['d'])
+        self.assertEqual(3, len(meme_map))
+
+        old_meme = str(uuid.uuid4())
+        meme_map[old_meme] = str(uuid.uuid4())
+        with self.assertRaises(ValueError):
+            meme_map[old_meme] = 'e'
+
+    def test_branched_memes(self):
+        meme_map = MemeMap(capacity=4)
+        base = str(uuid.uuid1())
+        old_memes = [base, base + '-1-a3f2', base + '-2-a3f2-bc1e', base + '-']
+        old_memes.extend(str(uuid.uuid1()) + '-1-a3f2' for i in range(100))
+        pairs = [(old_meme, str(uuid.uuid4())) for old_meme in old_memes]
+        for old_meme, new_meme in pairs:
+            meme_map[old_meme] = new_meme
+        self.assertEqual(len(pairs), len(meme_map))
+        self.assertEqual({}, meme_map._others)
+        for old_meme, new_meme in pairs:
+            self.assertEqual(new_meme, meme_map[old_meme])
+        self.assertEqual(sorted(pairs), sorted(meme_map.items()))
+        self.assertIsNone(meme_map.get(base + '-1-ffff'))
+        self.assertIsNone(meme_map.get(base + '-1-a3f'))
+
+        meme_map[base + '-3-ffff'] = 'x'
+        self.assertEqual('x', meme_map[base + '-3-ffff'])
+        with self.assertRaises(ValueError):
+            meme_map[base + '-1-a3f2'] = 'y'
+
+    def test_write_read(self):
+        meme_map = MemeMap()
+        pairs = [(str(uuid.uuid1()), str(uuid.uuid4())) for i in range(100)]
+        pairs.append(('a', 'b'))
+        for old_meme, new_meme in pairs:
+            meme_map[old_meme] = new_meme
+        f = io.StringIO()
+        meme_map.write(f)
+        self.assertEqual(''.join('{}\t{}\n'.format(*x) for x in sorted(pairs)), f.getvalue())
+
+        f.seek(0)
+        copied = MemeMap()
+        copied.read(f)
+        self.assertEqual(sorted(pairs), sorted(copied.items()))
+
+if __name__ == '__main__':
+    unittest.main()
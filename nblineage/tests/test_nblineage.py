@@ -1,7 +1,15 @@
 import unittest
 import os.path
 import io
+import csv
+import itertools
+import json
+import random
+import uuid
+from copy import deepcopy
+from unittest import mock
 import nbformat
+from traitlets.config.application import Application
 try:
     from exceptions import SystemExit
 except ImportError:
@@ -11,6 +19,7 @@ except ImportError:
 import nblineage
 import nblineage.extensionapp
 import nblineage.meme as meme
+import nblineage.uuidgen as uuidgen
 
 class TestNbLineageApp(unittest.TestCase):
 
@@ -26,7 +35,8 @@ class TestNbLineageApp(unittest.TestCase):
         pass
 
     def tearDown(self):
-        pass
+        # subcommands are created as singletons
+        Application.clear_instance()
 
     def _get_filepath(self, name):
         path = os.path.dirname(nblineage.__file__)
@@ -70,6 +80,34 @@ class TestNbLineageApp(unittest.TestCase):
         newnb = gen.from_notebook_node(nb)
         self.assertIs(nb, newnb)
 
+    def test_generate_meme_from_notebook_node_copy_metadata(self):
+        nb = self._read_notebook('tests/notebooks/notebook-nomeme.ipynb')
+        gen = meme.MemeGenerator()
+        oldnb = nbformat.notebooknode.from_dict(nb.copy())
+        newnb = gen.from_notebook_node(nb, copy='metadata')
+        self.assertIsNot(nb, newnb)
+        self.assertEqual(oldnb, nb)
+        self.assertIn('lc_notebook_meme', newnb.metadata)
+        for cell, newcell in zip(nb.cells, newnb.cells):
+            self.assertNotIn('lc_cell_meme', cell.metadata)
+            self.assertIn('lc_cell_meme', newcell.metadata)
+            self.assertIs(cell.source, newcell.source)
+            if 'outputs' in cell:
+                self.assertIs(cell.outputs, newcell.outputs)
+
+    def test_new_root_meme_copy_metadata(self):
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        gen = meme.NewRootMemeGenerator()
+        oldnb = nbformat.notebooknode.from_dict(nb.copy())
+        newnb = gen.from_notebook_node(nb, copy='metadata')
+        self.assertEqual(oldnb, nb)
+        self.assertNotEqual(nb.metadata['lc_notebook_meme']['current'],
+                            newnb.metadata['lc_notebook_meme']['current'])
+        for cell, newcell in zip(nb.cells, newnb.cells):
+            self.assertNotEqual(cell.metadata['lc_cell_meme']['current'],
+                                newcell.metadata['lc_cell_meme']['current'])
+            self.assertIs(cell.source, newcell.source)
+
     def test_generate_meme_first(self):
         nb = self._read_notebook('tests/notebooks/notebook-nomeme.ipynb')
         gen = meme.MemeGenerator()
@@ -217,6 +255,139 @@ class TestNbLineageApp(unittest.TestCase):
             removed_cell.metadata['lc_cell_meme']['current'],
             newnb.cells[1].metadata['lc_cell_meme']['history'][0]['previous'])
 
+    def test_generate_meme_move_cell(self):
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        orig_memes = [dict(cell.metadata['lc_cell_meme']) for cell in nb.cells]
+        nb.cells[0], nb.cells[1] = nb.cells[1], nb.cells[0]
+
+        gen = meme.MemeGenerator()
+        newnb = gen.from_notebook_node(nb, copy=True)
+
+        # every cell has a changed neighbour
+        for orig, cell in zip([orig_memes[1], orig_memes[0], orig_memes[2]], newnb.cells):
+            history = cell.metadata['lc_cell_meme']['history']
+            self.assertEqual(1, len(history))
+            self.assertEqual(orig['current'], history[0]['current'])
+            self.assertEqual(orig['previous'], history[0]['previous'])
+            self.assertEqual(orig['next'], history[0]['next'])
+        for prev_cell, cell, next_cell in self._enum_prev_next_items(newnb.cells):
+            memeobj = cell.metadata['lc_cell_meme']
+            if prev_cell is not None:
+                self.assertEqual(prev_cell.metadata['lc_cell_meme']['current'],
+                                 memeobj['previous'])
+            if next_cell is not None:
+                self.assertEqual(next_cell.metadata['lc_cell_meme']['current'],
+                                 memeobj['next'])
+
+    def _deterministic_uuids(self, start=0):
+        counter = itertools.count(start)
+        return lambda count: [str(uuid.UUID(int=next(counter))) for x in range(count)]
+
+    def test_dirty_cells(self):
+        dirty = meme.DirtyCells()
+        dirty.insert(3, 2)
+        self.assertEqual([2, 3, 4, 5], dirty.indices(10))
+        dirty.insert(0)
+        self.assertEqual([0, 1, 3, 4, 5, 6], dirty.indices(10))
+        dirty.delete(4, 2)
+        self.assertEqual([0, 1, 3, 4], dirty.indices(10))
+        self.assertEqual([0, 1, 3], dirty.indices(4))
+        dirty.clear()
+        dirty.move(1, 5)
+        self.assertEqual([0, 1, 4, 5, 6], dirty.indices(10))
+        dirty.clear()
+        dirty.move(5, 1)
+        self.assertEqual([0, 1, 2, 5, 6], dirty.indices(10))
+
+    def test_update_dirty_cells(self):
+        rand = random.Random(0)
+        with mock.patch.object(uuidgen, 'uuid1_strings', self._deterministic_uuids(1000)):
+            nb = nbformat.v4.new_notebook()
+            nb.cells = [nbformat.v4.new_code_cell(str(i)) for i in range(20)]
+            meme.MemeGenerator().from_notebook_node(nb)
+
+        for n in range(50):
+            edited = deepcopy(nb)
+            dirty = meme.DirtyCells()
+            for x in range(rand.randint(1, 4)):
+                op = rand.choice(['insert', 'delete', 'move'])
+                length = len(edited.cells)
+                if op == 'insert' or length < 2:
+                    index = rand.randint(0, length)
+                    count = rand.randint(1, 3)
+                    for i in range(count):
+                        edited.cells.insert(index, nbformat.v4.new_markdown_cell('new'))
+                    dirty.insert(index, count)
+                elif op == 'delete':
+                    index = rand.randrange(length)
+                    del edited.cells[index]
+                    dirty.delete(index)
+                else:
+                    from_index = rand.randrange(length)
+                    to_index = rand.randrange(length)
+                    edited.cells.insert(to_index, edited.cells.pop(from_index))
+                    dirty.move(from_index, to_index)
+
+            expected = deepcopy(edited)
+            with mock.patch.object(uuidgen, 'uuid1_strings', self._deterministic_uuids()):
+                meme.MemeGenerator().from_notebook_node(expected)
+            with mock.patch.object(uuidgen, 'uuid1_strings', self._deterministic_uuids()):
+                meme.MemeGenerator().update_dirty_cells(edited, dirty)
+            self.assertEqual(expected, edited)
+
+    def test_generate_meme_history_limit(self):
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        gen = meme.MemeGenerator(max_history=2)
+        for x in range(3):
+            nb.cells.append(nb.cells.pop(0))
+            gen.from_notebook_node(nb)
+        for cell in nb.cells:
+            self.assertEqual(2, len(cell.metadata['lc_cell_meme']['history']))
+
+        gen = meme.MemeGenerator(max_history=0)
+        nb.cells.insert(2, nbformat.v4.new_markdown_cell('new'))
+        nb.cells.insert(1, nbformat.v4.new_markdown_cell('new'))
+        gen.from_notebook_node(nb)
+        for cell in nb.cells[::2]:
+            self.assertEqual([], cell.metadata['lc_cell_meme']['history'])
+
+    def test_generate_meme_coalesce_history(self):
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        memeobj = nb.cells[0].metadata['lc_cell_meme']
+        memeobj['history'] = [dict(current=memeobj['current'],
+                                   previous=memeobj['previous'],
+                                   next=memeobj['next'])]
+        nb.cells.insert(1, nbformat.v4.new_markdown_cell('new'))
+        orig = deepcopy(nb)
+
+        newnb = meme.MemeGenerator().from_notebook_node(nb, copy=True)
+        self.assertEqual(1, len(newnb.cells[0].metadata['lc_cell_meme']['history']))
+        self.assertEqual(1, len(newnb.cells[2].metadata['lc_cell_meme']['history']))
+
+        newnb = meme.MemeGenerator(coalesce_history=False).from_notebook_node(orig)
+        self.assertEqual(2, len(newnb.cells[0].metadata['lc_cell_meme']['history']))
+
+    def test_id_generator(self):
+        nb = self._read_notebook('tests/notebooks/notebook-nomeme.ipynb')
+        newnb = meme.MemeGenerator(id_generator='uuid7').from_notebook_node(nb, copy=True)
+        memes = [newnb.metadata['lc_notebook_meme']['current']]
+        memes.extend(cell.metadata['lc_cell_meme']['current'] for cell in newnb.cells)
+        self.assertEqual(sorted(memes), memes)
+        for m in memes:
+            self.assertEqual(7, uuid.UUID(m).version)
+
+        gen = meme.NewRootMemeGenerator(id_generator='uuid7')
+        rootnb = gen.from_notebook_node(newnb, copy=True)
+        new_memes = [rootnb.metadata['lc_notebook_meme']['current']]
+        new_memes.extend(cell.metadata['lc_cell_meme']['current'] for cell in rootnb.cells)
+        self.assertEqual(sorted(new_memes), new_memes)
+        self.assertLess(memes[-1], new_memes[0])
+
+        with mock.patch.object(uuidgen, 'uuid1_strings', self._deterministic_uuids()):
+            gen = meme.MemeGenerator(id_generator='nblineage.uuidgen.uuid1_strings')
+            newnb = gen.from_notebook_node(nb, copy=True)
+        self.assertEqual(str(uuid.UUID(int=0)), newnb.metadata['lc_notebook_meme']['current'])
+
     def test_new_root_meme(self):
         nb = self._read_notebook('tests/notebooks/notebook.ipynb')
 
@@ -436,6 +607,104 @@ class TestNbLineageApp(unittest.TestCase):
                 ]
             )
 
+    def test_new_root_meme_delta_history(self):
+        def reroot(root_cells_history_format):
+            nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+            newroot_gen = meme.NewRootMemeGenerator(
+                root_cells_history_format=root_cells_history_format)
+            with mock.patch.object(uuidgen, 'uuid1_strings', self._deterministic_uuids()):
+                for i in range(3):
+                    nb = newroot_gen.from_notebook_node(nb)
+                    nb.cells.insert(1, nbformat.v4.new_code_cell('new'))
+                nb = newroot_gen.from_notebook_node(nb)
+            return nb.metadata['lc_notebook_meme']
+
+        table = reroot('table')
+        delta = reroot('delta')
+        self.assertEqual(table['root_cells'], delta['root_cells'])
+        self.assertEqual(table['root_cells_history'], meme.expand_root_cells_history(table))
+        self.assertEqual(table['root_cells_history'], meme.expand_root_cells_history(delta))
+
+        history = delta['root_cells_history']
+        self.assertEqual(4, len(history))
+        self.assertTrue(all(isinstance(x, str) for x in history[0]['orig']))
+        self.assertEqual([0, 1, 2, 3, 4], history[3]['orig'][:1] + history[3]['orig'][2:])
+        self.assertEqual(table['root_cells_history'][3][1][0], history[3]['orig'][1])
+        self.assertEqual(table['root_cells_history'][2], [[o, n] for o, n in zip(
+            [history[1]['new'][x] if isinstance(x, int) else x for x in history[2]['orig']],
+            history[2]['new'])])
+        self.assertNotIn('new', history[3])
+        self.assertLess(len(json.dumps(history)), len(json.dumps(table['root_cells_history'])) * 0.6)
+
+        # encoding the tables gives the same entries
+        self.assertEqual(history, meme.encode_root_cells_history(
+            table['root_cells_history'], table['root_cells']))
+
+    def test_new_root_meme_mixed_history(self):
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        meme.NewRootMemeGenerator(root_cells_history_format='delta').from_notebook_node(nb)
+        meme.NewRootMemeGenerator().from_notebook_node(nb)
+        meme.NewRootMemeGenerator(root_cells_history_format='delta').from_notebook_node(nb)
+
+        memeobj = nb.metadata['lc_notebook_meme']
+        history = memeobj['root_cells_history']
+        self.assertIn('new', history[0])
+        self.assertIsInstance(history[1], list)
+        self.assertEqual([0, 1, 2], history[2]['orig'])
+        tables = meme.expand_root_cells_history(memeobj)
+        self.assertEqual(history[1], tables[1])
+        for prev_table, table in zip(tables, tables[1:]):
+            self.assertEqual([n for o, n in prev_table], [o for o, n in table])
+        self.assertEqual(memeobj['root_cells'], [n for o, n in tables[2]])
+
+    def test_new_root_meme_shared_memes(self):
+        import nblineage.mememap
+
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        other = self._read_notebook('tests/notebooks/notebook.ipynb')
+        other.cells = [other.cells[2], nbformat.v4.new_code_cell('new'), other.cells[0]]
+
+        meme_map = nblineage.mememap.MemeMap()
+        newroot_gen = meme.NewRootMemeGenerator(meme_map=meme_map)
+        newnb = newroot_gen.from_notebook_node(nb, copy=True)
+        newother = newroot_gen.from_notebook_node(other, copy=True)
+
+        self.assertEqual(newnb.metadata['lc_notebook_meme']['current'],
+                         newother.metadata['lc_notebook_meme']['current'])
+        self.assertEqual(newnb.cells[2].metadata['lc_cell_meme']['current'],
+                         newother.cells[0].metadata['lc_cell_meme']['current'])
+        self.assertEqual(newnb.cells[0].metadata['lc_cell_meme']['current'],
+                         newother.cells[2].metadata['lc_cell_meme']['current'])
+        self.assertNotIn(newother.cells[1].metadata['lc_cell_meme']['current'],
+                         [c.metadata['lc_cell_meme']['current'] for c in newnb.cells])
+        self.assertEqual(5, len(meme_map))
+        for cell, newcell in zip(nb.cells, newnb.cells):
+            self.assertEqual(newcell.metadata['lc_cell_meme']['current'],
+                             meme_map[cell.metadata['lc_cell_meme']['current']])
+
+    def test_new_root_meme_shared_branched_memes(self):
+        import nblineage.mememap
+
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        other = self._read_notebook('tests/notebooks/notebook.ipynb')
+        orig_meme = nb.cells[0].metadata['lc_cell_meme']['current']
+        other.cells[0].metadata['lc_cell_meme']['current'] = orig_meme + '-1-abcd'
+
+        meme_map = nblineage.mememap.MemeMap()
+        newroot_gen = meme.NewRootMemeGenerator(meme_map=meme_map)
+        newnb = newroot_gen.from_notebook_node(nb, copy=True)
+        newother = newroot_gen.from_notebook_node(other, copy=True)
+
+        new_meme = newnb.cells[0].metadata['lc_cell_meme']['current']
+        self.assertEqual(new_meme + '-1-abcd',
+                         newother.cells[0].metadata['lc_cell_meme']['current'])
+        self.assertEqual([[orig_meme + '-1-abcd', new_meme + '-1-abcd']],
+                         newroot_gen.new_cells_history[:1])
+        self.assertEqual(new_meme, meme_map[orig_meme])
+        self.assertIsNone(meme_map.get(orig_meme + '-1-abcd'))
+        self.assertEqual(('a', ''), meme.split_branch('a'))
+        self.assertEqual((orig_meme, '-2-abcd-0123'), meme.split_branch(orig_meme + '-2-abcd-0123'))
+
     def test_cli(self):
         from testpath.tempdir import TemporaryWorkingDirectory
 
@@ -491,6 +760,48 @@ class TestNbLineageApp(unittest.TestCase):
                     ]
                 )
 
+    def test_cli_stdio(self):
+        from testpath.tempdir import TemporaryWorkingDirectory
+
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+        with io.open(source_path, 'rb') as f:
+            data = f.read()
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+
+        for args in [[], ['--splice']]:
+            with TemporaryWorkingDirectory():
+                stdin = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+                stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+                with io.open('mapping.ndjson', 'w') as mapping, \
+                        mock.patch('sys.stdin', stdin), mock.patch('sys.stdout', stdout):
+                    nblineage.extensionapp.NewRootMemeApp.clear_instance()
+                    app = nblineage.extensionapp.ExtensionApp()
+                    app.initialize(['new-root-meme', '--mapping-format=ndjson',
+                                    '--mapping-fd={}'.format(mapping.fileno())] +
+                                   args + ['-', '-'])
+                    app.start()
+
+                newnb = nbformat.reads(stdout.buffer.getvalue().decode('utf-8'), as_version=4)
+                with io.open('mapping.ndjson') as f:
+                    rows = [json.loads(line) for line in f]
+                self.assertEqual([{'orig': cell.metadata['lc_cell_meme']['current'],
+                                   'new': newcell.metadata['lc_cell_meme']['current']}
+                                  for cell, newcell in zip(nb.cells, newnb.cells)], rows)
+                self.assertNotEqual(rows[0]['orig'], rows[0]['new'])
+
+    def test_mapping_writer(self):
+        table = [['a', 'b'], ['c', 'd']]
+        for format, with_path, expected in [
+                ('tsv', False, 'a\tb\nc\td\n'),
+                ('tsv', True, 'x\ta\tb\nx\tc\td\n'),
+                ('csv', False, 'orig,new\na,b\nc,d\n'),
+                ('csv', True, 'path,orig,new\nx,a,b\nx,c,d\n'),
+                ('ndjson', True, '{"path": "x", "orig": "a", "new": "b"}\n'
+                                 '{"path": "x", "orig": "c", "new": "d"}\n')]:
+            f = io.StringIO()
+            nblineage.extensionapp.MappingWriter(f, format, with_path=with_path).write(table, 'x')
+            self.assertEqual(expected, f.getvalue())
+
     def test_cli_file_already_exists(self):
         from testpath.tempdir import TemporaryWorkingDirectory
 
@@ -506,5 +817,290 @@ class TestNbLineageApp(unittest.TestCase):
             with self.assertRaises(SystemExit):
                 app.start()
 
+    def test_cli_batch(self):
+        from testpath.tempdir import TemporaryWorkingDirectory
+        from contextlib import redirect_stdout
+        import shutil
+
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+
+        with TemporaryWorkingDirectory():
+            os.makedirs(os.path.join('notebooks', 'sub'))
+            os.makedirs(os.path.join('more', 'sub'))
+            shutil.copy(source_path, os.path.join('notebooks', 'a.ipynb'))
+            shutil.copy(source_path, os.path.join('notebooks', 'sub', 'b.ipynb'))
+            shutil.copy(source_path, os.path.join('more', 'sub', 'c.ipynb'))
+            shutil.copy(source_path, 'd.ipynb')
+
+            def new_root_meme(*args, output_dir='output'):
+                nblineage.extensionapp.NewRootMemeApp.clear_instance()
+                app = nblineage.extensionapp.ExtensionApp()
+                app.initialize(['new-root-meme', '--output-dir=' + output_dir, '--workers=2'] +
+                               list(args))
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    app.start()
+                return [line.split('\t') for line in out.getvalue().splitlines()]
+
+            lines = new_root_meme('notebooks', os.path.join('more', '**', '*.ipynb'),
+                                  'd.ipynb')
+            outputs = [os.path.join('output', 'a.ipynb'),
+                       os.path.join('output', 'sub', 'b.ipynb'),
+                       os.path.join('output', 'sub', 'c.ipynb'),
+                       os.path.join('output', 'd.ipynb')]
+            self.assertEqual(12, len(lines))
+            new_memes = set()
+            for i, path in enumerate(outputs):
+                with io.open(path, encoding='utf-8') as f:
+                    newnb = self._read_notebook_from_stream(f)
+                for cell, orig_cell, line in zip(newnb.cells, nb.cells, lines[i * 3:]):
+                    memeobj = cell.metadata['lc_cell_meme']
+                    self.assertEqual([orig_cell.metadata['lc_cell_meme']['current'],
+                                      memeobj['current']], line[1:])
+                    new_memes.add(memeobj['current'])
+            self.assertEqual(12, len(new_memes))
+
+            # existing destinations are reported once at the end
+            with self.assertRaises(SystemExit):
+                new_root_meme('notebooks')
+
+            with io.open('mapping.csv', 'w') as mapping:
+                self.assertEqual([], new_root_meme('--mapping-format=csv',
+                                                   '--mapping-fd={}'.format(mapping.fileno()),
+                                                   'notebooks', output_dir='output2'))
+            with io.open('mapping.csv') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(['path', 'orig', 'new'], rows[0])
+            self.assertEqual([x[:2] for x in lines[:6]], [x[:2] for x in rows[1:]])
+
+    def test_cli_in_place(self):
+        from testpath.tempdir import TemporaryWorkingDirectory
+        from contextlib import redirect_stdout
+        import shutil
+
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+        with io.open(source_path, 'rb') as f:
+            data = f.read()
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+
+        for args in [[], ['--splice']]:
+            with TemporaryWorkingDirectory():
+                os.makedirs(os.path.join('notebooks', 'sub'))
+                shutil.copy(source_path, os.path.join('notebooks', 'a.ipynb'))
+                shutil.copy(source_path, os.path.join('notebooks', 'sub', 'b.ipynb'))
+
+                nblineage.extensionapp.NewRootMemeApp.clear_instance()
+                app = nblineage.extensionapp.ExtensionApp()
+                app.initialize(['new-root-meme', '--in-place', '--backup-suffix=.bak',
+                                '--workers=2'] + args + ['notebooks'])
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    app.start()
+                lines = [line.split('\t') for line in out.getvalue().splitlines()]
+                self.assertEqual(6, len(lines))
+
+                for i, name in enumerate(['a.ipynb', os.path.join('sub', 'b.ipynb')]):
+                    path = os.path.join('notebooks', name)
+                    with io.open(path + '.bak', 'rb') as f:
+                        self.assertEqual(data, f.read())
+                    with io.open(path, encoding='utf-8') as f:
+                        newnb = self._read_notebook_from_stream(f)
+                    for cell, newcell, line in zip(nb.cells, newnb.cells, lines[i * 3:]):
+                        self.assertEqual([path, cell.metadata['lc_cell_meme']['current'],
+                                          newcell.metadata['lc_cell_meme']['current']], line)
+                self.assertEqual(['a.ipynb', 'a.ipynb.bak', 'sub'],
+                                 sorted(os.listdir('notebooks')))
+
+    def test_cli_batch_shared_memes(self):
+        from testpath.tempdir import TemporaryWorkingDirectory
+        import nblineage.mememap
+
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        other = self._read_notebook('tests/notebooks/notebook.ipynb')
+        del other.metadata['lc_notebook_meme']
+        branched = deepcopy(other.cells[0])
+        branched.metadata['lc_cell_meme']['current'] += '-1-abcd'
+        other.cells = [other.cells[1], nbformat.v4.new_code_cell('new'), branched]
+
+        with TemporaryWorkingDirectory():
+            os.makedirs('notebooks')
+            for name, x in [('a.ipynb', nb), ('b.ipynb', other)]:
+                with io.open(os.path.join('notebooks', name), 'w', encoding='utf-8') as f:
+                    nbformat.write(x, f)
+
+            def new_root_meme(output_dir):
+                nblineage.extensionapp.NewRootMemeApp.clear_instance()
+                app = nblineage.extensionapp.ExtensionApp()
+                app.initialize(['new-root-meme', '--output-dir=' + output_dir, '--workers=2',
+                                '--meme-map=memes.tsv', 'notebooks'])
+                app.start()
+                result = []
+                for name in ['a.ipynb', 'b.ipynb']:
+                    with io.open(os.path.join(output_dir, name), encoding='utf-8') as f:
+                        result.append(self._read_notebook_from_stream(f))
+                return result
+
+            newnb, newother = new_root_meme('output')
+            self.assertEqual(newnb.cells[1].metadata['lc_cell_meme']['current'],
+                             newother.cells[0].metadata['lc_cell_meme']['current'])
+            # the branched copy of a cell in the other notebook keeps its suffix
+            self.assertEqual(newnb.cells[0].metadata['lc_cell_meme']['current'] + '-1-abcd',
+                             newother.cells[2].metadata['lc_cell_meme']['current'])
+
+            meme_map = nblineage.mememap.MemeMap.load('memes.tsv')
+            # the notebook meme, 3 cells and the new cell of b.ipynb
+            self.assertEqual(5, len(meme_map))
+            self.assertEqual(newnb.metadata['lc_notebook_meme']['current'],
+                             meme_map[nb.metadata['lc_notebook_meme']['current']])
+            for cell, newcell in zip(nb.cells, newnb.cells):
+                self.assertEqual(newcell.metadata['lc_cell_meme']['current'],
+                                 meme_map[cell.metadata['lc_cell_meme']['current']])
+
+            # the map is reused by later runs
+            renb, reother = new_root_meme('output2')
+            self.assertEqual([c.metadata['lc_cell_meme']['current'] for c in newnb.cells],
+                             [c.metadata['lc_cell_meme']['current'] for c in renb.cells])
+            self.assertEqual(newother.cells[0].metadata['lc_cell_meme']['current'],
+                             reother.cells[0].metadata['lc_cell_meme']['current'])
+            self.assertEqual(6, len(nblineage.mememap.MemeMap.load('memes.tsv')))
+
+    def test_cli_serve_batch(self):
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+        requests = ''.join(json.dumps({'id': i, 'op': 'new-root', 'path': source_path}) + '\n'
+                           for i in range(4))
+        stdin = io.TextIOWrapper(io.BytesIO(requests.encode('utf-8')), encoding='utf-8')
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        with mock.patch('sys.stdin', stdin), mock.patch('sys.stdout', stdout):
+            app = nblineage.extensionapp.ExtensionApp()
+            app.initialize(['serve-batch', '--workers=2', '--trim-history=0'])
+            app.start()
+
+        responses = [json.loads(line)
+                     for line in stdout.buffer.getvalue().decode('utf-8').splitlines()]
+        self.assertEqual([0, 1, 2, 3], sorted(r['id'] for r in responses))
+        for response in responses:
+            newnb = nbformat.from_dict(response['result']['notebook'])
+            self.assertEqual([], newnb.metadata['lc_notebook_meme']['history'])
+
+        nomeme_path = self._get_filepath('tests/notebooks/notebook-nomeme.ipynb')
+        requests = ''.join(json.dumps({'id': i, 'op': op, 'path': path}) + '\n'
+                           for i, (op, path) in enumerate([('new-root', source_path),
+                                                           ('generate-memes', nomeme_path)]))
+        stdin = io.TextIOWrapper(io.BytesIO(requests.encode('utf-8')), encoding='utf-8')
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        with mock.patch('sys.stdin', stdin), mock.patch('sys.stdout', stdout):
+            nblineage.extensionapp.ServeBatchApp.clear_instance()
+            app = nblineage.extensionapp.ExtensionApp()
+            app.initialize(['serve-batch', '--id-generator=uuid7'])
+            app.start()
+
+        responses = [json.loads(line)
+                     for line in stdout.buffer.getvalue().decode('utf-8').splitlines()]
+        self.assertEqual(2, len(responses))
+        for response in responses:
+            self.assertEqual(7, uuid.UUID(response['result']['notebook_meme']).version)
+
+    def test_cli_scan(self):
+        from testpath.tempdir import TemporaryWorkingDirectory
+        import shutil
+        import nblineage.index
+
+        source_path = self._get_filepath('tests/notebooks/notebook.ipynb')
+
+        with TemporaryWorkingDirectory() as td:
+            os.makedirs(os.path.join('notebooks', 'sub'))
+            os.makedirs(os.path.join('notebooks', '.ipynb_checkpoints'))
+            shutil.copy(source_path, os.path.join('notebooks', 'a.ipynb'))
+            shutil.copy(source_path, os.path.join('notebooks', 'sub', 'b.ipynb'))
+            shutil.copy(source_path, os.path.join('notebooks', '.ipynb_checkpoints', 'a.ipynb'))
+            with io.open(os.path.join('notebooks', 'broken.ipynb'), 'w') as f:
+                f.write('{')
+
+            def scan(*args):
+                app = nblineage.extensionapp.ExtensionApp()
+                app.initialize(['scan', '--index-file=index.db', '--workers=2'] +
+                               list(args) + ['notebooks'])
+                app.start()
+
+            scan()
+            lineage_index = nblineage.index.LineageIndex(index_file='index.db')
+            nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+            cells = lineage_index.find_cells(nb.cells[0].metadata['lc_cell_meme']['current'])
+            self.assertEqual(['a.ipynb', 'sub/b.ipynb'], [c['path'] for c in cells])
+            stats = lineage_index.notebook_stats()
+            self.assertEqual(['a.ipynb', 'sub/b.ipynb'], sorted(stats.keys()))
+
+            # unchanged notebooks are skipped
+            lineage_index.remove_notebook('a.ipynb')
+            lineage_index.update_rows('sub/b.ipynb', None, [],
+                                      mtime=stats['sub/b.ipynb'][0],
+                                      size=stats['sub/b.ipynb'][1])
+            scan()
+            self.assertEqual(1, len(lineage_index.find_cells(
+                nb.cells[0].metadata['lc_cell_meme']['current'])))
+
+            os.remove(os.path.join('notebooks', 'a.ipynb'))
+            scan('--force', '--prune')
+            cells = lineage_index.find_cells(nb.cells[0].metadata['lc_cell_meme']['current'])
+            self.assertEqual(['sub/b.ipynb'], [c['path'] for c in cells])
+
+            # a subdirectory is indexed with the paths of the server root and
+            # pruned without removing the notebooks outside of it
+            shutil.copy(source_path, os.path.join('notebooks', 'a.ipynb'))
+            shutil.copy(source_path, os.path.join('notebooks', 'sub', 'c.ipynb'))
+            scan()
+            os.remove(os.path.join('notebooks', 'sub', 'b.ipynb'))
+            app = nblineage.extensionapp.ExtensionApp()
+            app.initialize(['scan', '--index-file=index.db', '--workers=2', '--prune',
+                            '--root-dir=notebooks', os.path.join('notebooks', 'sub')])
+            app.start()
+            self.assertEqual(['a.ipynb', 'sub/c.ipynb'],
+                             sorted(lineage_index.notebook_stats().keys()))
+            lineage_index.close()
+
+    def test_cli_compact(self):
+        from testpath.tempdir import TemporaryWorkingDirectory
+        from contextlib import redirect_stdout
+
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        for cell in nb.cells:
+            memeobj = cell.metadata['lc_cell_meme']
+            entry = {'current': memeobj['current'], 'previous': None, 'next': None}
+            memeobj['history'] = [entry, entry, dict(entry, next='x')]
+
+        with TemporaryWorkingDirectory() as td:
+            os.makedirs(os.path.join('notebooks', 'sub'))
+            for path in ['a.ipynb', os.path.join('sub', 'b.ipynb')]:
+                with io.open(os.path.join('notebooks', path), 'w', encoding='utf-8') as f:
+                    nbformat.write(nb, f)
+            size = os.path.getsize(os.path.join('notebooks', 'a.ipynb'))
+
+            def compact(*args):
+                nblineage.extensionapp.CompactApp.clear_instance()
+                app = nblineage.extensionapp.ExtensionApp()
+                app.initialize(['compact', '--workers=2'] + list(args) + ['notebooks'])
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    app.start()
+                return out.getvalue()
+
+            output = compact('--dry-run')
+            self.assertIn('2 of 2 notebooks compacted', output)
+            self.assertIn('would save', output)
+            self.assertEqual(size, os.path.getsize(os.path.join('notebooks', 'a.ipynb')))
+
+            output = compact('--cell-history=1')
+            self.assertIn('2 of 2 notebooks compacted', output)
+            self.assertLess(os.path.getsize(os.path.join('notebooks', 'a.ipynb')), size)
+            with io.open(os.path.join('notebooks', 'sub', 'b.ipynb'), encoding='utf-8') as f:
+                newnb = self._read_notebook_from_stream(f)
+            for cell in newnb.cells:
+                self.assertEqual([{'current': cell.metadata['lc_cell_meme']['current'],
+                                   'previous': None, 'next': 'x'}],
+                                 cell.metadata['lc_cell_meme']['history'])
+
+            self.assertIn('0 of 2 notebooks compacted', compact())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import os.path
+import io
+import json
+import nbformat
+
+from testpath.tempdir import TemporaryDirectory
+
+import nblineage
+import nblineage.meme as meme
+from nblineage.nbstream import (read_metadata, read_metadata_from_filename,
+                                read_metadata_spans, write_spliced,
+                                UnsupportedNotebookError)
+
+class TestReadMetadata(unittest.TestCase):
+
+    def _get_filepath(self, name):
+        path = os.path.dirname(nblineage.__file__)
+        path = os.path.abspath(path)
+        path = os.path.normpath(path)
+        return os.path.join(path, name)
+
+    def _read_notebook(self, name):
+        with io.open(self._get_filepath(name), encoding='utf-8') as f:
+            return nbformat.read(f, as_version=4)
+
+    def _make_notebook(self):
+        nb = self._read_notebook('tests/notebooks/notebook.ipynb')
+        cell = nbformat.v4.new_code_cell(source='print("\\\\\\"}]{[")\n' * 100)
+        cell.metadata['lc_cell_meme'] = {'current': 'a"b\\cあ'}
+        cell.metadata['extra'] = ['x', {'y': [1, 2.5e3, None, True, False]}]
+        cell.outputs.append(nbformat.v4.new_output(
+            'display_data', data={'image/png': 'iVBORw0KGgo' * 1000,
+                                  'text/plain': '"}\\'}))
+        cell.execution_count = 3
+        nb.cells.append(cell)
+        nb.cells.append(nbformat.v4.new_markdown_cell(
+            source='x', attachments={'a.png': {'image/png': 'AAAA'}}))
+        nb.cells.append(nbformat.v4.new_raw_cell())
+        return nb
+
+    def _assert_metadata(self, nb, metadata):
+        self.assertEqual(nb.metadata, metadata.metadata)
+        self.assertEqual(nb.nbformat, metadata.nbformat)
+        self.assertEqual(nb.nbformat_minor, metadata.nbformat_minor)
+        self.assertEqual(len(nb.cells), len(metadata.cells))
+        for cell, meta_cell in zip(nb.cells, metadata.cells):
+            self.assertEqual(cell.metadata, meta_cell.metadata)
+            self.assertEqual(cell.cell_type, meta_cell.cell_type)
+            self.assertEqual(cell.get('id'), meta_cell.get('id'))
+            self.assertEqual(cell.get('execution_count'), meta_cell.get('execution_count'))
+            self.assertFalse('source' in meta_cell)
+            self.assertFalse('outputs' in meta_cell)
+            self.assertFalse('attachments' in meta_cell)
+
+    def test_read_metadata_from_filename(self):
+        for name in ['notebook.ipynb', 'notebook-nomeme.ipynb']:
+            path = self._get_filepath('tests/notebooks/' + name)
+            nb = self._read_notebook('tests/notebooks/' + name)
+            self._assert_metadata(nb, read_metadata_from_filename(path))
+
+    def test_read_metadata_chunks(self):
+        nb = self._make_notebook()
+        for data in [nbformat.writes(nb).encode('utf-8'),
+                     json.dumps(nb, ensure_ascii=False).encode('utf-8')]:
+            for chunk_size in [1, 2, 3, 7, 4096]:
+                metadata = read_metadata(io.BytesIO(data), chunk_size=chunk_size)
+                self._assert_metadata(nb, metadata)
+
+    def test_read_metadata_invalid(self):
+        for data in [b'{"cells": [', b'{"cells": [{"source": "abc}]}', b'[]', b'{} x']:
+            with self.assertRaises(ValueError):
+                read_metadata(io.BytesIO(data))
+
+    def test_read_metadata_v3(self):
+        nb = nbformat.v3.new_notebook(worksheets=[nbformat.v3.new_worksheet(
+            cells=[nbformat.v3.new_code_cell(input='1')])])
+        data = nbformat.writes(nb, version=3).encode('utf-8')
+        with self.assertRaises(UnsupportedNotebookError):
+            read_metadata(io.BytesIO(data))
+
+        with TemporaryDirectory() as td:
+            path = os.path.join(td, 'v3.ipynb')
+            with io.open(path, 'wb') as f:
+                f.write(data)
+            metadata = read_metadata_from_filename(path)
+            self.assertEqual(4, metadata.nbformat)
+            self.assertEqual(1, len(metadata.cells))
+
+    def _splice(self, data, modify):
+        nb, spans = read_metadata_spans(io.BytesIO(data), chunk_size=5)
+        modify(nb)
+        out = io.BytesIO()
+        replaced = write_spliced(io.BytesIO(data), out, nb, spans, chunk_size=7)
+        return out.getvalue(), replaced
+
+    def test_write_spliced(self):
+        nb = self._make_notebook()
+        data = nbformat.writes(nb).encode('utf-8')
+
+        # unchanged
+        spliced, replaced = self._splice(data, lambda metadata: None)
+        self.assertEqual(0, replaced)
+        self.assertEqual(data, spliced)
+
+        # same bytes as nbformat for notebooks written by nbformat
+        gen = meme.NewRootMemeGenerator()
+        spliced, replaced = self._splice(data, gen.from_notebook_node)
+        self.assertEqual(1 + len(nb.cells), replaced)
+        newnb = nbformat.reads(spliced.decode('utf-8'), as_version=4)
+        self.assertEqual(nbformat.writes(newnb).encode('utf-8'), spliced)
+        for cell, newcell in zip(nb.cells, newnb.cells):
+            self.assertEqual(cell.source, newcell.source)
+            self.assertEqual(cell.get('outputs'), newcell.get('outputs'))
+        self.assertEqual(
+            [x[1] for x in gen.new_cells_history],
+            [c.metadata['lc_cell_meme']['current'] for c in newnb.cells])
+
+    def test_write_spliced_compact(self):
+        nb = self._make_notebook()
+        data = json.dumps(nb, ensure_ascii=False).encode('utf-8')
+
+        def modify(metadata):
+            metadata.cells[0].metadata['lc_cell_meme']['current'] = 'new'
+        spliced, replaced = self._splice(data, modify)
+        self.assertEqual(1, replaced)
+        self.assertFalse(b'\n' in spliced)
+        newnb = nbformat.reads(spliced.decode('utf-8'), as_version=4)
+        self.assertEqual('new', newnb.cells[0].metadata['lc_cell_meme']['current'])
+        self.assertEqual(nb.cells[1:], newnb.cells[1:])
+
+    def test_write_spliced_cells_changed(self):
+        nb = self._make_notebook()
+        data = nbformat.writes(nb).encode('utf-8')
+        with self.assertRaises(ValueError):
+            self._splice(data, lambda metadata: metadata.cells.pop())
+
+if __name__ == '__main__':
+    unittest.main()
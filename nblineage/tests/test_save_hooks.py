@@ -0,0 +1,69 @@
+import unittest
+import os.path
+import io
+import json
+import nbformat
+
+from jupyter_server.services.contents.filemanager import FileContentsManager
+from testpath.tempdir import TemporaryDirectory
+
+import nblineage
+from nblineage.save_hooks import LineageSaveHooks
+
+class TestLineageSaveHooks(unittest.TestCase):
+
+    def _get_filepath(self, name):
+        path = os.path.dirname(nblineage.__file__)
+        path = os.path.abspath(path)
+        path = os.path.normpath(path)
+        return os.path.join(path, name)
+
+    def _read_notebook_json(self, name):
+        with io.open(self._get_filepath(name), encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_pre_save_generates_meme(self):
+        hooks = LineageSaveHooks(generate_meme=True)
+        model = dict(
+            type='notebook',
+            content=self._read_notebook_json('tests/notebooks/notebook-nomeme.ipynb')
+        )
+        hooks.pre_save(model=model, path='notebook.ipynb', contents_manager=None)
+
+        nb = model['content']
+        self.assertTrue('current' in nb.metadata['lc_notebook_meme'])
+        for cell in nb.cells:
+            self.assertTrue('current' in cell.metadata['lc_cell_meme'])
+
+    def test_pre_save_ignores_files(self):
+        hooks = LineageSaveHooks(generate_meme=True)
+        model = dict(type='file', format='text', content='text')
+        hooks.pre_save(model=model, path='file.txt', contents_manager=None)
+        self.assertEqual('text', model['content'])
+
+    def test_register(self):
+        with TemporaryDirectory() as td:
+            cm = FileContentsManager(root_dir=td)
+            hooks = LineageSaveHooks()
+            hooks.register(cm)
+            self.assertEqual('client', hooks.meme_generation)
+
+            nb = self._read_notebook_json('tests/notebooks/notebook-nomeme.ipynb')
+            cm.save(dict(type='notebook', content=nb), 'client.ipynb')
+            with io.open(os.path.join(td, 'client.ipynb'), encoding='utf-8') as f:
+                saved = nbformat.read(f, as_version=4)
+            self.assertFalse('lc_notebook_meme' in saved.metadata)
+
+            hooks = LineageSaveHooks(generate_meme=True)
+            hooks.register(cm)
+            self.assertEqual('server', hooks.meme_generation)
+
+            cm.save(dict(type='notebook', content=nb), 'server.ipynb')
+            with io.open(os.path.join(td, 'server.ipynb'), encoding='utf-8') as f:
+                saved = nbformat.read(f, as_version=4)
+            self.assertTrue('current' in saved.metadata['lc_notebook_meme'])
+            for cell in saved.cells:
+                self.assertTrue('current' in cell.metadata['lc_cell_meme'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+import os
+import os.path
+
+from testpath import modified_env
+from testpath.tempdir import TemporaryDirectory
+
+from nblineage.tracking_server import TrackingServer, get_data_dir
+
+class TestTrackingServer(unittest.TestCase):
+
+    def test_data_dir(self):
+        with TemporaryDirectory() as td:
+            data_dir = os.path.join(td, 'data')
+            with modified_env({'JUPYTER_DATA_DIR': data_dir}):
+                self.assertEqual(data_dir, get_data_dir())
+                self.assertTrue(os.path.isdir(data_dir))
+
+                tracking_server = TrackingServer()
+                self.assertEqual(data_dir, tracking_server.data_dir)
+                self.assertEqual(os.path.join(data_dir, 'server_signature'),
+                                 tracking_server.server_signature_file)
+
+    def test_server_signature(self):
+        with TemporaryDirectory() as td:
+            with modified_env({'JUPYTER_DATA_DIR': td,
+                               'lc_nblineage_server_signature_path': None}):
+                sign_id = TrackingServer().server_signature
+                self.assertTrue(os.path.exists(os.path.join(td, 'server_signature')))
+                self.assertEqual(sign_id, TrackingServer().server_signature)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import time
+from unittest import mock
+from uuid import UUID
+
+from nblineage.uuid_pool import UUIDPool
+
+class TestUUIDPool(unittest.TestCase):
+
+    def _wait_for(self, pool, size, timeout=10):
+        deadline = time.time() + timeout
+        while len(pool) < size and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_take_without_refill(self):
+        pool = UUIDPool(low_water_mark=0, refill_size=10)
+        uuids = pool.take(5)
+        self.assertEqual(5, len(uuids))
+        self.assertEqual(5, len(set(uuids)))
+        for u in uuids:
+            self.assertEqual(1, UUID(u).version)
+
+    def test_id_generator(self):
+        pool = UUIDPool(low_water_mark=0, refill_size=10, id_generator='uuid7')
+        pool.refill()
+        uuids = pool.take(15)
+        self.assertEqual(15, len(set(uuids)))
+        for u in uuids:
+            self.assertEqual(7, UUID(u).version)
+
+    def test_take_from_pool(self):
+        pool = UUIDPool(low_water_mark=10, refill_size=100)
+        pool.refill()
+        self.assertEqual(100, len(pool))
+        uuids = pool.take(30)
+        self.assertEqual(30, len(uuids))
+        self.assertEqual(70, len(pool))
+        # served oldest first
+        times = [UUID(u).time for u in uuids]
+        self.assertEqual(sorted(times), times)
+
+    def test_take_more_than_pool(self):
+        pool = UUIDPool(low_water_mark=0, refill_size=10)
+        pool.refill()
+        uuids = pool.take(25)
+        self.assertEqual(25, len(uuids))
+        self.assertEqual(25, len(set(uuids)))
+        self.assertEqual(0, len(pool))
+
+    def test_max_age(self):
+        pool = UUIDPool(low_water_mark=0, refill_size=10, max_age=60)
+        with mock.patch('time.monotonic', return_value=1000.0):
+            pool.refill()
+        with mock.patch('time.monotonic', return_value=1030.0):
+            pool.refill()
+        with mock.patch('time.monotonic', return_value=1070.0):
+            self.assertTrue(pool.can_take(10))
+            self.assertFalse(pool.can_take(11))
+            self.assertEqual(10, len(pool))
+            uuids = pool.take(5)
+        self.assertEqual(5, len(pool))
+        self.assertEqual(5, len(uuids))
+
+        pool = UUIDPool(low_water_mark=0, refill_size=10, max_age=0)
+        with mock.patch('time.monotonic', return_value=1000.0):
+            pool.refill()
+        with mock.patch('time.monotonic', return_value=100000.0):
+            self.assertTrue(pool.can_take(10))
+
+    def test_background_refill(self):
+        pool = UUIDPool(low_water_mark=50, refill_size=100)
+        pool.start()
+        try:
+            self._wait_for(pool, 150)
+            self.assertTrue(len(pool) >= 150)
+            pool.take(len(pool) - 10)
+            self._wait_for(pool, 150)
+            self.assertTrue(len(pool) >= 150)
+        finally:
+            pool.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from uuid import UUID, RFC_4122
+
+from nblineage import uuidgen
+
+def _generate_in_process(count):
+    return os.getpid(), uuidgen.uuid1_strings(count)
+
+class TestUUIDGen(unittest.TestCase):
+
+    def test_uuid1_strings(self):
+        before = time.time_ns() // 100 + uuidgen._UUID_EPOCH_OFFSET
+        uuids = uuidgen.uuid1_strings(1000)
+        self.assertEqual(1000, len(uuids))
+        self.assertEqual(1000, len(set(uuids)))
+        parsed = [UUID(u) for u in uuids]
+        for u, s in zip(parsed, uuids):
+            self.assertEqual(1, u.version)
+            self.assertEqual(RFC_4122, u.variant)
+            self.assertEqual(s, str(u))
+        times = [u.time for u in parsed]
+        self.assertEqual(list(range(times[0], times[0] + 1000)), times)
+        self.assertGreaterEqual(times[0], before)
+        self.assertEqual(1, len(set(u.clock_seq for u in parsed)))
+        self.assertEqual(1, len(set(u.node for u in parsed)))
+
+    def test_sequencing(self):
+        first = uuidgen.uuid1_strings(10)
+        second = uuidgen.uuid1_strings(10)
+        self.assertLess(UUID(first[-1]).time, UUID(second[0]).time)
+        self.assertEqual([], uuidgen.uuid1_strings(0))
+
+    def test_clock_going_backwards(self):
+        first = uuidgen.uuid1_strings(3)
+        with mock.patch.object(uuidgen.time, 'time_ns', return_value=0):
+            second = uuidgen.uuid1_strings(3)
+        self.assertEqual(UUID(first[-1]).time + 1, UUID(second[0]).time)
+        self.assertEqual(UUID(first[0]).clock_seq, UUID(second[0]).clock_seq)
+
+    def test_time_low_overflow(self):
+        # the first timestamp is 2 ticks before time_mid changes
+        ns = ((((uuidgen._UUID_EPOCH_OFFSET >> 32) + 100) << 32) - 2
+              - uuidgen._UUID_EPOCH_OFFSET) * 100
+        with mock.patch.object(uuidgen, '_last_timestamp', None), \
+                mock.patch.object(uuidgen.time, 'time_ns', return_value=ns):
+            uuids = uuidgen.uuid1_strings(4)
+        times = [UUID(u).time for u in uuids]
+        self.assertEqual(list(range(times[0], times[0] + 4)), times)
+        self.assertEqual(0xfffffffe, UUID(uuids[0]).time_low)
+        self.assertEqual(0, UUID(uuids[2]).time_low)
+
+    def test_processes(self):
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(_generate_in_process, [1000] * 16))
+        uuids = [u for pid, batch in results for u in batch]
+        self.assertEqual(16000, len(set(uuids)))
+        for pid, batch in results:
+            node = UUID(batch[0]).node
+            self.assertEqual(pid, node & 0x3fffff)
+            self.assertTrue(node & (1 << 40))
+        self.assertEqual(len(set(pid for pid, batch in results)),
+                         len(set(UUID(batch[0]).node for pid, batch in results)))
+
+        with mock.patch.object(uuidgen, '_pid', None):
+            node = UUID(uuidgen.uuid1_strings(1)[0]).node
+        self.assertEqual(os.getpid(), node & 0x3fffff)
+
+    def test_uuid1_bytes(self):
+        packed = uuidgen.uuid1_bytes(300)
+        self.assertEqual(300 * 16, len(packed))
+        parsed = [UUID(bytes=packed[i:i + 16]) for i in range(0, len(packed), 16)]
+        self.assertEqual(300, len(set(parsed)))
+        times = [u.time for u in parsed]
+        self.assertEqual(list(range(times[0], times[0] + 300)), times)
+        for u in parsed:
+            self.assertEqual(1, u.version)
+            self.assertEqual(RFC_4122, u.variant)
+        self.assertEqual(b'', uuidgen.uuid1_bytes(0))
+
+    def test_id_buffer(self):
+        calls = []
+        def generate(count):
+            calls.append(count)
+            return [str(len(calls)) + '-' + str(i) for i in range(count)]
+        new_id = uuidgen.IdBuffer(generate, min_batch=2, max_batch=4)
+        ids = [new_id() for x in range(11)]
+        self.assertEqual([2, 4, 4, 4], calls)
+        self.assertEqual(['1-0', '1-1', '2-0', '2-1', '2-2', '2-3', '3-0'], ids[:7])
+
+    def test_uuid7_strings(self):
+        before = time.time_ns() // 1000000
+        uuids = uuidgen.uuid7_strings(5000)
+        after = time.time_ns() // 1000000
+        self.assertEqual(5000, len(set(uuids)))
+        self.assertEqual(sorted(uuids), uuids)
+        for s in uuids:
+            u = UUID(s)
+            self.assertEqual(7, u.version)
+            self.assertEqual(RFC_4122, u.variant)
+            self.assertEqual(s, str(u))
+        # the first id has the current time, later ones may run ahead of it
+        # when they exceed the 12-bit counter of a millisecond
+        self.assertGreaterEqual(UUID(uuids[0]).int >> 80, before)
+        self.assertLessEqual(UUID(uuids[0]).int >> 80, after)
+        self.assertLess(uuids[-1], uuidgen.uuid7_strings(1)[0])
+        self.assertEqual([], uuidgen.uuid7_strings(0))
+
+    def test_uuid7_bytes(self):
+        packed = uuidgen.uuid7_bytes(10)
+        parsed = [UUID(bytes=packed[i:i + 16]) for i in range(0, len(packed), 16)]
+        self.assertEqual(10, len(set(parsed)))
+        self.assertEqual(sorted(parsed), parsed)
+        for u in parsed:
+            self.assertEqual(7, u.version)
+
+    def test_get_id_generator(self):
+        self.assertIs(uuidgen.uuid1_strings, uuidgen.get_id_generator('uuid1'))
+        self.assertIs(uuidgen.uuid7_strings, uuidgen.get_id_generator('uuid7'))
+        self.assertIs(uuidgen.uuid7_strings,
+                      uuidgen.get_id_generator('nblineage.uuidgen.uuid7_strings'))
+        with self.assertRaises(ImportError):
+            uuidgen.get_id_generator('nblineage.uuidgen.unknown')
+
+    def test_validate_id_generator(self):
+        from traitlets import TraitError
+        from nblineage.meme import MemeGenerator, NewRootMemeGenerator
+        from nblineage.uuid_pool import UUIDPool
+
+        self.assertEqual('uuid7', MemeGenerator(id_generator='uuid7').id_generator)
+        for cls in (MemeGenerator, NewRootMemeGenerator, UUIDPool):
+            for name in ('uuid8', 'nblineage.uuidgen.unknown', 'nblineage.uuidgen'):
+                with self.assertRaises(TraitError):
+                    cls(id_generator=name)
+
+    def test_get_bytes_generator(self):
+        self.assertIs(uuidgen.uuid1_bytes, uuidgen.get_bytes_generator('uuid1'))
+        self.assertIs(uuidgen.uuid7_bytes, uuidgen.get_bytes_generator('uuid7'))
+        self.assertIsNone(uuidgen.get_bytes_generator('nblineage.uuidgen.uuid7_strings'))
@@ -3,12 +3,33 @@ import os
 from uuid import uuid1
 
 from jupyter_core.application import JupyterApp
+from jupyter_core.paths import jupyter_data_dir
+from jupyter_core.utils import ensure_dir_exists
 
 from traitlets.config import LoggingConfigurable, MultipleInstanceError
 from traitlets import (
     Unicode, default
 )
 
+# environment variables that jupyter_data_dir() depends on
+_DATA_DIR_ENV_VARS = ('JUPYTER_DATA_DIR', 'JUPYTER_PLATFORM_DIRS',
+                      'XDG_DATA_HOME', 'HOME', 'APPDATA')
+_data_dir_cache = {}
+
+def get_data_dir():
+    """Return the Jupyter data directory, creating it if needed.
+
+    This is the same directory as `JupyterApp.data_dir`, resolved without
+    constructing an application. The result is memoized for the current
+    environment.
+    """
+    key = tuple(os.environ.get(name) for name in _DATA_DIR_ENV_VARS)
+    if key not in _data_dir_cache:
+        data_dir = jupyter_data_dir()
+        ensure_dir_exists(data_dir, mode=0o700)
+        _data_dir_cache[key] = data_dir
+    return _data_dir_cache[key]
+
 class TrackingServer(LoggingConfigurable):
 
     def __init__(self, **kwargs):
@@ -24,9 +45,7 @@ class TrackingServer(LoggingConfigurable):
         except MultipleInstanceError:
             pass
         if app is None:
-            # create an app, without the global instance
-            app = JupyterApp()
-            app.initialize(argv=[])
+            return get_data_dir()
         return app.data_dir
 
     server_signature_file = Unicode(
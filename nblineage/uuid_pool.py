@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+
+from traitlets.config import LoggingConfigurable
+from traitlets import Float, Int, Unicode, validate
+
+from .uuidgen import ID_GENERATOR_HELP, get_id_generator, validate_id_generator
+
+def generate_uuids(count, id_generator='uuid1'):
+    return get_id_generator(id_generator)(count)
+
+class UUIDPool(LoggingConfigurable):
+    """A process-wide pool of pre-generated UUIDs.
+
+    The pool is refilled in bulk from a background thread when the number
+    of available UUIDs falls below `low_water_mark`, so that requests are
+    served by slicing the pool. Batches older than `max_age` are
+    discarded, so that time-based UUIDs served by the pool stay close to
+    the time of the request.
+
+    If the pool cannot serve a request, `take` generates the missing
+    UUIDs on the caller's thread; callers on an event loop should check
+    `can_take` and call `take` on an executor otherwise.
+    """
+
+    low_water_mark = Int(1000, min=0,
+                         help='Refill the pool when fewer UUIDs than this are available'
+                        ).tag(config=True)
+
+    refill_size = Int(10000, min=1,
+                      help='Number of UUIDs generated by each refill'
+                     ).tag(config=True)
+
+    max_age = Float(60.0, min=0,
+                    help='Discard pooled UUIDs generated more than this many seconds ago, '
+                         'or 0 to keep them until they are served'
+                   ).tag(config=True)
+
+    id_generator = Unicode('uuid1',
+                           help='The generator of the pooled ids: ' + ID_GENERATOR_HELP
+                          ).tag(config=True)
+
+    @validate('id_generator')
+    def _validate_id_generator(self, proposal):
+        return validate_id_generator(proposal['value'])
+
+    def __init__(self, **kwargs):
+        super(UUIDPool, self).__init__(**kwargs)
+        # Batches of (generation time, UUIDs) with the oldest batch first,
+        # and the oldest UUID at the end of each batch
+        self._batches = deque()
+        self._count = 0
+        self._lock = threading.Lock()
+        self._refill_requested = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._refill_loop,
+                                        name='nblineage-uuid-pool')
+        self._thread.daemon = True
+        self._thread.start()
+        self._refill_requested.set()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._refill_requested.set()
+        self._thread.join()
+        self._thread = None
+
+    def __len__(self):
+        return self._count
+
+    def _discard_stale(self):
+        """Discard the expired batches, with the lock held"""
+        if self.max_age <= 0:
+            return
+        expires = time.monotonic() - self.max_age
+        while self._batches and self._batches[0][0] < expires:
+            created, uuids = self._batches.popleft()
+            self._count -= len(uuids)
+            self.log.debug('Discarded %d stale UUIDs', len(uuids))
+
+    def can_take(self, count):
+        """Return True if `take(count)` is served from the pool without generating UUIDs"""
+        with self._lock:
+            self._discard_stale()
+            return count <= self._count
+
+    def take(self, count):
+        uuids = []
+        with self._lock:
+            self._discard_stale()
+            while len(uuids) < count and self._batches:
+                batch = self._batches[0][1]
+                n = min(count - len(uuids), len(batch))
+                taken = batch[len(batch) - n:]
+                del batch[len(batch) - n:]
+                taken.reverse()
+                uuids.extend(taken)
+                if not batch:
+                    self._batches.popleft()
+            self._count -= len(uuids)
+            remaining = self._count
+        if remaining < self.low_water_mark:
+            self._refill_requested.set()
+        if len(uuids) < count:
+            # The pool ran dry; generate the rest on the caller's thread
+            self.log.debug('UUID pool exhausted, generating %d UUIDs', count - len(uuids))
+            uuids.extend(generate_uuids(count - len(uuids), self.id_generator))
+        return uuids
+
+    def refill(self):
+        uuids = generate_uuids(self.refill_size, self.id_generator)
+        uuids.reverse()
+        with self._lock:
+            self._batches.append((time.monotonic(), uuids))
+            self._count += len(uuids)
+            available = self._count
+        self.log.debug('UUID pool refilled, %d UUIDs available', available)
+        return available
+
+    def _refill_loop(self):
+        while True:
+            timeout = self.max_age / 2 if self.max_age > 0 else None
+            self._refill_requested.wait(timeout)
+            self._refill_requested.clear()
+            if self._stopped:
+                return
+            try:
+                with self._lock:
+                    self._discard_stale()
+                while len(self) < self.low_water_mark + self.refill_size:
+                    self.refill()
+                    if self._stopped:
+                        return
+            except Exception:
+                self.log.error('Failed to refill the UUID pool', exc_info=True)
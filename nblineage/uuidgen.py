@@ -0,0 +1,193 @@
+"""Batch generation of meme ids
+
+`uuid.uuid1()` takes a lock and reads the clock for every UUID. The
+functions of this module reserve a range of consecutive timestamps with a
+single clock read and build the UUIDs of the range from it, as strings or
+as packed 16-byte big-endian UUIDs.
+
+Version 1 UUIDs follow RFC 4122. Timestamps never go backwards within a
+process, even if the clock does, so that the UUIDs of a process are
+unique for its clock sequence and node. Processes of a host reserve
+timestamps independently, so the node is not the hardware address but a
+random multicast address whose low 22 bits are the process id, as
+allowed by RFC 4122 section 4.5: processes running at the same time get
+different nodes. The node and the random clock sequence are regenerated
+in forked processes.
+
+Version 7 UUIDs follow RFC 9562, with a 12-bit counter in `rand_a`, so
+that the ids of a process sort lexically in generation order.
+
+An id generator is a function which takes a count and returns a list of
+that many id strings in the UUID format. `get_id_generator` resolves the
+names in `ID_GENERATORS` or the import string of such a function.
+"""
+import os
+import random
+import struct
+import threading
+import time
+
+from traitlets import TraitError
+from traitlets.utils.importstring import import_item
+
+# 100-ns intervals between 1582-10-15 and 1970-01-01
+_UUID_EPOCH_OFFSET = 0x01b21dd213814000
+
+_pack_time_low = struct.Struct('>I').pack
+
+# process ids are at most 2 ** 22 on Linux
+_PID_BITS = 22
+_MULTICAST_BIT = 1 << 40
+
+ID_GENERATORS = {
+    'uuid1': 'nblineage.uuidgen.uuid1_strings',
+    'uuid7': 'nblineage.uuidgen.uuid7_strings',
+}
+
+ID_GENERATOR_HELP = ('"uuid1", "uuid7" for time-ordered ids, or the import string of a '
+                     'function which returns a list of the given number of ids in the UUID format')
+
+_lock = threading.Lock()
+_last_timestamp = None
+_clock_seq = None
+_pid = None
+_node = None
+_last_uuid7_sequence = None
+
+def _process_node(pid):
+    """Return a random multicast node whose low bits are a process id"""
+    random_bits = random.getrandbits(48 - _PID_BITS) << _PID_BITS
+    return random_bits | _MULTICAST_BIT | (pid & ((1 << _PID_BITS) - 1))
+
+def _reserve(count):
+    """Reserve `count` consecutive timestamps
+
+    Returns the first timestamp, the clock sequence and the node.
+    """
+    global _last_timestamp, _clock_seq, _pid, _node
+    timestamp = time.time_ns() // 100 + _UUID_EPOCH_OFFSET
+    with _lock:
+        if _pid != os.getpid():
+            _pid = os.getpid()
+            _node = _process_node(_pid)
+            _clock_seq = random.getrandbits(14)
+            _last_timestamp = None
+        if _last_timestamp is not None and timestamp <= _last_timestamp:
+            timestamp = _last_timestamp + 1
+        _last_timestamp = timestamp + count - 1
+        return timestamp, _clock_seq, _node
+
+def _runs(timestamp, count):
+    """Split a range of timestamps where the high 32 bits are constant"""
+    end = timestamp + count
+    while timestamp < end:
+        high = timestamp >> 32
+        run_end = min(end, (high + 1) << 32)
+        yield high, timestamp & 0xffffffff, (run_end - timestamp)
+        timestamp = run_end
+
+def _fields(high, clock_seq):
+    time_mid = high & 0xffff
+    time_hi_version = ((high >> 16) & 0x0fff) | 0x1000
+    clock_seq_hi_variant = ((clock_seq >> 8) & 0x3f) | 0x80
+    return time_mid, time_hi_version, clock_seq_hi_variant, clock_seq & 0xff
+
+def uuid1_strings(count):
+    """Generate `count` version 1 UUIDs as strings, in time order"""
+    if count <= 0:
+        return []
+    timestamp, clock_seq, node = _reserve(count)
+    uuids = []
+    for high, time_low, size in _runs(timestamp, count):
+        suffix = '-%04x-%04x-%02x%02x-%012x' % (_fields(high, clock_seq) + (node,))
+        uuids.extend(['%08x' % low + suffix for low in range(time_low, time_low + size)])
+    return uuids
+
+def uuid1_bytes(count):
+    """Generate `count` version 1 UUIDs packed as 16-byte big-endian UUIDs"""
+    if count <= 0:
+        return b''
+    timestamp, clock_seq, node = _reserve(count)
+    chunks = []
+    for high, time_low, size in _runs(timestamp, count):
+        suffix = struct.pack('>HHBB', *_fields(high, clock_seq)) + node.to_bytes(6, 'big')
+        chunks.append(b''.join([_pack_time_low(low) + suffix
+                                for low in range(time_low, time_low + size)]))
+    return b''.join(chunks)
+
+def _reserve_uuid7(count):
+    """Reserve `count` consecutive (unix_ts_ms << 12 | counter) sequences"""
+    global _last_uuid7_sequence
+    sequence = time.time_ns() // 1000000 << 12
+    with _lock:
+        if _last_uuid7_sequence is not None and sequence <= _last_uuid7_sequence:
+            sequence = _last_uuid7_sequence + 1
+        _last_uuid7_sequence = sequence + count - 1
+    return sequence
+
+def _uuid7_ints(count):
+    sequence = _reserve_uuid7(count)
+    rand_b = struct.unpack('>{}Q'.format(count), os.urandom(8 * count))
+    return [((seq >> 12) << 80 | 0x7 << 76 | (seq & 0xfff) << 64 |
+             0x2 << 62 | (rand & 0x3fffffffffffffff))
+            for seq, rand in zip(range(sequence, sequence + count), rand_b)]
+
+def uuid7_strings(count):
+    """Generate `count` version 7 UUIDs as strings, in lexical and time order"""
+    if count <= 0:
+        return []
+    uuids = []
+    for value in _uuid7_ints(count):
+        h = '%032x' % value
+        uuids.append('-'.join((h[:8], h[8:12], h[12:16], h[16:20], h[20:])))
+    return uuids
+
+def uuid7_bytes(count):
+    """Generate `count` version 7 UUIDs packed as 16-byte big-endian UUIDs"""
+    if count <= 0:
+        return b''
+    return b''.join([value.to_bytes(16, 'big') for value in _uuid7_ints(count)])
+
+def get_id_generator(name):
+    """Return the id generator of a name in `ID_GENERATORS` or an import string"""
+    return import_item(ID_GENERATORS.get(name, name))
+
+def validate_id_generator(name):
+    """Return the name if it resolves to an id generator, or raise a TraitError"""
+    try:
+        generator = get_id_generator(name)
+    except Exception as e:
+        raise TraitError('Unknown id generator {!r}: {}'.format(name, e))
+    if not callable(generator):
+        raise TraitError('Id generator {!r} is not callable'.format(name))
+    return name
+
+_BYTES_GENERATORS = {
+    'uuid1': uuid1_bytes,
+    'uuid7': uuid7_bytes,
+}
+
+def get_bytes_generator(name):
+    """Return the packed UUID generator of a name in `ID_GENERATORS`, or None"""
+    return _BYTES_GENERATORS.get(name, None)
+
+class IdBuffer(object):
+    """Hand out ids one by one from batches generated on demand
+
+    `generate` is a function which returns a list of `count` ids. Batches
+    grow from `min_batch` to `max_batch` ids, so that a few ids cost a
+    single small batch and many ids cost few calls.
+    """
+
+    def __init__(self, generate, min_batch=16, max_batch=4096):
+        self.generate = generate
+        self.batch_size = min_batch
+        self.max_batch = max_batch
+        self._ids = []
+
+    def __call__(self):
+        if not self._ids:
+            self._ids = self.generate(self.batch_size)
+            self._ids.reverse()
+            self.batch_size = min(self.batch_size * 2, self.max_batch)
+        return self._ids.pop()
@@ -50,6 +50,17 @@ interface IUUIDResult {
   uuid: string[];
 }
 
+export interface IHistoryOptions {
+  /** Max size of the history of each cell, null for unlimited */
+  max_history?: number | null;
+  /** Do not append a history entry identical to the last one */
+  coalesce_history?: boolean;
+}
+
+export interface INblineageConfig extends IHistoryOptions {
+  meme_generation: 'server' | 'client';
+}
+
 interface IGeneratedMEME {
   meme_count: number;
   cell_history_count: number;
@@ -99,9 +110,115 @@ export async function generateUUID(count: number): Promise<string[]> {
   return data.uuid;
 }
 
+export async function getConfig(): Promise<INblineageConfig> {
+  const settings = ServerConnection.makeSettings();
+  const requestUrl = URLExt.join(
+    settings.baseUrl,
+    'nblineage', // API Namespace
+    'config'
+  );
+  let response: Response;
+  try {
+    response = await ServerConnection.makeRequest(requestUrl, {}, settings);
+  } catch (error) {
+    throw new ServerConnection.NetworkError(error as any);
+  }
+  return await response.json();
+}
+
+/**
+ * Indices of the cells whose previous or next cell may have changed.
+ *
+ * Changes are recorded in the order they are applied to the cell list,
+ * and recorded indices are shifted by later changes.
+ */
+export class DirtyCells {
+  private dirty = new Set<number>();
+
+  get size(): number {
+    return this.dirty.size;
+  }
+
+  insert(index: number, count = 1): void {
+    const dirty = new Set<number>();
+    this.dirty.forEach(i => dirty.add(i >= index ? i + count : i));
+    for (let i = index - 1; i <= index + count; ++i) {
+      dirty.add(i);
+    }
+    this.dirty = dirty;
+  }
+
+  delete(index: number, count = 1): void {
+    const dirty = new Set<number>();
+    this.dirty.forEach(i => {
+      if (i < index) {
+        dirty.add(i);
+      } else if (i >= index + count) {
+        dirty.add(i - count);
+      }
+    });
+    dirty.add(index - 1);
+    dirty.add(index);
+    this.dirty = dirty;
+  }
+
+  move(fromIndex: number, toIndex: number, count = 1): void {
+    this.delete(fromIndex, count);
+    this.insert(toIndex, count);
+  }
+
+  indices(length: number): number[] {
+    const indices: number[] = [];
+    this.dirty.forEach(i => {
+      if (i >= 0 && i < length) {
+        indices.push(i);
+      }
+    });
+    return indices.sort((a, b) => a - b);
+  }
+
+  clear(): void {
+    this.dirty.clear();
+  }
+}
+
+/**
+ * The indices of the given cells and their neighbours.
+ */
+function withNeighbours(indices: number[], length: number): number[] {
+  const result = new Set<number>();
+  indices.forEach(i => {
+    for (let j = i - 1; j <= i + 1; ++j) {
+      if (j >= 0 && j < length) {
+        result.add(j);
+      }
+    }
+  });
+  return Array.from(result).sort((a, b) => a - b);
+}
+
+/**
+ * The current indices of the given cells, skipping the deleted ones.
+ */
+function currentIndices(
+  notebook: INotebookModel,
+  targets: ICellModel[]
+): number[] {
+  const remaining = new Set<ICellModel>(targets);
+  const cells = notebook.cells;
+  const indices: number[] = [];
+  for (let i = 0; i < cells.length && remaining.size > 0; ++i) {
+    if (remaining.delete(cells.get(i))) {
+      indices.push(i);
+    }
+  }
+  return indices;
+}
+
 function generateNotebookMEME(
   notebook: INotebookModel,
-  uuids: string[] | null
+  uuids: string[] | null,
+  targets?: ICellModel[]
 ) {
   let counter = 0;
   const memeobj = notebook.getMetadata('lc_notebook_meme');
@@ -120,6 +237,12 @@ function generateNotebookMEME(
   notebook.setMetadata('lc_notebook_meme', meme as ReadonlyPartialJSONObject);
 
   const cells = notebook.cells;
+  if (targets) {
+    targets.forEach(cell => {
+      counter += generateCellMEME(cell, uuids);
+    });
+    return counter;
+  }
   for (let i = 0; i < cells.length; ++i) {
     counter += generateCellMEME(cells.get(i), uuids);
   }
@@ -152,6 +275,24 @@ export function updatePrevNextMEME(notebook: INotebookModel) {
   }
 }
 
+/**
+ * Update the previous and next MEMEs of the cells at the given indices only.
+ */
+export function updatePrevNextMEMERange(
+  notebook: INotebookModel,
+  indices: number[]
+): void {
+  const cells = notebook.cells;
+  indices.forEach(i => {
+    if (i < 0 || i >= cells.length) {
+      return;
+    }
+    const prev_cell = i > 0 ? cells.get(i - 1) : null;
+    const next_cell = i < cells.length - 1 ? cells.get(i + 1) : null;
+    updatePrevNextCellMEME(cells.get(i), prev_cell, next_cell);
+  });
+}
+
 function updatePrevNextCellMEME(
   cell: ICellModel,
   prevCell: ICellModel | null,
@@ -185,21 +326,36 @@ function updatePrevNextCellMEME(
   cell.setMetadata('lc_cell_meme', meme as ReadonlyPartialJSONObject);
 }
 
-function updatePrevNextHistory(notebook: INotebookModel) {
+function updatePrevNextHistory(
+  notebook: INotebookModel,
+  options: IHistoryOptions
+) {
   let counter = 0;
   const cells = notebook.cells;
   for (let i = 0; i < cells.length; ++i) {
     const prev_cell = i > 0 ? cells.get(i - 1) : null;
     const next_cell = i < cells.length - 1 ? cells.get(i + 1) : null;
-    counter += updatePrevNextCellHistory(cells.get(i), prev_cell, next_cell);
+    counter += updatePrevNextCellHistory(
+      cells.get(i),
+      prev_cell,
+      next_cell,
+      options
+    );
   }
   return counter;
 }
 
+function isSameHistory(a: IMEMEHistory, b: IMEMEHistory) {
+  return (
+    a.current === b.current && a.previous === b.previous && a.next === b.next
+  );
+}
+
 function updatePrevNextCellHistory(
   cell: ICellModel,
   prevCell: ICellModel | null,
-  nextCell: ICellModel | null
+  nextCell: ICellModel | null,
+  options: IHistoryOptions
 ) {
   const memeobj = cell.getMetadata('lc_cell_meme');
   if (!isCellMEME(memeobj)) {
@@ -239,11 +395,26 @@ function updatePrevNextCellHistory(
     if (!history) {
       history = meme.history = [];
     }
-    history.push({
+    const entry: IMEMEHistory = {
       current: meme.current,
       previous: meme.previous,
       next: meme.next
-    });
+    };
+    if (
+      options.coalesce_history === false ||
+      history.length === 0 ||
+      !isSameHistory(history[history.length - 1], entry)
+    ) {
+      history.push(entry);
+    }
+    const maxHistory = options.max_history;
+    if (
+      maxHistory !== undefined &&
+      maxHistory !== null &&
+      history.length > maxHistory
+    ) {
+      history.splice(0, history.length - maxHistory);
+    }
     cell.setMetadata('lc_cell_meme', meme as ReadonlyPartialJSONObject);
     return 1;
   }
@@ -251,9 +422,10 @@ function updatePrevNextCellHistory(
 }
 
 export async function generateMEME(
-  notebook: INotebookModel
+  notebook: INotebookModel,
+  options: IHistoryOptions = {}
 ): Promise<IGeneratedMEME> {
-  const history_count = updatePrevNextHistory(notebook);
+  const history_count = updatePrevNextHistory(notebook, options);
   let meme_count = generateNotebookMEME(notebook, null);
 
   // Early return if no MEMEs need to be generated
@@ -280,6 +452,140 @@ export async function generateMEME(
   };
 }
 
+/**
+ * Generate MEMEs for the cells around the changes recorded in `dirty`
+ * and update their history and previous/next MEMEs, without visiting
+ * the other cells of the notebook.
+ */
+export async function generateMEMEForCells(
+  notebook: INotebookModel,
+  dirty: DirtyCells,
+  options: IHistoryOptions = {}
+): Promise<IGeneratedMEME> {
+  const cells = notebook.cells;
+  const indices = dirty.indices(cells.length);
+  dirty.clear();
+
+  let history_count = 0;
+  indices.forEach(i => {
+    const prev_cell = i > 0 ? cells.get(i - 1) : null;
+    const next_cell = i < cells.length - 1 ? cells.get(i + 1) : null;
+    history_count += updatePrevNextCellHistory(
+      cells.get(i),
+      prev_cell,
+      next_cell,
+      options
+    );
+  });
+
+  // Keep the cells rather than their indices, which are shifted by the
+  // cells inserted or deleted while waiting for the UUIDs
+  const dirtyCells = indices.map(i => cells.get(i));
+  const targets = withNeighbours(indices, cells.length).map(i => cells.get(i));
+  let meme_count = generateNotebookMEME(notebook, null, targets);
+  if (meme_count > 0) {
+    const uuids = await generateUUID(meme_count);
+    if (!uuids) {
+      throw new Error('Failed to get UUIDs from server');
+    }
+    meme_count = generateNotebookMEME(notebook, uuids, targets);
+    updatePrevNextMEMERange(notebook, currentIndices(notebook, dirtyCells));
+  } else {
+    updatePrevNextMEMERange(notebook, indices);
+  }
+
+  return {
+    meme_count: meme_count,
+    cell_history_count: history_count
+  };
+}
+
+/**
+ * The notebook and cell metadata of a saved notebook.
+ */
+export interface ISavedMetadata {
+  metadata: ReadonlyPartialJSONObject;
+  cells: { id?: string; metadata: ReadonlyPartialJSONObject }[];
+}
+
+export async function getSavedMetadata(path: string): Promise<ISavedMetadata> {
+  const settings = ServerConnection.makeSettings();
+  const requestUrl =
+    URLExt.join(
+      settings.baseUrl,
+      'nblineage', // API Namespace
+      'metadata'
+    ) + URLExt.objectToQueryString({ path });
+  let response: Response;
+  try {
+    response = await ServerConnection.makeRequest(requestUrl, {}, settings);
+  } catch (error) {
+    throw new ServerConnection.NetworkError(error as any);
+  }
+  if (!response.ok) {
+    throw new ServerConnection.ResponseError(response);
+  }
+  return await response.json();
+}
+
+/**
+ * Copy the MEMEs generated by the server on save back into the model.
+ * Cells are matched by their cell id.
+ */
+export function mergeSavedMEME(
+  notebook: INotebookModel,
+  saved: ISavedMetadata
+): number {
+  let counter = 0;
+  const notebookMeme = saved.metadata['lc_notebook_meme'];
+  if (isNotebookMEME(notebookMeme)) {
+    const memeobj = notebook.getMetadata('lc_notebook_meme');
+    const meme: INotebookMEME = isNotebookMEME(memeobj)
+      ? (memeobj as INotebookMEME)
+      : {};
+    const savedMeme = notebookMeme as INotebookMEME;
+    if (meme.current !== savedMeme.current) {
+      meme.current = savedMeme.current;
+      notebook.setMetadata(
+        'lc_notebook_meme',
+        meme as ReadonlyPartialJSONObject
+      );
+      counter++;
+    }
+  }
+
+  const savedCells = new Map<string, ICellMEME>();
+  for (const cell of saved.cells) {
+    const meme = cell.metadata['lc_cell_meme'];
+    if (cell.id && isCellMEME(meme as ReadonlyPartialJSONValue)) {
+      savedCells.set(cell.id as string, meme as ICellMEME);
+    }
+  }
+  const cells = notebook.cells;
+  for (let i = 0; i < cells.length; ++i) {
+    const cell = cells.get(i);
+    const savedMeme = savedCells.get(cell.id);
+    if (!savedMeme) {
+      continue;
+    }
+    const memeobj = cell.getMetadata('lc_cell_meme');
+    const meme: ICellMEME = isCellMEME(memeobj) ? (memeobj as ICellMEME) : {};
+    if (
+      meme.current === savedMeme.current &&
+      meme.previous === savedMeme.previous &&
+      meme.next === savedMeme.next
+    ) {
+      continue;
+    }
+    cell.setMetadata(
+      'lc_cell_meme',
+      Object.assign({}, meme, savedMeme) as ReadonlyPartialJSONObject
+    );
+    counter++;
+  }
+  return counter;
+}
+
 function createBranchNumber() {
   const num = Math.random() * 0xffff;
   return Math.floor(num).toString(16).padStart(4, '0');
@@ -5,12 +5,19 @@ import { IDisposable } from '@lumino/disposable';
 import { ICodeCellModel, isCodeCellModel } from '@jupyterlab/cells';
 import { ReadonlyPartialJSONObject } from '@lumino/coreutils';
 import {
+  DirtyCells,
   ICellMEME,
   isCellMEME,
   generateBranchNumber,
   generateBranchNumberAll,
   generateMEME,
-  updatePrevNextMEME
+  generateMEMEForCells,
+  getConfig,
+  getSavedMetadata,
+  INblineageConfig,
+  mergeSavedMEME,
+  updatePrevNextMEME,
+  updatePrevNextMEMERange
 } from './Meme';
 import { TrackingServer } from './TrackingServer';
 
@@ -23,6 +30,18 @@ export class NblineageExtension
 {
   trackingServer = new TrackingServer();
   private isGeneratingMeme = false;
+  private config: Promise<INblineageConfig> | null = null;
+
+  getConfig(): Promise<INblineageConfig> {
+    if (!this.config) {
+      this.config = getConfig().catch(error => {
+        console.error('[nblineage] Failed to get config:', error);
+        this.config = null;
+        return { meme_generation: 'client' } as INblineageConfig;
+      });
+    }
+    return this.config;
+  }
 
   createNew(
     panel: NotebookPanel,
@@ -46,6 +65,33 @@ export class NblineageExtension
       // Also connect execution time updater for existing cells
       this.initExistingCellsExecutionUpdater(panel);
 
+      const config = await this.getConfig();
+      if (config.meme_generation === 'server') {
+        // MEMEs are generated by the server on save, no UUIDs are requested
+        this.initSavedMEMEMerger(panel, context);
+        return;
+      }
+
+      // Cells inserted, deleted or moved since the last generation.
+      // The whole notebook is processed only for the first generation.
+      const dirty = new DirtyCells();
+      let generated = false;
+      context.model.cells.changed.connect((_, change) => {
+        if (change.type === 'add') {
+          dirty.insert(change.newIndex, change.newValues.length);
+        } else if (change.type === 'remove') {
+          dirty.delete(change.oldIndex, change.oldValues.length);
+        } else if (change.type === 'move') {
+          dirty.move(
+            change.oldIndex,
+            change.newIndex,
+            change.newValues.length
+          );
+        } else {
+          generated = false;
+        }
+      });
+
       // Generate MEME when content changes
       // This ensures MEME exists when the actual save happens
       // Set up AFTER addBranchNumbers to avoid triggering on branch number additions
@@ -61,7 +107,16 @@ export class NblineageExtension
         this.isGeneratingMeme = true;
         try {
           // Generate MEME for new cells and update prev/next relationships
-          const result = await generateMEME(model);
+          if (generated && dirty.size === 0) {
+            return;
+          }
+          if (!generated) {
+            dirty.clear();
+          }
+          const result = generated
+            ? await generateMEMEForCells(model, dirty, config)
+            : await generateMEME(model, config);
+          generated = true;
           if (result.meme_count > 0) {
             console.log(
               '[nblineage] Generated %d new MEMEs for %s',
@@ -74,6 +129,8 @@ export class NblineageExtension
             '[nblineage] Error generating MEME on content change:',
             error
           );
+          // Process the whole notebook on the next change
+          generated = false;
         } finally {
           this.isGeneratingMeme = false;
         }
@@ -81,6 +138,35 @@ export class NblineageExtension
     });
   }
 
+  initSavedMEMEMerger(
+    panel: NotebookPanel,
+    context: DocumentRegistry.IContext<INotebookModel>
+  ): void {
+    context.saveState.connect(async (_, state) => {
+      if (state !== 'completed') {
+        return;
+      }
+      try {
+        // Only the metadata is fetched, without cell sources and outputs
+        const saved = await getSavedMetadata(context.localPath);
+        const wasDirty = context.model.dirty;
+        const count = mergeSavedMEME(context.model, saved);
+        if (!wasDirty) {
+          context.model.dirty = false;
+        }
+        if (count > 0) {
+          console.log(
+            '[nblineage] Merged %d MEMEs generated by the server for %s',
+            count,
+            panel.context.localPath
+          );
+        }
+      } catch (error) {
+        console.error('[nblineage] Error merging saved MEME:', error);
+      }
+    });
+  }
+
   initBranchUpdater(panel: NotebookPanel): void {
     panel.content.model?.cells.changed.connect((_, change) => {
       if (change.type === 'add') {
@@ -91,9 +177,18 @@ export class NblineageExtension
           }
           generateBranchNumber(cell.model);
         });
-        // Update prev/next relationships after all branch numbers are generated
+        // Update prev/next relationships of the added cells and their
+        // neighbours after all branch numbers are generated
         if (panel.content.model) {
-          updatePrevNextMEME(panel.content.model);
+          const indices: number[] = [];
+          for (
+            let i = change.newIndex - 1;
+            i <= change.newIndex + change.newValues.length;
+            ++i
+          ) {
+            indices.push(i);
+          }
+          updatePrevNextMEMERange(panel.content.model, indices);
           console.log(
             '[nblineage] initBranchUpdater: Updated prev/next relationships after branch generation'
           );